@@ -0,0 +1,116 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Peak of the live activations of Network.forward with releasing of the outputs after their
+last consumers and without it, gradients and time of the training step with checkpointing
+"""
+import weakref
+
+import numpy as np
+import torch
+
+from common import grown_population, timeit
+
+
+def peak_activations(network, x):
+    """
+    Peak bytes of the step outputs, which are alive during the forward pass
+    """
+    outputs = []
+    peak = [0]
+    run_step = network.run_step
+
+    def tracked_step(step, temp_x):
+        output = run_step(step, temp_x)
+        outputs.append((weakref.ref(output), output.element_size() * output.nelement()))
+        peak[0] = max(peak[0], sum(size for reference, size in outputs if reference() is not None))
+
+        return output
+
+    network.run_step = tracked_step
+    try:
+        with torch.no_grad():
+            network(x)
+    finally:
+        del network.run_step
+
+    return peak[0]
+
+
+def train_step(network, x):
+    network.zero_grad()
+    network(x).sum().backward()
+
+    return [parameter.grad.clone() for parameter in network.parameters() if parameter.grad is not None]
+
+
+def main(population_size=10, grown_steps=10, batch_size=32, repeat=3):
+    np.random.seed(0)
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+
+    x = torch.randn(batch_size, 3, 32, 32)
+    networks = []
+    for individ in grown_population(population_size, grown_steps):
+        try:
+            network = individ.init_net()
+            network.eval()
+            network(x)
+        except Exception:
+            continue
+
+        # backward pass of the dilated max pooling with the kernel larger than its input crashes torch on cpu
+        if any(isinstance(module, torch.nn.MaxPool2d) and module.dilation != 1 for module in network.modules()):
+            continue
+        networks.append(network)
+
+    released, kept = [], []
+    for network in networks:
+        released.append(peak_activations(network, x))
+
+        plan = network.plan
+        # all outputs are kept until the end of the pass, as before
+        network.plan = [step._replace(release=()) for step in plan]
+        kept.append(peak_activations(network, x))
+        network.plan = plan
+
+    print('Networks: {}, chains for checkpointing per network: {:.1f}'.format(
+        len(networks), np.mean([len(network.chains) for network in networks])))
+    print('Peak activations, all outputs kept: {:.2f} MB'.format(np.mean(kept) / 2 ** 20))
+    print('Peak activations, outputs released: {:.2f} MB'.format(np.mean(released) / 2 ** 20))
+
+    # dropout is disabled, so both passes are deterministic
+    for network in networks:
+        network.train()
+        for module in network.modules():
+            if isinstance(module, torch.nn.Dropout):
+                module.eval()
+
+        network.checkpointing = False
+        gradients = train_step(network, x)
+        network.checkpointing = True
+        checkpointed_gradients = train_step(network, x)
+
+        if not all(torch.allclose(i, j, atol=1e-5) for i, j in zip(gradients, checkpointed_gradients)):
+            raise RuntimeError('Gradients with checkpointing disagree')
+
+    for checkpointing in (False, True):
+        for network in networks:
+            network.checkpointing = checkpointing
+        spent = timeit(lambda: [train_step(network, x) for network in networks], repeat)
+        print('Training step, checkpointing={}: {:.3f} ms per batch'.format(checkpointing, 1000 * spent / len(networks)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import neuvol  # noqa: E402
+
+
+# the same setup as in the CIFAR notebook
+OPTIONS = {'classes': 10, 'shape': (None, 3, 32, 32), 'memory_limit': 14000, 'batch_size': 8}
+
+
+def image_distribution():
+    """
+    Distribution with the layers, which make sense for images
+    """
+    distribution = neuvol.Distribution()
+    distribution.set_layer_status('cnn2', active=True)
+    distribution.set_layer_status('max_pool2', active=True)
+    distribution.set_layer_status('lstm', active=False)
+    distribution.set_layer_status('max_pool', active=False)
+    distribution.set_layer_status('cnn', active=False)
+    distribution.set_layer_status('dense', active=True)
+    distribution.set_layer_status('decnn2', active=False)
+    distribution.set_layer_status('dropout', active=True)
+
+    return distribution
+
+
+def classification_head(distribution):
+    finisher = neuvol.layer.Layer('dense', distribution, options={'input_rank': 3})
+    finisher.config['units'] = 10
+    finisher.config['activation'] = 'softmax'
+    finisher.config['input_rank'] = 2
+
+    return finisher
+
+
+def grown_population(size, grown_steps, distribution=None):
+    """
+    Create population of image individs and add grown_steps layers to each of them
+    """
+    distribution = distribution or image_distribution()
+    finisher = classification_head(distribution)
+
+    population = [neuvol.IndividImage(0, OPTIONS, finisher, distribution=distribution) for _ in range(size)]
+    for _ in range(grown_steps):
+        for individ in population:
+            neuvol.MutatorBase.grown(individ, distribution)
+
+    return population
+
+
+def timeit(func, repeat):
+    """
+    Return the best time of the function call in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
@@ -0,0 +1,154 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare the incremental topological order check of a new connection with
+the matrix powers check, which was used before (reproduced here as a reference).
+The end-to-end part replays the mutations of the structure, as it is done after
+each new mutation, with the incremental order, the full sort and the matrix powers
+"""
+import types
+
+import numpy as np
+
+from common import OPTIONS, classification_head, image_distribution, neuvol, timeit
+from neuvol.individs.structure.graph import LayersGraph, TopologicalOrder
+
+
+def matrix_power_cyclic_check(matrix):
+    for i in range(1, len(matrix) + 5):
+        paths = np.linalg.matrix_power(matrix, i)
+        if len(np.where(paths.diagonal() != 0)[0]) != 0:
+            return True
+
+    return False
+
+
+def random_structure(size, branching=0.3):
+    """
+    Chain of layers with random skip-connections, as it is grown by mutations
+    """
+    matrix = np.zeros((size, size))
+    for i in range(size - 1):
+        matrix[i, i + 1] = 1
+        if np.random.rand() < branching:
+            matrix[i, np.random.randint(i + 1, size)] = 1
+
+    return matrix
+
+
+def random_connections(size, number):
+    connections = np.random.randint(0, size, (number, 2))
+
+    return [(i, j) for i, j in connections if i != j]
+
+
+def mutated_individ(size, mutations_number, distribution, finisher):
+    """
+    Chain of layers with random connections in the pool of mutations, a part of them creates cycles
+    """
+    individ = neuvol.IndividImage(0, OPTIONS, finisher, distribution=distribution)
+    layer = neuvol.layer.Layer('dense', distribution)
+    branch = list(individ.branchs_end)[0]
+    for _ in range(size):
+        individ.architecture.add_layer(layer, branch)
+
+    for after_layer_index, before_layer_index in random_connections(size, mutations_number):
+        mutation = neuvol.mutation.MutationInjector(None, None, None, None)
+        mutation.mutation_type = 'add_connection'
+        mutation.after_layer_index = int(after_layer_index) + 1
+        mutation.before_layer_index = int(before_layer_index) + 1
+        mutation._layer = None
+        individ.architecture.mutations_pool.append(mutation)
+
+    return individ
+
+
+def replay(structure):
+    # mutations are applied from scratch, as after a change of the first mutation
+    structure._mutations_snapshots = []
+    structure._matrix_updated = False
+
+    return structure.graph
+
+
+def full_sort_cyclic_check(self, graph, order=None):
+    return not TopologicalOrder(graph).acyclic
+
+
+def matrix_power_structure_check(self, graph, order=None):
+    return matrix_power_cyclic_check(graph.matrix)
+
+
+def mutation_replay(sizes=(200, 500, 1000, 2000), mutations_number=50, legacy_max_size=200, repeat=3):
+    distribution = image_distribution()
+    finisher = classification_head(distribution)
+
+    for size in sizes:
+        structure = mutated_individ(size, mutations_number, distribution, finisher).architecture
+        incremental_time = timeit(lambda: replay(structure), repeat) / mutations_number
+        graph = replay(structure)
+
+        # the same structure with the checks of the whole graph
+        structure._cyclic_check = types.MethodType(full_sort_cyclic_check, structure)
+        sort_time = timeit(lambda: replay(structure), repeat) / mutations_number
+        assert replay(structure).successors == graph.successors
+
+        report = 'Replay of {} mutations, {} nodes: incremental {:.2f} ms, full sort {:.2f} ms per mutation'.format(
+            mutations_number, size, 1e3 * incremental_time, 1e3 * sort_time)
+
+        if size <= legacy_max_size:
+            structure._cyclic_check = types.MethodType(matrix_power_structure_check, structure)
+            legacy_time = timeit(lambda: replay(structure), 1) / mutations_number
+            assert replay(structure).successors == graph.successors
+            report += ', matrix power {:.1f} ms, speedup {:.0f}x'.format(1e3 * legacy_time, legacy_time / incremental_time)
+
+        print(report)
+
+
+def main(sizes=(200, 500, 1000, 2000), connections_number=1000, legacy_max_size=200, repeat=3):
+    np.random.seed(0)
+
+    for size in sizes:
+        matrix = random_structure(size)
+        order = TopologicalOrder(LayersGraph.from_matrix(matrix))
+        connections = random_connections(size, connections_number)
+
+        def incremental():
+            for i, j in connections:
+                order.creates_cycle(i, j)
+
+        incremental_time = timeit(incremental, repeat) / len(connections)
+
+        # connection, which does not create a cycle, requires the whole graph to be checked
+        i, j = [(i, j) for i, j in connections if not order.creates_cycle(i, j)][0]
+        new_matrix = np.array(matrix)
+        new_matrix[i, j] = 1
+        new_graph = LayersGraph.from_matrix(new_matrix)
+
+        sort_time = timeit(lambda: TopologicalOrder(new_graph), repeat)
+        report = '{} nodes: incremental {:.1f} us, full sort {:.2f} ms'.format(
+            size, 1e6 * incremental_time, 1e3 * sort_time)
+
+        # matrix powers take minutes for the large structures
+        if size <= legacy_max_size:
+            legacy_time = timeit(lambda: matrix_power_cyclic_check(new_matrix), 1)
+            report += ', matrix power {:.1f} ms, speedup {:.0f}x'.format(1e3 * legacy_time, legacy_time / incremental_time)
+
+        print(report)
+
+    mutation_replay(sizes, legacy_max_size=legacy_max_size, repeat=repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Sampling rate of the Distribution: single values by the cumulative tables against
+np.random.choice with the probabilities normalized for each call, the creation rate of the layers
+one by one and by batches, the creation of the initial population and the sampling
+with the appearance-driven update of the probabilities
+"""
+import numpy as np
+
+from common import OPTIONS, classification_head, image_distribution, neuvol, timeit
+
+
+def legacy_choice(probability):
+    # sampling of the Distribution before the cumulative tables
+    a = list(probability)
+    p = np.array(list(probability.values()))
+    p = p / p.sum()
+
+    return np.random.choice(a, p=p)
+
+
+def legacy_increase(probability, value):
+    # kernel update of the Distribution before the probability tables
+    a = sorted(probability)
+    index_of_selected_value = a.index(value)
+
+    for i, value in enumerate(a):
+        probability[value] += neuvol.probabilty_pool.generating_distribution.kernel(i, index_of_selected_value)
+
+
+def main(draws=20000, layers=5000, population_size=1000, grown=5, repeat=3):
+    np.random.seed(0)
+    distribution = image_distribution()
+    parameters = [(layer, parameter) for layer in ('cnn2', 'dense', 'max_pool2')
+                  for parameter, values in neuvol.constants.LAYERS_POOL[layer].items() if values]
+    probability = distribution.get_probability()[0]
+
+    spent = timeit(lambda: [legacy_choice(probability[layer][parameter])
+                            for _ in range(draws // len(parameters)) for layer, parameter in parameters], repeat)
+    print('np.random.choice: {:.0f} values per second'.format(draws / spent))
+
+    spent = timeit(lambda: [distribution.layer_parameters(layer, parameter)
+                            for _ in range(draws // len(parameters)) for layer, parameter in parameters], repeat)
+    print('Cumulative tables: {:.0f} values per second'.format(draws / spent))
+
+    spent = timeit(lambda: [neuvol.layer.Layer(distribution.layer(), distribution) for _ in range(layers)], repeat)
+    print('Layers creation: {:.0f} layers per second'.format(layers / spent))
+
+    spent = timeit(lambda: distribution.sample_layers(layers), repeat)
+    print('Layers creation by sample_layers: {:.0f} layers per second'.format(layers / spent))
+
+    finisher = classification_head(distribution)
+
+    def grown_population():
+        population = [neuvol.IndividImage(0, OPTIONS, finisher, distribution=distribution) for _ in range(population_size)]
+        for _ in range(grown):
+            for individ in population:
+                neuvol.MutatorBase.grown(individ, distribution)
+
+    spent = timeit(grown_population, repeat)
+    print('Population of {} individs, one by one: {:.3f} s'.format(population_size, spent))
+
+    spent = timeit(lambda: neuvol.cradle_population(population_size, 0, OPTIONS, finisher, distribution, 'image', grown=grown), repeat)
+    print('Population of {} individs by cradle_population: {:.3f} s'.format(population_size, spent))
+
+    learning_draws = draws // 10
+    probability = {value: 1.0 for value in neuvol.constants.TRAINING['optimizer_lr']}
+    spent = timeit(lambda: [legacy_increase(probability, legacy_choice(probability)) for _ in range(learning_draws)], 1)
+    print('Learning rate with the kernel update, dictionaries: {:.0f} values per second'.format(learning_draws / spent))
+
+    distribution._appeareance_increases_probability = True
+    spent = timeit(lambda: [distribution.training_parameters('optimizer_lr') for _ in range(learning_draws)], 1)
+    print('Learning rate with the kernel update, probability tables: {:.0f} values per second'.format(learning_draws / spent))
+    distribution._appeareance_increases_probability = False
+
+    population = neuvol.cradle_population(population_size, 0, OPTIONS, finisher, distribution, 'image', grown=grown)
+    spent = timeit(lambda: distribution.parse_population(population), 1)
+    print('Update by the population of {} individs: {:.3f} s'.format(population_size, spent))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Consistency of the architecture fingerprint: it does not change after the shape calculation,
+which writes derived values into the layers configs, it depends on the input shape, and clones have the fingerprint of the parent,
+so they get the cached result and the trained weights of the parent and they are stored once
+in the Pareto archive
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from common import OPTIONS, classification_head, grown_population, image_distribution, neuvol
+
+
+def fingerprint(individ):
+    # recompute the fingerprint instead of the cached one
+    individ.architecture._fingerprint = None
+
+    return individ.fingerprint
+
+
+def check_shapes(population):
+    for individ in population:
+        before = fingerprint(individ)
+        try:
+            individ.recalculate_shapes()
+        except Exception:
+            # broken network, its shapes are calculated partially
+            pass
+        assert fingerprint(individ) == before, 'fingerprint is changed by the shape calculation'
+
+
+def check_clones(population):
+    for individ in population:
+        assert fingerprint(individ.clone()) == fingerprint(individ), 'clone has another fingerprint'
+
+
+def check_input_shape(distribution):
+    finisher = classification_head(distribution)
+    individ = neuvol.IndividImage(0, OPTIONS, finisher, distribution=distribution)
+    options = dict(OPTIONS, shape=(None, 1, 28, 28))
+    other = neuvol.IndividImage(0, options, finisher, distribution=distribution)
+    assert fingerprint(individ) != fingerprint(other), 'fingerprint does not depend on the input shape'
+
+
+def check_cache(population):
+    with tempfile.TemporaryDirectory() as directory:
+        cache = neuvol.FitnessCache(os.path.join(directory, 'fitness_cache.sqlite'))
+        evaluated = 0
+        for individ in population:
+            try:
+                cache.evaluate(individ, lambda network: float(np.random.rand()))
+            except Exception:
+                # broken network
+                continue
+            evaluated += 1
+
+            clone = individ.clone()
+            clone.weights = {}
+            clone.trained = False
+            # the evaluation is not called for the cached architecture
+            record = cache.evaluate(clone, None)
+            assert record.result == individ.result, 'clone does not hit the cache'
+            assert clone.trained and set(clone.weights) == set(individ.weights), 'weights are not restored'
+        cache.close()
+
+    return evaluated
+
+
+def evaluated_clone(individ):
+    # clone is not evaluated, it gets the same results as its parent after the evaluation
+    clone = individ.clone()
+    assert clone.result is None, 'clone keeps the result of its parent'
+    clone.result = individ.result
+    clone.result_params = individ.result_params
+
+    return clone
+
+
+def check_archive(population):
+    archive = neuvol.ParetoArchive()
+    evaluated = [individ for individ in population if individ.result is not None]
+    archive.update(evaluated)
+    best = list(archive)
+
+    # clones of the archived individs have the same results, they are not added
+    archive.update([evaluated_clone(individ) for individ in best])
+    assert [id(individ) for individ in archive] == [id(individ) for individ in best], 'clones are added to the archive'
+
+    # archived individs are snapshots, mutation of the evaluated individ does not change them
+    fingerprints = [individ.fingerprint for individ in best]
+    for individ in evaluated:
+        neuvol.MutatorBase.grown(individ, individ._distribution)
+    assert [fingerprint(individ) for individ in archive] == fingerprints, 'archived individ is changed by the mutation'
+
+    # clone and its parent in the same population are stored once
+    archive = neuvol.ParetoArchive()
+    archive.update(best + [evaluated_clone(individ) for individ in best])
+    assert len(archive) == len(best), 'clone and its parent are not deduplicated'
+
+    return len(best)
+
+
+def main(population_size=30, grown_steps=8):
+    np.random.seed(0)
+    population = grown_population(population_size, grown_steps)
+
+    check_shapes(population)
+    print('Fingerprints after the shape calculation: ok')
+
+    check_clones(population)
+    print('Fingerprints of the clones: ok')
+
+    check_input_shape(image_distribution())
+    print('Fingerprints of the inputs with another shape: ok')
+
+    print('Cached results and weights of the clones: ok, {} individs'.format(check_cache(population)))
+
+    print('Clones in the Pareto archive: ok, {} individs in the archive'.format(check_archive(population)))
+
+
+if __name__ == "__main__":
+    main()
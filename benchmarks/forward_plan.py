@@ -0,0 +1,122 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare compiled plan execution of Network.forward with the queue-based graph traversal,
+which was used before (the traversal is reproduced here as a reference)
+"""
+import numpy as np
+import torch
+
+from common import grown_population, timeit
+
+
+def queue_forward(network, x):
+    """
+    Queue-based forward pass: graph is traversed for each batch
+    """
+    layers_pool = [0]
+    buffer_x = {-1: x}
+    last_value = None
+
+    while layers_pool:
+        layer_index = layers_pool[0]
+        enter_layers = set(np.where(network.structure.matrix[:, layer_index] == 1)[0])
+        enter_layers = [i for i in enter_layers if i not in network.layers_pool_removed]
+
+        not_inited_layers = [i for i in enter_layers if i not in (buffer_x.keys())]
+        not_inited_layers_selected = [layer for layer in not_inited_layers if layer not in network.layers_pool_removed]
+
+        if not_inited_layers_selected:
+            not_inited_layers_selected = [layer for layer in not_inited_layers_selected if layer not in layers_pool]
+            layers_pool.extend(not_inited_layers_selected)
+            layers_pool.append(layers_pool.pop(0))
+            continue
+
+        temp_x = [buffer_x[layer] for layer in enter_layers]
+        inited_layer = network.layers_pool_inited[layer_index]
+        layer_type = network.structure.layers_index_reverse[layer_index].layer_type
+
+        if not enter_layers and layer_type == 'input':
+            temp_x = buffer_x[-1]
+            if inited_layer[1] is not None:
+                temp_x = inited_layer[1](temp_x)
+
+        elif not enter_layers:
+            layers_pool.pop(0)
+            continue
+
+        elif len(enter_layers) > 1:
+            if inited_layer[0] is not None:
+                reshapers, axis = inited_layer[0]
+                if reshapers is not None:
+                    reshapers = [i.init_layer(None) for i in reshapers]
+                    temp_x = [r(temp_x[i]) for i, r in enumerate(reshapers)]
+                temp_x = torch.cat(temp_x, axis)
+
+            if inited_layer[1] is not None:
+                temp_x = inited_layer[1](temp_x)
+
+        else:
+            temp_x = temp_x[0]
+            if inited_layer[1] is not None:
+                temp_x = inited_layer[1](temp_x)
+
+        result_x = network.process_layer_output(inited_layer[2](temp_x), layer_type)
+        buffer_x[layer_index] = result_x
+
+        output_layers = [layer for layer in np.where(network.structure.matrix[layer_index] == 1)[0]
+                         if layer not in layers_pool and layer not in buffer_x.keys()]
+
+        last_value = result_x
+        layers_pool.extend(output_layers)
+        layers_pool.pop(layers_pool.index(layer_index))
+
+    return last_value
+
+
+def main(population_size=10, grown_steps=10, batch_size=8, calls=50, repeat=3):
+    np.random.seed(0)
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+
+    x = torch.randn(batch_size, 3, 32, 32)
+    networks = []
+    for individ in grown_population(population_size, grown_steps):
+        try:
+            network = individ.init_net()
+            network.eval()
+            network(x)
+        except Exception:
+            continue
+        networks.append(network)
+
+    print('Networks: {}, layers per network: {:.1f}'.format(
+        len(networks), np.mean([len(network.plan) for network in networks])))
+
+    with torch.no_grad():
+        for network in networks:
+            if not torch.allclose(network(x), queue_forward(network, x), rtol=0, atol=0, equal_nan=True):
+                raise RuntimeError('Compiled plan and queue-based forward pass disagree')
+
+        queue_time = timeit(lambda: [queue_forward(network, x) for network in networks for _ in range(calls)], repeat)
+        plan_time = timeit(lambda: [network(x) for network in networks for _ in range(calls)], repeat)
+
+    number_of_calls = len(networks) * calls
+    print('Queue-based forward: {:.3f} ms per batch'.format(1000 * queue_time / number_of_calls))
+    print('Compiled plan forward: {:.3f} ms per batch'.format(1000 * plan_time / number_of_calls))
+    print('Speedup: {:.2f}x'.format(queue_time / plan_time))
+
+
+if __name__ == "__main__":
+    main()
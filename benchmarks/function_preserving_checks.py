@@ -0,0 +1,118 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Function-preserving insertion before the concatenation: the new branch is the identity copy
+of one of the inputs of the finisher, the finisher gets the parent weights split between the input
+and its copy, so the child computes the same function as its parent.
+Inputs of the concatenation with indexes from 8 are ordered differently by python sets,
+the check covers such graphs, so the parent weights and the concatenation use the same order
+"""
+import numpy as np
+import torch
+
+from common import grown_population, image_distribution, neuvol
+from neuvol.evaluation.scheduler import EVALUATION_ERRORS
+from neuvol.mutation.base_mutation import mutator
+
+
+# layer of the identity copy for the rank of the copied output
+PRESERVING_LAYERS = {2: 'dense', 4: 'cnn2'}
+
+
+def finisher_index(individ):
+    # layers are copied into the structure, copies keep the uid
+    uid = individ.architecture.finisher.uid
+
+    return [i for i, layer in individ.layers_index_reverse.items() if layer.uid == uid][0]
+
+
+def preserving_branch(individ, distribution, after_layer_index):
+    """
+    Clone of the individ with the function-preserving copy of the layer as a new branch
+    """
+    rank = individ.layers_index_reverse[after_layer_index].config['rank']
+    layer = neuvol.layer.Layer(PRESERVING_LAYERS[rank], distribution)
+    layer.config['input_rank'] = rank
+    layer.preserve_function()
+
+    child = individ.clone()
+    layers_names = {index: i.layer_type for index, i in child.layers_index_reverse.items()}
+    mutation = mutator('add_layer', child.matrix, layers_names, distribution,
+                       config={'after_layer_index': after_layer_index}, layer=layer)
+    # new branch, which is concatenated by the finisher
+    mutation.config['before_layer_index'] = None
+    child.add_mutation(mutation)
+
+    return child
+
+
+def check_concat_order(individ, distribution, x):
+    """
+    Return:
+        int - number of the checked children
+    """
+    predecessors = individ.architecture.graph_index.predecessors[finisher_index(individ)]
+    # only the concatenations, which order is changed by sets, are checked
+    if len(predecessors) < 2 or list(set(predecessors)) == list(predecessors):
+        return 0
+
+    try:
+        network = individ.init_net()
+    except EVALUATION_ERRORS:
+        # broken network
+        return 0
+    network.eval()
+    individ.save_weights(network)
+    with torch.no_grad():
+        expected = network(x)
+
+    checked = 0
+    for after_layer_index in predecessors:
+        if individ.layers_index_reverse[after_layer_index].config.get('rank') not in PRESERVING_LAYERS:
+            continue
+
+        child = preserving_branch(individ, distribution, after_layer_index)
+        try:
+            child_network = child.init_net()
+        except EVALUATION_ERRORS:
+            continue
+
+        # the finisher is not widened for this kind of the concatenation
+        if finisher_index(child) not in child_network.inherited:
+            continue
+
+        child_network.eval()
+        with torch.no_grad():
+            output = child_network(x)
+        assert torch.allclose(output, expected, atol=1e-5), 'function-preserving branch changes the output'
+        checked += 1
+
+    return checked
+
+
+def main(population_size=30, grown_steps=10):
+    np.random.seed(0)
+    torch.manual_seed(0)
+    distribution = image_distribution()
+    population = grown_population(population_size, grown_steps, distribution)
+    x = torch.randn(4, 3, 32, 32)
+
+    checked = sum(check_concat_order(individ, distribution, x) for individ in population)
+    assert checked, 'there are no concatenations with the set order different from the sorted one'
+
+    print('Function-preserving children checked: {}'.format(checked))
+
+
+if __name__ == "__main__":
+    main()
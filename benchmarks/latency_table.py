@@ -0,0 +1,72 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Latency lookup table of the layers on this machine: the table is populated by the layers
+of the random individs, latencies of the other individs are predicted by the table
+and compared with the measured forward time of their networks
+"""
+import time
+
+import numpy as np
+import torch
+
+from common import grown_population, neuvol
+
+
+def network_latency(individ, x, repeat=10, warmup=2):
+    network = individ.init_net()
+    network.eval()
+
+    times = []
+    with torch.no_grad():
+        for i in range(warmup + repeat):
+            start = time.perf_counter()
+            network(x)
+            if i >= warmup:
+                times.append(time.perf_counter() - start)
+
+    return float(np.median(times))
+
+
+def main(table_size=30, test_size=20, grown_steps=10, batch_size=1):
+    np.random.seed(0)
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+
+    table = neuvol.LatencyTable()
+    print('Measured layers: {}'.format(table.populate(grown_population(table_size, grown_steps), batch_size)))
+
+    x = torch.randn(batch_size, 3, 32, 32)
+    predicted, measured, estimated = [], [], []
+    for individ in grown_population(test_size, grown_steps):
+        try:
+            latency = network_latency(individ, x)
+        except Exception:
+            # broken network
+            continue
+
+        # layers, which are not in the table, are estimated by their operations
+        estimated.append(individ.estimate_latency(table, batch_size))
+        predicted.append(individ.estimate_latency(table, batch_size, measure_missing=True))
+        measured.append(latency)
+
+    predicted, measured, estimated = np.array(predicted), np.array(measured), np.array(estimated)
+    print('Networks: {}, measured latency: {:.3f} ms on average'.format(len(measured), 1000 * measured.mean()))
+    print('Relative error, missing layers estimated: {:.1%}'.format(np.median(np.abs(estimated - measured) / measured)))
+    print('Relative error, missing layers measured: {:.1%}'.format(np.median(np.abs(predicted - measured) / measured)))
+    print('Rank correlation: {:.3f}'.format(np.corrcoef(np.argsort(np.argsort(predicted)), np.argsort(np.argsort(measured)))[0, 1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare sequential evaluation of the population with the pool of worker processes
+"""
+import os
+import time
+
+import numpy as np
+import torch
+
+from common import grown_population
+import neuvol
+
+
+def evaluation(network, batches=20, batch_size=8):
+    """
+    Short training on random data, as the evaluation function of the notebook does on CIFAR
+    """
+    optimizer = torch.optim.SGD(network.parameters(), lr=0.001, momentum=0.9)
+    criterion = torch.nn.CrossEntropyLoss()
+
+    for _ in range(batches):
+        x = torch.randn(batch_size, 3, 32, 32)
+        y = torch.randint(0, 10, (batch_size, ))
+        optimizer.zero_grad()
+        loss = criterion(network(x), y)
+        loss.backward()
+        optimizer.step()
+
+    return -loss.item()
+
+
+def sequential(population):
+    torch.set_num_threads(1)
+    for individ in population:
+        try:
+            individ.result = evaluation(individ.init_net())
+        except Exception:
+            individ.result = 0.0
+
+
+def main(population_size=20, grown_steps=5, workers=None):
+    np.random.seed(0)
+    torch.manual_seed(0)
+    population = grown_population(population_size, grown_steps)
+    workers = workers or os.cpu_count()
+
+    start = time.perf_counter()
+    sequential(population)
+    sequential_time = time.perf_counter() - start
+
+    with neuvol.ParallelEvaluator(evaluation, workers=workers, threads_per_worker=1, affinity=True) as evaluator:
+        # the first call includes start of the workers
+        evaluator.evaluate(population[:workers])
+
+        start = time.perf_counter()
+        evaluator.evaluate(population)
+        parallel_time = time.perf_counter() - start
+
+    print('Population: {}, workers: {}'.format(population_size, workers))
+    print('Sequential: {:.2f} s'.format(sequential_time))
+    print('Parallel: {:.2f} s'.format(parallel_time))
+    print('Speedup: {:.2f}x'.format(sequential_time / parallel_time))
+
+
+if __name__ == "__main__":
+    main()
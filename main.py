@@ -11,46 +11,104 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from keras.datasets import imdb
+import torch
+import torchvision
+import torchvision.transforms as transforms
 
 import neuvol
 
 
+BATCH_SIZE = 8
+# part of the training data, which is used by each evaluation
+TRAIN_PART = 0.1
+EPOCHS = 1
+
+# loaders of the worker process, they are created by the first evaluation
+_LOADERS = {}
+
+
+def loaders(root='./data'):
+    if not _LOADERS:
+        transform = transforms.Compose(
+            [transforms.ToTensor(),
+             transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))])
+
+        trainset = torchvision.datasets.CIFAR10(root=root, train=True, download=True, transform=transform)
+        testset = torchvision.datasets.CIFAR10(root=root, train=False, download=True, transform=transform)
+
+        _LOADERS['train'] = torch.utils.data.DataLoader(trainset, batch_size=BATCH_SIZE, shuffle=True)
+        _LOADERS['test'] = torch.utils.data.DataLoader(testset, batch_size=BATCH_SIZE, shuffle=False)
+
+    return _LOADERS['train'], _LOADERS['test']
+
+
+def evaluation(network):
+    """
+    Train the network on the part of CIFAR10 and return its accuracy on the test set
+    """
+    trainloader, testloader = loaders()
+    criterion = torch.nn.CrossEntropyLoss()
+    optimizer = torch.optim.SGD(network.parameters(), lr=0.001, momentum=0.9)
+
+    network.train()
+    for _ in range(EPOCHS):
+        for i, (inputs, labels) in enumerate(trainloader):
+            if i >= int(len(trainloader) * TRAIN_PART):
+                break
+
+            optimizer.zero_grad()
+            loss = criterion(network(inputs), labels)
+            loss.backward()
+            optimizer.step()
+
+    network.eval()
+    correct = 0
+    total = 0
+    with torch.no_grad():
+        for inputs, labels in testloader:
+            correct += (network(inputs).argmax(-1) == labels).sum().item()
+            total += len(labels)
+
+    return correct / total
+
+
 def main():
-    (x_train, y_train), (x_test, y_test) = imdb.load_data(
-        path="imdb.npz",
-        num_words=30000,
-        skip_top=0,
-        maxlen=100,
-        seed=113,
-        start_char=1,
-        oov_char=2,
-        index_from=3)
-
-    evaluator = neuvol.Evaluator(x_train, y_train, kfold_number=1)
-    mutator = neuvol.Mutator()
-
-    evaluator.create_tokens = False
-    evaluator.fitness_measure = 'f1'
-    options = {'classes': 2, 'shape': (100,), 'depth': 4}
-
-    wop = neuvol.evolution.Evolution(
-                                    stages=10,
-                                    population_size=10,
-                                    evaluator=evaluator,
-                                    mutator=mutator,
-                                    data_type='text',
-                                    task_type='classification',
-                                    active_distribution=True,
-                                    freeze=None,
-                                    **options)
-    wop.cultivate()
-
-    for individ in wop.population_raw_individ:
+    distribution = neuvol.Distribution()
+    distribution.set_layer_status('cnn2', active=True)
+    distribution.set_layer_status('max_pool2', active=True)
+    distribution.set_layer_status('lstm', active=False)
+    distribution.set_layer_status('max_pool', active=False)
+    distribution.set_layer_status('cnn', active=False)
+    distribution.set_layer_status('dense', active=True)
+    distribution.set_layer_status('decnn2', active=False)
+    distribution.set_layer_status('dropout', active=True)
+
+    options = {'classes': 10, 'shape': (None, 3, 32, 32), 'memory_limit': 4000, 'batch_size': BATCH_SIZE}
+
+    # classification head
+    finisher = neuvol.layer.Layer('dense', distribution, options={'input_rank': 3})
+    finisher.config['units'] = 10
+    finisher.config['activation'] = 'softmax'
+    finisher.config['input_rank'] = 2
+
+    with neuvol.ParallelEvaluator(evaluation, threads_per_worker=1) as evaluator:
+        wop = neuvol.Evolution(
+                               evaluator,
+                               distribution,
+                               finisher,
+                               options,
+                               population_size=10,
+                               individ_type=neuvol.IndividImage)
+        best = wop.cultivate(100)
+
+    for individ in sorted(wop.population, key=lambda individ: individ.result, reverse=True):
         print('Architecture: \n')
-        print(individ.schema)
+        for index, layer_type, config in individ.schema:
+            print(index, layer_type, config)
         print('\nScore: ', individ.result)
 
+    print('\nBest score: ', best.result)
+
 
 if __name__ == "__main__":
     main()
@@ -12,10 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from .crossing import Crosser
+from .evaluation import FitnessCache, Hyperband, LatencyTable, LearningCurveStopping, ParallelEvaluator, ProxyScreening, SuccessiveHalving, Surrogate, TrainingStates
 from .mutation import MutatorBase
 from .probabilty_pool import Distribution
 from .layer import layer, capsule_layer
-from .individs import cradle
+from .individs import cradle, cradle_population
 from .individs import IndividText, IndividImage
+from .evolution import Evolution
+from .selection import ParetoArchive
 
-__all__ = ['Crosser', 'MutatorBase', 'Distribution', 'layer', 'cradle', 'capsule_layer',  'IndividText', 'IndividImage']
+__all__ = ['Crosser', 'FitnessCache', 'Hyperband', 'LatencyTable', 'LearningCurveStopping', 'ParallelEvaluator', 'ProxyScreening', 'SuccessiveHalving', 'Surrogate', 'TrainingStates', 'MutatorBase', 'Distribution', 'layer', 'cradle', 'cradle_population', 'capsule_layer',  'IndividText', 'IndividImage', 'Evolution', 'ParetoArchive']
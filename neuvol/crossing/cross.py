@@ -11,13 +11,21 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import logging
+import uuid
+
 import numpy as np
 
 from ..layer.capsule_layer import detect_best_combination, structure_parser, remove_duplicated_branches
 from ..mutation import MutationInjector
+from ..mutation.base_mutation import MUTATION_ERRORS
 from ..utils import parameters_copy
 
 
+# logger of the library, its file handler is set in config
+LOGGER = logging.getLogger('default')
+
+
 class Crosser:
     def cross(self, individ1, individ2, start_point=1, depth=1000):
         """
@@ -76,13 +84,15 @@ class Crosser:
 
         # select start node - from which cut the selected graph
         # select target node - the end of the selected graph
-        from_index = np.where(individ2.matrix[:, ind2_branch[0]] == 1)[0]
+        graph_index = individ2.graph_index
+        from_index = graph_index.predecessors[ind2_branch[0]]
         if len(from_index) == 0:
             from_index = None
         else:
             from_index = from_index[0]
 
-        to_index = np.where(individ2.matrix[:-1, :-1][ind2_branch[-1]] == 1)[0]
+        # connections to the last layer - finisher are not taken into account
+        to_index = [i for i in graph_index.successors[ind2_branch[-1]] if i < len(graph_index) - 1]
         if len(to_index) == 0:
             to_index = None
         else:
@@ -112,6 +122,42 @@ class Crosser:
 
         return individ2
 
+    def candidates(self, individ1, individ2, number, surrogate=None, top=1):
+        """
+        Cross copies of the individs with random subgraphs and select the most promising children
+
+        Args:
+            individ1 {IndividBase} - donor for the crossing
+            individ2 {IndividBase} - recepient of the new structure
+            number {int} - number of attempts to cross
+            surrogate {Surrogate} - predictor, which ranks children, the first ones are selected without it
+            top {int} - number of selected children
+
+        Return:
+            list{IndividBase} - selected children
+        """
+        size = min(individ1.matrix.shape[0] - 2, individ2.matrix.shape[0] - 2)
+        if size < 2:
+            return []
+
+        children = []
+        for _ in range(number):
+            depth = np.random.randint(1, size)
+            start_point = np.random.randint(1, size)
+            try:
+                child = self.cross(individ1.clone(), individ2.clone(), start_point, depth)
+            except MUTATION_ERRORS as e:
+                LOGGER.info('Crossing of {} and {} is not applicable: {!r}'.format(individ1.name, individ2.name, e))
+                continue
+
+            if child is not None:
+                children.append(child)
+
+        if surrogate is None:
+            return children[:top]
+
+        return surrogate.rank(children, top)
+
     def calculate_complexity(self, individ, branch):
         """
         Calculate summary number of parameters of the individ
@@ -153,7 +199,8 @@ class Crosser:
 
     def inject_branch(self, individ, individ_donor, branch, from_index, to_index):
         """
-        Remove selected branch from the structure using mutation mechanism
+        Inject selected branch of the donor to the structure using mutation mechanism
+        Trained weights of the injected layers are transplanted from the donor
 
         Args:
             individ {IndividBase} - individ for the injection
@@ -163,6 +210,8 @@ class Crosser:
             to_index {int} - the node, to which we inject the branch
         """
         tmp_map = {}
+        # transplanted layers get new uids, so they do not share weights with the same layers of the recipient
+        uids = {}
         # layers_reverse is used to get new layer index after mutation
         # [:-1] - because of last layer, which is temporary finisher
         initial_layers_reverse = set(list(individ.layers_index_reverse.keys())[:-1])
@@ -172,7 +221,12 @@ class Crosser:
             if tmp_map.get(index, None) is None:
                 inject_layer_mutation = MutationInjector(None, None, None, None)
                 inject_layer_mutation.mutation_type = 'inject_layer'
-                inject_layer_mutation.layer = individ_donor.layers_index_reverse[index]
+                layer = individ_donor.layers_index_reverse[index].copy()
+                uid = getattr(layer, 'uid', None)
+                if uid is not None:
+                    layer.uid = uuid.uuid4().hex
+                    uids[uid] = layer.uid
+                inject_layer_mutation.layer = layer
                 inject_layer_mutation.after_layer_index = from_index
                 inject_layer_mutation.before_layer_index = to_index
 
@@ -191,3 +245,13 @@ class Crosser:
                 add_connection_mutation._layer = None
 
                 individ.add_mutation(add_connection_mutation)
+
+        # trained weights of the injected layers are transplanted from the donor with the new uids
+        transplanted = {}
+        for uid, new_uid in uids.items():
+            if uid in individ_donor.weights:
+                (label, shapes, sources), state = individ_donor.weights[uid]
+                transplanted[new_uid] = ((label, shapes, tuple(uids.get(i, i) for i in sources)), state)
+        if transplanted:
+            individ.weights = dict(individ.weights)
+            individ.weights.update(transplanted)
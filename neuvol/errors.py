@@ -23,3 +23,9 @@ class NeuvolArchitectureError(NeuvolError):
     """
     Error in architecture related with shape incompatibilities (e.g. negative size output of CNN)
     """
+
+
+class NeuvolMutationError(NeuvolError):
+    """
+    Mutation is not applicable to the architecture (e.g. there are no layers to connect)
+    """
@@ -0,0 +1,25 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from .fitness_cache import FITNESS_RECORD, FitnessCache
+from .latency import LATENCY_RECORD, LatencyTable
+from .learning_curve import CURVE_MODELS, LearningCurveStopping, extrapolate
+from .parallel import ParallelEvaluator
+from .proxies import PROXIES, ProxyScreening, grad_norm, naswot, synflow
+from .scheduler import Hyperband, SuccessiveHalving, rank
+from .surrogate import LAYER_TYPES, Surrogate, architecture_features
+from .training_state import TRAINING_STATE, TrainingStates
+
+__all__ = ['CURVE_MODELS', 'FITNESS_RECORD', 'FitnessCache', 'Hyperband', 'LATENCY_RECORD', 'LAYER_TYPES', 'LatencyTable',
+           'LearningCurveStopping', 'PROXIES', 'ParallelEvaluator', 'ProxyScreening', 'SuccessiveHalving', 'Surrogate',
+           'TRAINING_STATE', 'TrainingStates', 'architecture_features', 'extrapolate', 'grad_norm', 'naswot', 'rank', 'synflow']
@@ -0,0 +1,226 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import namedtuple
+import io
+import os
+import sqlite3
+import time
+
+import torch
+
+from ..individs.structure.fingerprint import settings_digest
+from .learning_curve import LearningCurveStopping
+
+
+# result of the evaluation, parameters number of the network in MB and evaluation time in seconds
+FITNESS_RECORD = namedtuple('fitness_record', ['result', 'parameters_number', 'time'])
+
+
+class FitnessCache:
+    """
+    Persistent store of evaluation results, which are keyed by the architecture fingerprint
+    and training settings. Records are stored in SQLite database, so they are shared by processes
+    and reused by the next runs. Least recently used records are evicted if the number of records
+    exceeds max_records. Trained weights are stored with the record, so the clones of the evaluated
+    individs get the trained network too, other individs of the same architecture have
+    only the result and are not trained.
+    """
+    def __init__(self, path='fitness_cache.sqlite', max_records=None, timeout=60.0, store_weights=True):
+        """
+        Args:
+            path {str} - path to the database file
+            max_records {int} - maximum number of stored records, None for unlimited
+            timeout {float} - seconds to wait for the lock of the database held by other process
+            store_weights {bool} - store trained weights of the individs with their records
+        """
+        self.path = path
+        self.max_records = max_records
+        self.timeout = timeout
+        self.store_weights = store_weights
+
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        # connection can not be transferred to other process, it is opened again there
+        state = dict(self.__dict__)
+        state['_connection'] = None
+        state['_pid'] = None
+
+        return state
+
+    @property
+    def connection(self):
+        # forked process must not use the connection of the parent
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS fitness ('
+                'fingerprint TEXT NOT NULL, '
+                'settings TEXT NOT NULL, '
+                'result REAL, '
+                'parameters_number REAL, '
+                'time REAL, '
+                'last_access REAL NOT NULL, '
+                'weights BLOB, '
+                'PRIMARY KEY (fingerprint, settings))')
+            # databases of the previous versions have no weights
+            columns = [row[1] for row in self._connection.execute('PRAGMA table_info(fitness)')]
+            if 'weights' not in columns:
+                self._connection.execute('ALTER TABLE fitness ADD COLUMN weights BLOB')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS fitness_access ON fitness (last_access)')
+            self._pid = os.getpid()
+
+        return self._connection
+
+    def get(self, individ, settings=None):
+        """
+        Find the result of the same architecture evaluated with the same settings
+
+        Args:
+            individ {IndividBase} - individ to look for
+            settings {dict} - training settings of the evaluation
+
+        Return:
+            FITNESS_RECORD - stored record or None
+        """
+        key = (individ.fingerprint, settings_digest(settings))
+        row = self.connection.execute(
+            'SELECT result, parameters_number, time FROM fitness WHERE fingerprint = ? AND settings = ?', key).fetchone()
+
+        if row is None:
+            return None
+
+        self.connection.execute(
+            'UPDATE fitness SET last_access = ? WHERE fingerprint = ? AND settings = ?', (time.time(), ) + key)
+
+        return FITNESS_RECORD(*row)
+
+    def get_weights(self, individ, settings=None):
+        """
+        Trained weights of the same architecture evaluated with the same settings
+
+        Return:
+            dict - weights in the format of export_weights, None if they are not stored
+        """
+        key = (individ.fingerprint, settings_digest(settings))
+        row = self.connection.execute(
+            'SELECT weights FROM fitness WHERE fingerprint = ? AND settings = ?', key).fetchone()
+
+        if row is None or row[0] is None:
+            return None
+
+        return torch.load(io.BytesIO(row[0]), map_location='cpu')
+
+    def put(self, individ, record, settings=None):
+        """
+        Store the result of the evaluation and trained weights of the individ
+
+        Args:
+            individ {IndividBase} - evaluated individ
+            record {FITNESS_RECORD} - result of the evaluation
+            settings {dict} - training settings of the evaluation
+        """
+        weights = None
+        if self.store_weights and individ.trained:
+            buffer = io.BytesIO()
+            torch.save(individ.weights, buffer)
+            weights = buffer.getvalue()
+
+        key = (individ.fingerprint, settings_digest(settings))
+        self.connection.execute(
+            'INSERT OR REPLACE INTO fitness VALUES (?, ?, ?, ?, ?, ?, ?)',
+            key + tuple(None if value is None else float(value) for value in record) + (time.time(), weights))
+
+        if self.max_records is not None:
+            self.evict(self.max_records)
+
+    def evict(self, max_records):
+        """
+        Remove least recently used records
+
+        Args:
+            max_records {int} - number of records to keep
+        """
+        self.connection.execute(
+            'DELETE FROM fitness WHERE rowid IN '
+            '(SELECT rowid FROM fitness ORDER BY last_access DESC LIMIT -1 OFFSET ?)', (max_records, ))
+
+    def evaluate(self, individ, evaluation, settings=None, budget=None, stopping=None):
+        """
+        Set the result of the individ from the cache, otherwise initialize the network,
+        evaluate and store the result, trained weights are kept by the individ.
+        Stored weights are set to the individ, if they belong to its layers (clone of the evaluated individ),
+        otherwise the individ has only the result and its trained property is False.
+        Exceptions of the network initialization and evaluation are not handled
+
+        Args:
+            individ {IndividBase} - individ to evaluate
+            evaluation {callable} - function, which takes torch Module and returns fit measure,
+                with stopping it takes LearningCurveStopping as callback keyword too
+            settings {dict} - training settings of the evaluation, which affect the result
+            budget {int} - training budget of the evaluation, it is the fidelity of the result
+            stopping {dict} - arguments of LearningCurveStopping, max_steps is the budget by default,
+                result of the stopped training is not stored, its fidelity is the last observed step
+
+        Return:
+            FITNESS_RECORD - record of the individ
+        """
+        record = self.get(individ, settings)
+        callback = None
+
+        if record is None:
+            start = time.time()
+            network = individ.init_net()
+            if stopping is None:
+                result = evaluation(network)
+            else:
+                callback = LearningCurveStopping(individ, **dict({'max_steps': budget}, **stopping))
+                result = evaluation(network, callback=callback)
+            record = FITNESS_RECORD(result, individ.result_params, time.time() - start)
+            individ.save_weights(network)
+
+            if callback is None or not callback.stopped:
+                self.put(individ, record, settings)
+
+        elif not individ.trained:
+            weights = self.get_weights(individ, settings)
+            uids = {getattr(layer, 'uid', None) for layer in individ.layers_index_reverse.values()}
+            if weights is not None and set(weights) <= uids:
+                individ.weights = weights
+                individ.trained = True
+
+        individ.result = record.result
+        individ.result_params = record.parameters_number
+        if callback is not None and callback.stopped:
+            # result of the stopped training is obtained with the part of the budget
+            individ.fidelity = callback.steps[-1]
+        elif budget is not None:
+            individ.fidelity = budget
+
+        return record
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM fitness').fetchone()[0]
+
+    def clear(self):
+        self.connection.execute('DELETE FROM fitness')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+        self._connection = None
+        self._pid = None
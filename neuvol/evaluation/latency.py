@@ -0,0 +1,271 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import namedtuple
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+
+from ..individs.memory import live_layers
+from ..individs.structure.fingerprint import layer_label
+from .scheduler import EVALUATION_ERRORS
+
+
+# logger of the library, its file handler is set in config
+LOGGER = logging.getLogger('default')
+
+# measured forward time of the layer in seconds and its floating point operations
+LATENCY_RECORD = namedtuple('latency_record', ['layer_type', 'time', 'flops'])
+
+
+def _inputs(structure, index, live):
+    """
+    Layers, which outputs are the inputs of the layer
+    """
+    return [structure.layers_index_reverse[i] for i in structure.graph_index.predecessors[index] if i in live]
+
+
+def _shape_key(shape):
+    return [None if i is None else int(i) for i in shape]
+
+
+def layer_key(layer, input_layers, batch_size):
+    """
+    Key of the layer in the table: its type and parameters, shapes of its inputs and the batch size
+
+    Return:
+        str - json representation of the key
+    """
+    return json.dumps([layer_label(layer), [_shape_key(i.shape) for i in input_layers], batch_size])
+
+
+def _step(layer, input_layers):
+    """
+    Build the layer with the concatenation and reshaper of its inputs, the same as in the network
+    """
+    layer = layer.copy()
+
+    if len(input_layers) > 1:
+        concat, reshaper, instance = layer([None for _ in input_layers], input_layers)
+        reshapers, axis = concat
+        if reshapers is not None:
+            reshapers = [i.init_layer(None) for i in reshapers]
+        concat = (reshapers, axis)
+    else:
+        _, reshaper, instance = layer(None, input_layers[0])
+        concat = None
+
+    def step(inputs):
+        if concat is not None:
+            reshapers, axis = concat
+            if reshapers is not None:
+                inputs = [r(inputs[i]) for i, r in enumerate(reshapers)]
+            x = torch.cat(inputs, axis)
+        else:
+            x = inputs[0]
+
+        if reshaper is not None:
+            x = reshaper(x)
+
+        return instance(x)
+
+    if isinstance(instance, torch.nn.Module):
+        instance.eval()
+
+    return step
+
+
+def _random_input(layer, shape, batch_size):
+    shape = (batch_size, *[int(i) for i in shape[1:]])
+    if layer.layer_type == 'embedding':
+        return torch.randint(0, layer.config['vocabular'], shape)
+
+    return torch.randn(shape)
+
+
+class LatencyTable:
+    """
+    Lookup table of the forward latency of the layers on this machine
+    Each layer is measured separately with the inputs of the same shapes as in the network,
+    records are keyed by the layer parameters and the shapes of its inputs and stored in the json file.
+    Latency of the structure is the sum of the latencies of its layers, so it is predicted
+    without building of the whole network. Layers, which are not in the table, are measured
+    on demand or estimated by the linear model of their floating point operations.
+    """
+    def __init__(self, path=None, repeat=10, warmup=2):
+        """
+        Args:
+            path {str} - path to the json file of the table, the table is kept in memory if None
+            repeat {int} - number of the measured forward passes, the median is stored
+            warmup {int} - number of the forward passes before measurement
+        """
+        self.path = path
+        self.repeat = repeat
+        self.warmup = warmup
+
+        self._records = {}
+        # linear models of the time by the operations of each layer type, they are fitted on demand
+        self._models = None
+
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self._records = {key: LATENCY_RECORD(*value) for key, value in json.load(f).items()}
+
+    def save(self):
+        """
+        Write the table to the json file
+        """
+        with open(self.path, 'w') as f:
+            json.dump({key: list(value) for key, value in self._records.items()}, f)
+
+    def measure(self, layer, input_layers, batch_size=1):
+        """
+        Measure forward time of the layer and store it in the table
+
+        Args:
+            layer {Layer} - layer with the calculated shape
+            input_layers {list{Layer}} - layers, which outputs are its inputs
+            batch_size {int} - number of samples in the batch
+
+        Return:
+            LATENCY_RECORD - record of the layer
+        """
+        step = _step(layer, input_layers)
+        inputs = [_random_input(layer, i.shape, batch_size) for i in input_layers]
+
+        times = []
+        with torch.no_grad():
+            for i in range(self.warmup + self.repeat):
+                start = time.perf_counter()
+                step(inputs)
+                if i >= self.warmup:
+                    times.append(time.perf_counter() - start)
+
+        record = LATENCY_RECORD(str(layer.layer_type), float(np.median(times)), int(layer.calculate_flops() * batch_size))
+        self._records[layer_key(layer, input_layers, batch_size)] = record
+        self._models = None
+
+        return record
+
+    def populate(self, individs, batch_size=1):
+        """
+        Measure all layers of the individs, which are not in the table
+
+        Args:
+            individs {list{IndividBase}} - individs with layers of different types and shapes
+            batch_size {int} - number of samples in the batch
+
+        Return:
+            int - number of the new records
+        """
+        number = len(self._records)
+        for individ in individs:
+            try:
+                individ.recalculate_shapes()
+            except EVALUATION_ERRORS as e:
+                LOGGER.info('Layers of the broken network {} are not measured: {!r}'.format(individ.name, e))
+                continue
+
+            structure = individ.architecture
+            layers = live_layers(structure)
+            live = set(layers)
+            for index in layers:
+                layer = structure.layers_index_reverse[index]
+                input_layers = _inputs(structure, index, live)
+                if not input_layers or layer_key(layer, input_layers, batch_size) in self._records:
+                    continue
+
+                try:
+                    self.measure(layer, input_layers, batch_size)
+                except EVALUATION_ERRORS as e:
+                    # layer does not work with these inputs, the network is broken too
+                    LOGGER.info('Layer {} with inputs {} is not measured: {!r}'.format(
+                        layer.layer_type, [_shape_key(i.shape) for i in input_layers], e))
+                    continue
+
+        return len(self._records) - number
+
+    def _fit(self):
+        """
+        Models of the time by floating point operations of each layer type,
+        linear in the logarithmic scale, so small and large layers have the same weight
+        """
+        records = {}
+        for record in self._records.values():
+            records.setdefault(str(record.layer_type), []).append(record)
+
+        self._models = {}
+        for layer_type, values in records.items():
+            flops = np.log1p([i.flops for i in values])
+            times = np.log([i.time for i in values])
+
+            if len(values) > 1 and flops.std() > 0:
+                slope, intercept = np.polyfit(flops, times, 1)
+                self._models[layer_type] = (float(slope), float(intercept))
+            else:
+                self._models[layer_type] = (0.0, float(np.median(times)))
+
+    def estimate(self, layer, batch_size=1):
+        """
+        Forward time of the layer, which is not in the table, by the model of its operations
+
+        Return:
+            float - time in seconds, 0 if there are no records of this layer type
+        """
+        if self._models is None:
+            self._fit()
+
+        if layer.layer_type not in self._models:
+            return 0.0
+
+        slope, intercept = self._models[layer.layer_type]
+
+        return float(np.exp(intercept + slope * np.log1p(layer.calculate_flops() * batch_size)))
+
+    def predict(self, structure, batch_size=1, measure_missing=False):
+        """
+        Forward latency of the structure, shapes should be recalculated before that
+
+        Args:
+            structure {Structure} - structure of the network
+            batch_size {int} - number of samples in the batch
+            measure_missing {bool} - measure layers, which are not in the table, estimate them otherwise
+
+        Return:
+            float - time in seconds
+        """
+        layers = live_layers(structure)
+        live = set(layers)
+
+        latency = 0.0
+        for index in layers:
+            layer = structure.layers_index_reverse[index]
+            input_layers = _inputs(structure, index, live)
+            # input layer passes the data as it is
+            if not input_layers:
+                continue
+
+            record = self._records.get(layer_key(layer, input_layers, batch_size))
+            if record is None and measure_missing:
+                record = self.measure(layer, input_layers, batch_size)
+
+            latency += record.time if record is not None else self.estimate(layer, batch_size)
+
+        return latency
+
+    def __len__(self):
+        return len(self._records)
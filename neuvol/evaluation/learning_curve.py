@@ -0,0 +1,175 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import warnings
+
+import numpy as np
+from scipy.optimize import OptimizeWarning, curve_fit
+from scipy.stats import norm
+
+
+def _power_law(t, a, b, c):
+    return a - b * np.power(t, -c)
+
+
+def _exponential(t, a, b, c):
+    return a - b * np.exp(-c * t)
+
+
+def _logarithmic(t, a, b):
+    return a + b * np.log(t)
+
+
+# parametric models of the learning curve and their initial parameters
+CURVE_MODELS = {
+    'power_law': (_power_law, lambda t, y: (y[-1], y[-1] - y[0], 0.5)),
+    'exponential': (_exponential, lambda t, y: (y[-1], y[-1] - y[0], 1.0 / t[-1])),
+    'logarithmic': (_logarithmic, lambda t, y: (y[0], (y[-1] - y[0]) / max(np.log(t[-1]), 1e-6))),
+}
+
+
+def extrapolate(steps, scores, target_steps, models=None):
+    """
+    Fit the ensemble of parametric learning curves and predict scores at the target steps
+
+    Args:
+        steps {list{float}} - positive steps of training, e.g. number of batches
+        scores {list{float}} - observed scores at these steps
+        target_steps {list{float}} - steps to predict
+        models {list{str}} - names of CURVE_MODELS, all of them by default
+
+    Return:
+        np.array - predictions of each fitted model, shape (models, target_steps)
+    """
+    steps = np.asarray(steps, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    target_steps = np.asarray(target_steps, dtype=np.float64)
+
+    predictions = []
+    for name in models or CURVE_MODELS:
+        model, initial = CURVE_MODELS[name]
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', OptimizeWarning)
+                warnings.simplefilter('ignore', RuntimeWarning)
+                parameters, _ = curve_fit(model, steps, scores, p0=initial(steps, scores), maxfev=2000)
+        except (RuntimeError, ValueError, TypeError):
+            continue
+
+        prediction = model(target_steps, *parameters)
+        if np.all(np.isfinite(prediction)):
+            predictions.append(prediction)
+
+    return np.array(predictions).reshape(len(predictions), len(target_steps))
+
+
+class LearningCurveStopping:
+    """
+    Callback of the training loop, which stops hopeless training early
+    After each observation the ensemble of learning curves (power law, exponential, logarithmic)
+    is fitted to the scores observed so far and extrapolated to the end of training.
+    Training is stopped if the predicted final score is unlikely to beat the target,
+    e.g. the k-th best result of the population. Observed and predicted curves are stored
+    in learning_curve of the individ.
+    """
+    def __init__(self, individ, max_steps, target=None, confidence=0.95, min_fraction=0.1, min_points=4, maximize=True, models=None):
+        """
+        Args:
+            individ {IndividBase} - trained individ
+            max_steps {int} - steps of the whole training budget
+            target {float} - score, which should be beaten, stopping is disabled if None
+            confidence {float} - training is stopped if the probability to beat the target is lower than 1 - confidence
+            min_fraction {float} - part of the budget, which is always trained
+            min_points {int} - minimal number of observations to fit curves
+            maximize {bool} - higher score is better (accuracy), False for the loss
+            models {list{str}} - names of CURVE_MODELS, all of them by default
+        """
+        self.individ = individ
+        self.max_steps = max_steps
+        self.target = target
+        self.confidence = confidence
+        self.min_fraction = min_fraction
+        self.min_points = min_points
+        self.maximize = maximize
+        self.models = models
+
+        self.steps = []
+        self.scores = []
+        self.stopped = False
+
+        individ.learning_curve = {'observed': [], 'predicted': []}
+
+    @classmethod
+    def for_population(cls, individ, population, max_steps, k=1, **kwargs):
+        """
+        Callback with the target - k-th best result of the population
+        """
+        results = sorted((i.result for i in population if i.result is not None), reverse=kwargs.get('maximize', True))
+        target = results[k - 1] if len(results) >= k else None
+
+        return cls(individ, max_steps, target, **kwargs)
+
+    def predict(self):
+        """
+        Predict the final score
+
+        Return:
+            tuple - mean and standard deviation of the prediction, None if there are no fitted curves
+        """
+        predictions = extrapolate(self.steps, self.scores, [self.max_steps], self.models)
+        if not len(predictions):
+            return None
+
+        # disagreement of models and the noise of observations
+        residuals = np.diff(self.scores[-self.min_points:]) if len(self.scores) > 1 else [0.0]
+        std = np.sqrt(np.var(predictions[:, 0]) + np.var(residuals))
+
+        return float(np.mean(predictions[:, 0])), float(std)
+
+    def __call__(self, step, score):
+        """
+        Add the observation of the training
+
+        Args:
+            step {int} - step of training, e.g. number of trained batches
+            score {float} - score at this step
+
+        Return:
+            bool - True if training should be stopped
+        """
+        self.steps.append(step)
+        self.scores.append(score)
+        self.individ.learning_curve['observed'].append((step, score))
+
+        if step < self.min_fraction * self.max_steps or len(self.steps) < self.min_points:
+            return False
+
+        prediction = self.predict()
+        if prediction is None:
+            return False
+
+        mean, std = prediction
+        self.individ.learning_curve['predicted'].append((step, mean, std))
+
+        if self.target is None:
+            return False
+
+        # probability to be better than the target
+        if self.maximize:
+            probability = 1 - norm.cdf(self.target, mean, max(std, 1e-12))
+        else:
+            probability = norm.cdf(self.target, mean, max(std, 1e-12))
+
+        self.stopped = probability < 1 - self.confidence
+
+        return self.stopped
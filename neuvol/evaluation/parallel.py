@@ -0,0 +1,231 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import time
+
+import torch
+
+from .fitness_cache import FITNESS_RECORD
+from .scheduler import EVALUATION_ERRORS
+
+
+LOGGER = logging.getLogger('default')
+
+
+# state of the worker process: evaluation function and its settings
+_WORKER = {}
+
+
+def _init_worker(evaluation, threads, affinity, counter, keep_weights=False):
+    """
+    Set the evaluation function, number of torch threads and cpu cores of the worker
+    """
+    _WORKER['evaluation'] = evaluation
+    _WORKER['keep_weights'] = keep_weights
+    torch.set_num_threads(threads)
+
+    if affinity and hasattr(os, 'sched_setaffinity'):
+        with counter.get_lock():
+            index = counter.value
+            counter.value += 1
+
+        # each worker takes its own block of cores
+        cores = sorted(os.sched_getaffinity(0))
+        block = [cores[(index * threads + i) % len(cores)] for i in range(threads)]
+        os.sched_setaffinity(0, set(block))
+
+
+def _evaluate_individ(individ):
+    """
+    Build the network in the worker and evaluate it
+
+    Return:
+        tuple - result, parameters number, time, the error description, trained weights
+            and fingerprint of the evaluated architecture
+    """
+    start = time.time()
+    try:
+        network = individ.init_net()
+        result = _WORKER['evaluation'](network)
+    except EVALUATION_ERRORS as e:
+        # broken network or not enough memory, other exceptions reach the caller through the future
+        return None, None, time.time() - start, repr(e), None, None
+
+    weights = network.export_weights() if _WORKER.get('keep_weights') else None
+
+    return result, individ.result_params, time.time() - start, None, weights, individ.fingerprint
+
+
+class ParallelEvaluator:
+    """
+    Evaluation of the population in the pool of worker processes
+    Individs are pickled and sent to the workers, each worker builds the network with init_net,
+    trains it and returns the result. Each worker uses limited number of torch threads and
+    optionally is pinned to its own cpu cores, so workers do not compete for the same cores.
+    Errors of the broken network (EVALUATION_ERRORS) do not stop the evaluation: the individ gets zero result,
+    other exceptions of the evaluation function are raised in the caller.
+    Crash of the worker process is isolated too - the pool is restarted and unfinished individs are retried.
+    """
+    def __init__(self, evaluation, workers=None, threads_per_worker=1, affinity=False, retries=1,
+                 cache=None, settings=None, start_method=None, keep_weights=False):
+        """
+        Args:
+            evaluation {callable} - function, which takes torch Module and returns fit measure,
+                it should be picklable for the spawn start method
+            workers {int} - number of processes, number of cores divided by threads_per_worker by default
+            threads_per_worker {int} - torch threads of each worker
+            affinity {bool} - pin each worker to its own cores
+            retries {int} - number of attempts to evaluate individ again after the crash of the worker
+            cache {FitnessCache} - store of results, cached individs are not sent to the workers
+            settings {dict} - training settings, which are used as a key in the cache
+            start_method {str} - multiprocessing start method, platform default if None
+            keep_weights {bool} - send trained weights back to the individs, so their children
+                inherit weights of the unchanged layers
+        """
+        self.evaluation = evaluation
+        self.threads_per_worker = threads_per_worker
+        self.workers = workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        self.affinity = affinity
+        self.retries = retries
+        self.cache = cache
+        self.settings = settings
+        self.keep_weights = keep_weights
+
+        self._context = multiprocessing.get_context(start_method)
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            counter = self._context.Value('i', 0)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self._context,
+                initializer=_init_worker,
+                initargs=(self.evaluation, self.threads_per_worker, self.affinity, counter, self.keep_weights))
+
+        return self._pool
+
+    def cached(self, individ):
+        """
+        Set the result of the individ from the cache
+
+        Return:
+            FITNESS_RECORD - stored record or None
+        """
+        if self.cache is None:
+            return None
+
+        record = self.cache.get(individ, self.settings)
+        if record is not None:
+            self._set(individ, record)
+
+        return record
+
+    def submit(self, individ):
+        """
+        Send the individ to the first free worker
+
+        Return:
+            Future - outcome of the worker, which should be passed to collect
+        """
+        return self.pool.submit(_evaluate_individ, individ)
+
+    def collect(self, individ, outcome):
+        """
+        Set the outcome of the worker to the individ and store it in the cache
+
+        Args:
+            individ {IndividBase} - evaluated individ
+            outcome {tuple} - result of the future, None if the worker crashed
+
+        Return:
+            FITNESS_RECORD - record of the individ
+        """
+        if outcome is None:
+            LOGGER.info('Worker crashed while evaluating {}, result is set to zero'.format(individ.name))
+            record = FITNESS_RECORD(0.0, None, 0.0)
+        else:
+            result, parameters_number, spent_time, error, weights, fingerprint = outcome
+            if error is None:
+                record = FITNESS_RECORD(result, parameters_number, spent_time)
+                # weights are trained for the individ, if it was not changed while it was evaluated
+                if weights is not None and fingerprint == individ.fingerprint:
+                    individ.weights = weights
+                    individ.trained = True
+                if self.cache is not None:
+                    self.cache.put(individ, record, self.settings)
+            else:
+                LOGGER.info('Evaluation of the broken network {} failed: {}'.format(individ.name, error))
+                record = FITNESS_RECORD(0.0, None, spent_time)
+
+        self._set(individ, record)
+
+        return record
+
+    def _set(self, individ, record):
+        individ.result = record.result
+        if record.parameters_number is not None:
+            individ.result_params = record.parameters_number
+
+    def evaluate(self, population):
+        """
+        Evaluate individs, result and result_params of each individ are set
+
+        Args:
+            population {list{IndividBase}} - individs to evaluate
+
+        Return:
+            list{FITNESS_RECORD} - records in the order of the population
+        """
+        records = [self.cached(individ) for individ in population]
+        pending = [i for i, record in enumerate(records) if record is None]
+
+        for attempt in range(self.retries + 1):
+            if not pending:
+                break
+
+            futures = [(i, self.submit(population[i])) for i in pending]
+            pending = []
+
+            for i, future in futures:
+                try:
+                    records[i] = self.collect(population[i], future.result())
+                except BrokenProcessPool:
+                    # one of the workers crashed, all of its unfinished tasks are evaluated again
+                    pending.append(i)
+
+            if pending:
+                self.close()
+
+        for i in pending:
+            records[i] = self.collect(population[i], None)
+
+        return records
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
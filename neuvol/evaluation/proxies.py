@@ -0,0 +1,221 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import deque
+
+import numpy as np
+import torch
+
+from .scheduler import EVALUATION_ERRORS
+
+
+# layers, outputs of which are used as activation patterns
+PATTERN_LAYERS = (torch.nn.Linear, torch.nn.Conv1d, torch.nn.Conv2d, torch.nn.ConvTranspose2d, torch.nn.LSTM)
+
+
+def synflow(network, x):
+    """
+    Synaptic flow of the network with absolute weights for the input of ones
+    Parameters of the network are changed, so it should not be trained after that
+
+    Args:
+        network {Network} - initialized network
+        x {torch.Tensor} - batch of data, only its shape and type are used
+
+    Return:
+        float - score, higher is better
+    """
+    network.eval()
+    network.double()
+    with torch.no_grad():
+        for parameter in network.parameters():
+            parameter.abs_()
+
+    network.zero_grad()
+    x = torch.ones_like(x[:1], dtype=torch.float64) if x.is_floating_point() else torch.ones_like(x[:1])
+    torch.sum(network(x)).backward()
+
+    with torch.no_grad():
+        return float(sum((parameter * parameter.grad).abs().sum()
+                         for parameter in network.parameters() if parameter.grad is not None))
+
+
+def grad_norm(network, x, y, loss=None):
+    """
+    Norm of the gradients of the loss at initialization
+
+    Args:
+        network {Network} - initialized network
+        x {torch.Tensor} - batch of data
+        y {torch.Tensor} - targets of the batch
+        loss {callable} - loss function, cross entropy by default
+
+    Return:
+        float - score, higher is better
+    """
+    loss = loss or torch.nn.CrossEntropyLoss()
+
+    network.train()
+    network.zero_grad()
+    loss(network(x), y).backward()
+
+    return float(sum(parameter.grad.norm() for parameter in network.parameters() if parameter.grad is not None))
+
+
+def naswot(network, x):
+    """
+    Log-determinant of the kernel of binary activation patterns of the batch (NASWOT)
+    Layers of the network do not have separate activations, so the sign of each layer output
+    is used as a pattern - it is the gate of the following ReLU
+
+    Args:
+        network {Network} - initialized network
+        x {torch.Tensor} - batch of data, at least two samples
+
+    Return:
+        float - score, higher is better
+    """
+    codes = []
+
+    def hook(module, inputs, output):
+        if isinstance(output, tuple):
+            output = output[0]
+        codes.append((output.detach().reshape(len(output), -1) > 0).double())
+
+    handles = [module.register_forward_hook(hook) for module in network.modules() if isinstance(module, PATTERN_LAYERS)]
+    try:
+        network.eval()
+        with torch.no_grad():
+            network(x)
+    finally:
+        for handle in handles:
+            handle.remove()
+
+    if not codes:
+        return float('-inf')
+
+    codes = torch.cat(codes, 1)
+    kernel = codes @ codes.t() + (1 - codes) @ (1 - codes).t()
+
+    return float(torch.slogdet(kernel)[1])
+
+
+PROXIES = {
+    'synflow': lambda network, x, y, loss: synflow(network, x),
+    'grad_norm': lambda network, x, y, loss: grad_norm(network, x, y, loss),
+    'naswot': lambda network, x, y, loss: naswot(network, x),
+}
+
+
+class ProxyScreening:
+    """
+    Pre-screening of individs with training-free proxies before the evaluation
+    Each proxy is calculated with its own freshly initialized network on the same batch,
+    scores are stored in proxy_scores of the individ. Individs with the score below the percentile
+    of the scores are not trained.
+    """
+    def __init__(self, x, y=None, proxies=('synflow', 'grad_norm', 'naswot'), proxy='synflow', percentile=50, loss=None, window=200):
+        """
+        Args:
+            x {torch.Tensor} - batch of data
+            y {torch.Tensor} - targets of the batch, required for grad_norm
+            proxies {list{str}} - proxies to calculate, names of PROXIES
+            proxy {str} - proxy, which is used for the screening
+            percentile {float} - individs below this percentile of scores are rejected
+            loss {callable} - loss function of grad_norm
+            window {int} - number of the last scores, which define the percentile for single individs
+        """
+        self.x = x
+        self.y = y
+        self.proxies = [name for name in proxies if y is not None or name != 'grad_norm']
+        self.proxy = proxy
+        self.percentile = percentile
+        self.loss = loss
+
+        # scores of the previous individs
+        self.history = deque(maxlen=window)
+
+    def score(self, individ):
+        """
+        Calculate proxies of the individ, broken networks get -inf scores
+
+        Return:
+            dict - proxy name and its score
+        """
+        scores = {}
+        for name in self.proxies:
+            try:
+                # inherited weights are not used, all individs are scored at initialization
+                score = PROXIES[name](individ.init_net(inherit=False), self.x, self.y, self.loss)
+            except EVALUATION_ERRORS:
+                # broken network
+                score = float('-inf')
+
+            scores[name] = score if np.isfinite(score) else float('-inf')
+
+        individ.proxy_scores = scores
+
+        return scores
+
+    def screen(self, population):
+        """
+        Select individs, which should be trained, rejected individs get zero result
+
+        Args:
+            population {list{IndividBase}} - new individs
+
+        Return:
+            list{IndividBase} - individs with the score not lower than the percentile
+        """
+        scores = [self.score(individ)[self.proxy] for individ in population]
+        self.history.extend(scores)
+
+        threshold = self._threshold(scores)
+        selected = []
+
+        for individ, score in zip(population, scores):
+            if score >= threshold and np.isfinite(score):
+                selected.append(individ)
+            else:
+                self._reject(individ)
+
+        return selected
+
+    def accept(self, individ):
+        """
+        Screen single individ against the scores of the previous individs
+
+        Return:
+            bool - True if individ should be trained
+        """
+        score = self.score(individ)[self.proxy]
+        threshold = self._threshold(self.history)
+        self.history.append(score)
+
+        if np.isfinite(score) and score >= threshold:
+            return True
+
+        self._reject(individ)
+
+        return False
+
+    def _threshold(self, scores):
+        scores = [score for score in scores if np.isfinite(score)]
+        if not scores:
+            return float('-inf')
+
+        return np.percentile(scores, self.percentile)
+
+    def _reject(self, individ):
+        individ.result = 0.0
+        individ.fidelity = 0
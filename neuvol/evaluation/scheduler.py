@@ -0,0 +1,222 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import math
+import time
+
+from ..errors import NeuvolArchitectureError
+from .fitness_cache import FITNESS_RECORD
+from .learning_curve import LearningCurveStopping
+
+
+# failures of the broken network: memory limit, incompatible shapes in torch or in the structure,
+# other exceptions are not handled
+EVALUATION_ERRORS = (MemoryError, RuntimeError, ValueError, NeuvolArchitectureError)
+
+
+class SuccessiveHalving:
+    """
+    Multi-fidelity evaluation of the population
+    All individs are trained with the smallest budget, only the best 1/eta part of them
+    is promoted to the eta times larger budget and so on up to the max budget.
+    Networks of promoted individs are trained further, not from scratch.
+    Budget is measured in any units of training (batches, epochs, part of data),
+    which evaluation function understands.
+    With early stopping the training of each rung is stopped, if the learning curve is unlikely
+    to beat the worst promoted result of the rung (the best one at the last rung),
+    stopped individs are not promoted.
+    """
+    def __init__(self, min_budget, max_budget, eta=3, cache=None, settings=None, stopping=None):
+        """
+        Args:
+            min_budget {int} - budget of the first rung
+            max_budget {int} - budget of the last rung
+            eta {int} - reduction factor of the population and growth factor of the budget
+            cache {FitnessCache} - store of results, budget is added to the settings
+            settings {dict} - training settings, which are used as a key in the cache
+            stopping {dict} - arguments of LearningCurveStopping, early stopping is disabled if None,
+                max_steps and target are set by the scheduler
+        """
+        self.min_budget = min_budget
+        self.max_budget = max_budget
+        self.eta = eta
+        self.cache = cache
+        self.settings = settings or {}
+        self.stopping = stopping
+
+    def rungs(self, min_budget=None):
+        """
+        Budgets of the successive rungs
+
+        Args:
+            min_budget {int} - budget of the first rung, min_budget of the scheduler by default
+
+        Return:
+            list{int} - budgets in increasing order
+        """
+        budget = min_budget or self.min_budget
+        budgets = []
+
+        while budget < self.max_budget:
+            budgets.append(budget)
+            budget *= self.eta
+
+        budgets.append(self.max_budget)
+
+        return budgets
+
+    def run(self, population, evaluation, min_budget=None):
+        """
+        Evaluate the population, each individ gets result and fidelity - the budget of the result,
+        broken networks get zero fidelity and are ranked last
+
+        Args:
+            population {list{IndividBase}} - individs to evaluate
+            evaluation {callable} - function, which takes torch Module and additional budget,
+                trains the network further with this budget and returns fit measure,
+                with stopping it takes LearningCurveStopping as callback keyword too
+            min_budget {int} - budget of the first rung, min_budget of the scheduler by default
+
+        Return:
+            list{IndividBase} - population sorted by fidelity and result, the best one is the first
+        """
+        # trained networks of the individs, which could be promoted, and their spent budget and time
+        networks = {}
+        candidates = list(population)
+        rungs = self.rungs(min_budget)
+
+        for rung, budget in enumerate(rungs):
+            survivors_number = max(1, len(candidates) // self.eta) if rung + 1 < len(rungs) else 1
+            for position, individ in enumerate(candidates):
+                target = self._target(candidates[:position], budget, survivors_number)
+                self._evaluate(individ, budget, evaluation, networks, target)
+
+            if rung + 1 < len(rungs):
+                # stopped training is not continued
+                finished = [individ for individ in candidates if individ.fidelity == budget]
+                candidates = sorted(finished, key=lambda individ: -individ.result)[:survivors_number]
+                # networks of the dropped individs are not needed anymore
+                networks = {id(individ): networks[id(individ)] for individ in candidates if id(individ) in networks}
+
+        return rank(population)
+
+    @staticmethod
+    def _target(evaluated, budget, survivors_number):
+        """
+        Worst result, which is promoted, among the individs evaluated with the budget
+
+        Return:
+            float - target of the early stopping, None if there are not enough results
+        """
+        results = sorted((individ.result for individ in evaluated if individ.fidelity == budget), reverse=True)
+
+        return results[survivors_number - 1] if len(results) >= survivors_number else None
+
+    def _evaluate(self, individ, budget, evaluation, networks, target=None):
+        """
+        Train the individ up to the budget, network of the previous rung is continued
+        """
+        settings = dict(self.settings, budget=budget)
+
+        if self.cache is not None:
+            record = self.cache.get(individ, settings)
+            if record is not None:
+                individ.fidelity = budget
+                individ.result = record.result
+                individ.result_params = record.parameters_number
+                return
+
+        try:
+            if id(individ) not in networks:
+                networks[id(individ)] = (individ.init_net(), 0, 0.0)
+            network, spent_budget, spent_time = networks[id(individ)]
+
+            start = time.time()
+            if self.stopping is None:
+                callback = None
+                result = evaluation(network, budget - spent_budget)
+            else:
+                callback = LearningCurveStopping(individ, **dict(self.stopping, max_steps=budget - spent_budget, target=target))
+                result = evaluation(network, budget - spent_budget, callback=callback)
+            spent_time += time.time() - start
+        except EVALUATION_ERRORS:
+            # broken network or not enough memory, zero fidelity excludes it from promotion and targets
+            networks.pop(id(individ), None)
+            individ.fidelity = 0
+            individ.result = 0.0
+            return
+
+        networks[id(individ)] = (network, budget, spent_time)
+        individ.fidelity = budget
+        individ.result = result
+        individ.save_weights(network)
+
+        if callback is not None and callback.stopped:
+            # result of the part of the budget is not stored, the individ is not promoted
+            networks.pop(id(individ))
+            individ.fidelity = spent_budget + callback.steps[-1]
+            return
+
+        if self.cache is not None:
+            self.cache.put(individ, FITNESS_RECORD(result, individ.result_params, spent_time), settings)
+
+
+class Hyperband(SuccessiveHalving):
+    """
+    Successive halving with several brackets, which start from different budgets
+    The population is split between brackets: aggressive bracket starts many individs from the
+    smallest budget, the last bracket trains few individs with the max budget only.
+    """
+    def brackets(self, population_size):
+        """
+        Number of individs and the first budget of each bracket
+
+        Args:
+            population_size {int} - number of individs to split
+
+        Return:
+            list{tuple} - pairs of individs number and the first budget
+        """
+        rungs = self.rungs()
+        s_max = len(rungs) - 1
+
+        weights = [math.ceil((s_max + 1) / (s + 1) * self.eta ** s) for s in range(s_max, -1, -1)]
+        sizes = [population_size * weight // sum(weights) for weight in weights]
+
+        # remainder of the rounding goes to the most aggressive brackets
+        for i in range(population_size - sum(sizes)):
+            sizes[i % len(sizes)] += 1
+
+        return [(size, rungs[s_max - s]) for size, s in zip(sizes, range(s_max, -1, -1))]
+
+    def run(self, population, evaluation):
+        start = 0
+        for size, bracket_budget in self.brackets(len(population)):
+            if size:
+                super().run(population[start:start + size], evaluation, bracket_budget)
+            start += size
+
+        return rank(population)
+
+
+def rank(population):
+    """
+    Sort individs by fidelity, results of the different fidelity are not comparable
+
+    Args:
+        population {list{IndividBase}} - evaluated individs
+
+    Return:
+        list{IndividBase} - sorted individs, the best one is the first
+    """
+    return sorted(population, key=lambda individ: (-(individ.fidelity or 0), -(individ.result or 0.0)))
@@ -0,0 +1,171 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from ..constants import LAYERS_POOL, SPECIAL
+from .scheduler import EVALUATION_ERRORS
+
+
+# layer types of the features, custom layers are counted as the last type
+LAYER_TYPES = sorted(LAYERS_POOL) + sorted(SPECIAL) + ['input']
+
+
+def _type_index(layer):
+    if layer.layer_type in LAYER_TYPES:
+        return LAYER_TYPES.index(layer.layer_type)
+
+    return len(LAYER_TYPES)
+
+
+def architecture_features(individ):
+    """
+    Vector of the architecture features: layer types counts, depth, width, branching,
+    parameters number and path encoding - counts of connected pairs of layer types
+
+    Args:
+        individ {IndividBase} - individ with the mutated structure
+
+    Return:
+        np.array - features
+    """
+    graph_index = individ.graph_index
+    layers_index_reverse = individ.layers_index_reverse
+    types_number = len(LAYER_TYPES) + 1
+
+    types = {index: _type_index(layer) for index, layer in layers_index_reverse.items()}
+    type_counts = np.bincount(list(types.values()), minlength=types_number)
+
+    pairs = np.zeros((types_number, types_number))
+    for node, successors in enumerate(graph_index.successors):
+        for successor in successors:
+            if node in types and successor in types:
+                pairs[types[node], types[successor]] += 1
+
+    # depth of each layer and number of paths from the input along the topological order
+    depth = np.zeros(len(graph_index))
+    paths = np.zeros(len(graph_index))
+    if graph_index.order is not None and len(graph_index):
+        paths[0] = 1
+        for node in graph_index.order:
+            for successor in graph_index.successors[node]:
+                depth[successor] = max(depth[successor], depth[node] + 1)
+                paths[successor] += paths[node]
+
+    reachable = sorted(graph_index.reachable)
+    width = np.bincount(depth[reachable].astype(int)).max() if reachable else 0
+
+    # shapes are calculated for the clone, the layers of the candidate are not changed
+    probe = individ.clone()
+    try:
+        probe.recalculate_shapes()
+        parameters_number = probe.calculate_parameters_number()
+    except MemoryError:
+        parameters_number = individ.options['memory_limit']
+    except EVALUATION_ERRORS:
+        # broken network
+        parameters_number = -1.0
+
+    structure_features = [
+        len(layers_index_reverse),
+        sum(len(successors) for successors in graph_index.successors),
+        depth.max() if len(depth) else 0,
+        width,
+        sum(len(successors) > 1 for successors in graph_index.successors),
+        sum(len(predecessors) > 1 for predecessors in graph_index.predecessors),
+        len(graph_index.sinks),
+        np.log1p(paths.max()) if len(paths) else 0,
+        np.log1p(max(parameters_number, 0.0)),
+        parameters_number < 0,
+    ]
+
+    return np.concatenate([type_counts, pairs.ravel(), structure_features]).astype(np.float64)
+
+
+class Surrogate:
+    """
+    Predictor of the fit measure by architecture features, which is trained on evaluated individs
+    Random forest is retrained after each retrain_every new observations,
+    spread of the trees predictions is used as uncertainty. Candidates are ranked by the upper
+    confidence bound, so uncertain architectures are explored too.
+    """
+    def __init__(self, retrain_every=10, min_samples=10, exploration=1.0, n_estimators=100, random_state=None):
+        """
+        Args:
+            retrain_every {int} - number of new observations before retraining
+            min_samples {int} - minimal number of observations to train the model
+            exploration {float} - weight of the uncertainty in the ranking
+            n_estimators {int} - number of trees
+            random_state {int} - seed of the forest
+        """
+        self.retrain_every = retrain_every
+        self.min_samples = min_samples
+        self.exploration = exploration
+
+        self.model = RandomForestRegressor(n_estimators=n_estimators, min_samples_leaf=2, random_state=random_state)
+        self.fitted = False
+
+        self.features = []
+        self.results = []
+        self._new_observations = 0
+
+    def observe(self, individ):
+        """
+        Add evaluated individ, the model is retrained periodically
+        """
+        if individ.result is None:
+            return
+
+        self.features.append(architecture_features(individ))
+        self.results.append(individ.result)
+        self._new_observations += 1
+
+        if len(self.results) >= self.min_samples and (not self.fitted or self._new_observations >= self.retrain_every):
+            self.fit()
+
+    def fit(self):
+        self.model.fit(np.array(self.features), np.array(self.results))
+        self.fitted = True
+        self._new_observations = 0
+
+    def predict(self, individs):
+        """
+        Predict fit measure of individs
+
+        Return:
+            tuple - arrays of predicted means and standard deviations
+        """
+        features = np.array([architecture_features(individ) for individ in individs])
+        predictions = np.array([tree.predict(features) for tree in self.model.estimators_])
+
+        return predictions.mean(0), predictions.std(0)
+
+    def rank(self, candidates, top=1):
+        """
+        Select the most promising candidates
+
+        Args:
+            candidates {list{IndividBase}} - not evaluated individs
+            top {int} - number of individs to select
+
+        Return:
+            list{IndividBase} - selected individs, the best one is the first
+        """
+        if not self.fitted:
+            return list(candidates[:top])
+
+        mean, std = self.predict(candidates)
+        order = np.argsort(-(mean + self.exploration * std), kind='stable')
+
+        return [candidates[i] for i in order[:top]]
@@ -0,0 +1,164 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import namedtuple
+import os
+
+import torch
+
+
+# trained network of the individ, state of its optimizer and the spent budget
+TRAINING_STATE = namedtuple('training_state', ['fingerprint', 'network', 'optimizer', 'budget'])
+
+
+class TrainingStates:
+    """
+    Training states of the survivors, which continue training in the next generations
+    instead of training from scratch. Network and optimizer state of each individ are kept
+    in memory or spilled to the directory, keyed by the name of the individ, clones get their own names.
+    State is used only while the architecture of the individ is unchanged.
+    """
+    def __init__(self, path=None):
+        """
+        Args:
+            path {str} - directory of the spill files, states are kept in memory if None
+        """
+        self.path = path
+        self._states = {}
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, '{}.pt'.format(name))
+
+    def save(self, individ, network, optimizer=None, budget=0):
+        """
+        Keep the training state of the individ
+
+        Args:
+            individ {IndividBase} - trained individ
+            network {Network} - its trained network
+            optimizer {torch.optim.Optimizer} - optimizer of the network
+            budget {int} - total budget, which the network is trained with
+        """
+        optimizer_state = optimizer.state_dict() if optimizer is not None else None
+
+        if self.path is None:
+            self._states[individ.name] = TRAINING_STATE(individ.fingerprint, network, optimizer_state, budget)
+        else:
+            torch.save(TRAINING_STATE(individ.fingerprint, network.state_dict(), optimizer_state, budget)._asdict(),
+                       self._file(individ.name))
+
+    def load(self, individ):
+        """
+        Training state of the individ
+
+        Return:
+            TRAINING_STATE - state with the network, None if there is no state for the current architecture
+        """
+        if self.path is None:
+            state = self._states.get(individ.name)
+        elif os.path.exists(self._file(individ.name)):
+            state = TRAINING_STATE(**torch.load(self._file(individ.name), map_location='cpu'))
+        else:
+            state = None
+
+        if state is None or state.fingerprint != individ.fingerprint:
+            return None
+
+        if self.path is not None:
+            network = individ.init_net()
+            network.load_state_dict(state.network)
+            state = state._replace(network=network)
+
+        return state
+
+    def discard(self, individ):
+        """
+        Remove the state of the individ
+        """
+        self._states.pop(individ.name, None)
+        if self.path is not None and os.path.exists(self._file(individ.name)):
+            os.remove(self._file(individ.name))
+
+    def keep_only(self, population):
+        """
+        Remove states of the individs, which are not in the population
+        """
+        names = {individ.name for individ in population}
+        for name in self.names():
+            if name not in names:
+                self._states.pop(name, None)
+                if self.path is not None:
+                    os.remove(self._file(name))
+
+    def names(self):
+        """
+        Names of the individs with the stored states
+        """
+        if self.path is None:
+            return list(self._states)
+
+        return [name[:-len('.pt')] for name in os.listdir(self.path) if name.endswith('.pt')]
+
+    def train(self, individ, evaluation, optimizer, budget, device=None, full_budget=None):
+        """
+        Continue training of the individ with the additional budget. Individs without the state
+        continue from their trained weights with new optimizer, their fidelity is the spent budget.
+        Individs without the state and trained weights, e.g. with the result from the fitness cache,
+        are trained from init_net with full_budget, they are refused if full_budget is None.
+        Result, fidelity - the total budget, and trained weights are set to the individ
+
+        Args:
+            individ {IndividBase} - individ to train
+            evaluation {callable} - function, which takes network, optimizer and additional budget,
+                trains the network further and returns fit measure
+            optimizer {callable} - function, which takes network and returns its torch optimizer
+            budget {int} - additional budget of the training
+            device {str} - device of the network, optimizer state is moved there too
+            full_budget {int} - budget of the training from scratch
+
+        Return:
+            float - result of the individ
+        """
+        state = self.load(individ)
+
+        if state is not None:
+            network, spent = state.network, state.budget
+        elif individ.trained:
+            network, spent = individ.init_net(), individ.fidelity or 0
+        elif full_budget is not None:
+            network, spent, budget = individ.init_net(), 0, full_budget
+        else:
+            raise ValueError('Individ {} has no trained network to continue'.format(individ.name))
+
+        if device is not None:
+            network.to(device)
+
+        network_optimizer = optimizer(network)
+        if state is not None and state.optimizer is not None:
+            network_optimizer.load_state_dict(state.optimizer)
+
+        total_budget = spent + budget
+        result = evaluation(network, network_optimizer, budget)
+
+        self.save(individ, network, network_optimizer, total_budget)
+        individ.save_weights(network)
+        individ.result = result
+        individ.fidelity = total_budget
+
+        return result
+
+    def __len__(self):
+        return len(self.names())
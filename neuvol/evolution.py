@@ -0,0 +1,263 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+import logging
+
+import numpy as np
+
+from .constants import FAKE
+from .crossing import Crosser
+from .individs import IndividImage
+from .mutation import MutatorBase
+from .mutation.base_mutation import MUTATION_ERRORS
+
+
+# logger of the library, its file handler is set in config
+LOGGER = logging.getLogger('default')
+
+
+class Evolution:
+    """
+    Evolution of the population with aging and tournament selection
+    In the steady-state mode there is no generational barrier: each free worker immediately gets
+    a new child of the current population, each result updates the population as soon as it arrives.
+    Population keeps population_size the most recently evaluated individs - the oldest one is
+    removed, parents are selected by the tournament among random individs.
+    In the generational mode the whole population of children is evaluated before the next selection.
+    """
+    def __init__(self, evaluator, distribution, finisher, options, population_size=20, individ_type=IndividImage,
+                 initial_grown=5, tournament_size=5, crossing_probability=0.5, steady_state=True, screening=None,
+                 surrogate=None, candidates_number=10, function_preserving=False):
+        """
+        Args:
+            evaluator {ParallelEvaluator} - pool of workers, which evaluate individs
+            distribution {Distribution} - distribution of layers and mutations
+            finisher {Layer} - the last layer of each individ, e.g. classification head
+            options {dict} - options of the input data and memory limit
+            population_size {int} - number of individs in the population
+            individ_type {type} - class of the individs, IndividImage or IndividText
+            initial_grown {int} - number of layers added to the individs of the initial population
+            tournament_size {int} - number of random individs, the best of them becomes a parent
+            crossing_probability {float} - probability of the child to be created by crossing
+            steady_state {bool} - asynchronous steady-state mode, generational otherwise
+            screening {ProxyScreening} - pre-screening of new individs, rejected ones are not evaluated
+            surrogate {Surrogate} - predictor, which is trained on evaluated individs and selects children
+            candidates_number {int} - number of candidates for each child, which are ranked by the surrogate
+            function_preserving {bool} - layers of the mutations are initialized as the identity mapping,
+                with the inherited weights children start from the function of their parents
+        """
+        self.evaluator = evaluator
+        self.distribution = distribution
+        self.finisher = finisher
+        self.options = options
+        self.population_size = population_size
+        self.individ_type = individ_type
+        self.initial_grown = initial_grown
+        self.tournament_size = tournament_size
+        self.crossing_probability = crossing_probability
+        self.steady_state = steady_state
+        self.screening = screening
+        self.surrogate = surrogate
+        self.candidates_number = candidates_number
+        self.function_preserving = function_preserving
+
+        self.crosser = Crosser()
+        # evaluated individs, the oldest one is the first
+        self.population = deque()
+        self.best = None
+        self.evaluations = 0
+
+        self._spawned = 0
+
+    @property
+    def stage(self):
+        """
+        Number of evaluated populations
+        """
+        return self.evaluations // self.population_size
+
+    def spawn(self):
+        """
+        Create random individ of the initial population
+        """
+        individ = self.individ_type(self.stage, self.options, self.finisher, distribution=self.distribution)
+        for _ in range(self.initial_grown):
+            MutatorBase.grown(individ, self.distribution)
+
+        self._spawned += 1
+
+        return individ
+
+    def tournament(self):
+        """
+        Select the best one among random individs of the population
+        """
+        size = min(self.tournament_size, len(self.population))
+        candidates = [self.population[i] for i in np.random.choice(len(self.population), size, replace=False)]
+
+        return max(candidates, key=lambda individ: individ.result)
+
+    def child(self):
+        """
+        Create new individ by crossing or mutation of the selected parents
+        With the surrogate the most promising of candidates_number children is selected
+        """
+        if self.surrogate is None:
+            child = self._candidate()
+        else:
+            child = self.surrogate.rank([self._candidate() for _ in range(self.candidates_number)])[0]
+
+        child.stage = self.stage
+        child.name = FAKE.name().replace(' ', '_') + '_' + str(self.stage)
+
+        return child
+
+    def _candidate(self):
+        parent = self.tournament()
+        children = []
+
+        if len(self.population) > 1 and np.random.rand() < self.crossing_probability:
+            children = self.crosser.candidates(self.tournament(), parent, 1)
+
+        child = children[0] if children else parent.clone()
+
+        try:
+            MutatorBase.mutate(child, self.distribution, function_preserving=self.function_preserving)
+        except MUTATION_ERRORS as e:
+            LOGGER.info('Mutation of the child of {} is not applicable: {!r}'.format(parent.name, e))
+        child.architecture.freeze_state()
+
+        # mutation is not applicable or creates a cycle, the child is grown by a new layer,
+        # so it is not a copy of the parent
+        if child.fingerprint == parent.fingerprint:
+            MutatorBase.grown(child, self.distribution)
+
+        return child
+
+    def next_individ(self):
+        """
+        Individ to evaluate: random one while the initial population is not created, child otherwise
+
+        Return:
+            IndividBase - new individ or None if there are no evaluated parents yet
+        """
+        if self._spawned < self.population_size:
+            return self.spawn()
+
+        if not self.population:
+            return None
+
+        return self.child()
+
+    def accept(self, individ):
+        """
+        Add evaluated individ to the population, the oldest individ is removed
+        """
+        if individ.result is None:
+            individ.result = 0.0
+
+        self.population.append(individ)
+        if len(self.population) > self.population_size:
+            self.population.popleft()
+
+        if self.best is None or individ.result > self.best.result:
+            self.best = individ
+
+        if self.surrogate is not None:
+            self.surrogate.observe(individ)
+
+        self.evaluations += 1
+
+    def cultivate(self, evaluations):
+        """
+        Run the evolution
+
+        Args:
+            evaluations {int} - number of individs to evaluate, including the initial population
+
+        Return:
+            IndividBase - the best evaluated individ
+        """
+        if self.steady_state:
+            self._cultivate_steady_state(evaluations)
+        else:
+            self._cultivate_generational(evaluations)
+
+        return self.best
+
+    def _cultivate_generational(self, evaluations):
+        while self.evaluations < evaluations:
+            number = min(self.population_size, evaluations - self.evaluations)
+            individs = [self.next_individ() for _ in range(number)]
+            # the first individs are always evaluated, so there are parents for the next ones
+            if self.screening is not None and self.population:
+                individs = self.screening.screen(individs)
+
+            self.evaluator.evaluate(individs)
+            for individ in individs:
+                self.accept(individ)
+
+    def _cultivate_steady_state(self, evaluations):
+        # future of the worker and the individ with the number of its attempts
+        in_flight = {}
+        # individs, which are evaluated again after the crash of the worker
+        retry = []
+        submitted = self.evaluations
+
+        while self.evaluations < evaluations:
+            # keep all workers busy
+            while len(in_flight) < self.evaluator.workers and submitted < evaluations:
+                if retry:
+                    individ, attempts = retry.pop()
+                else:
+                    individ, attempts = self.next_individ(), 0
+                    if individ is None:
+                        break
+
+                    # the first individs are always evaluated, so there are parents for the next ones
+                    if self.screening is not None and self.population and not self.screening.accept(individ):
+                        continue
+
+                    submitted += 1
+                    if self.evaluator.cached(individ) is not None:
+                        self.accept(individ)
+                        continue
+
+                in_flight[self.evaluator.submit(individ)] = (individ, attempts)
+
+            if not in_flight:
+                continue
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            broken = False
+
+            for future in done:
+                individ, attempts = in_flight.pop(future)
+                try:
+                    outcome = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    if attempts < self.evaluator.retries:
+                        retry.append((individ, attempts + 1))
+                        continue
+                    outcome = None
+
+                self.evaluator.collect(individ, outcome)
+                self.accept(individ)
+
+            if broken:
+                # one of the workers crashed, the pool is restarted on the next submission
+                self.evaluator.close()
@@ -11,9 +11,9 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-from .cradle import cradle
+from .cradle import cradle, cradle_population
 from .structure import StructureImage, StructureText
 from .individ_image import IndividImage
 from .individ_text import IndividText
 
-__all__ = ['cradle', 'StructureText', 'StructureImage', 'IndividImage', 'IndividText']
+__all__ = ['cradle', 'cradle_population', 'StructureText', 'StructureImage', 'IndividImage', 'IndividText']
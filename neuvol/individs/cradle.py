@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+from ..mutation import MutatorBase
 from .individ_image import IndividImage
 from .individ_text import IndividText
 
@@ -34,3 +35,29 @@ def cradle(epochs, options, finisher, distribution, data_type='text', task_type=
     else:
         raise ValueError("Incorrect \"data_type\" argument."
                          "Available values: \"text\", \"image\"")
+
+
+def cradle_population(number, epochs, options, finisher, distribution, data_type='text', task_type='classification', grown=0):
+    """Factory method for the whole population
+
+    Attributes:
+        number (``int``): number of individs
+        epochs (``int``): number of stage evolution
+        options (``dict``): meta of the task: number of classes, shape of input, etc
+        finisher (``str`` or ``Layer``): the end of the network (same for all)
+        data_type (``str``): image or text type
+        task_type (``str``): ?
+        grown (``int``): number of layers added to each individ
+
+    Returns:
+        list of individs
+    """
+    population = [cradle(epochs, options, finisher, distribution, data_type=data_type, task_type=task_type) for _ in range(number)]
+
+    for _ in range(grown):
+        # layers of all individs are sampled at once
+        layers = iter(distribution.sample_layers(number))
+        for individ in population:
+            MutatorBase.grown(individ, distribution, layers)
+
+    return population
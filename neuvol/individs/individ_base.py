@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import copy
 import numpy as np
 
 from ..constants import EVENT, FAKE, TRAINING
@@ -19,6 +20,7 @@ from ..probabilty_pool import Distribution
 from .structure import Structure
 from ..utils import dump
 from .initialization_network import Network, recalculate_shapes
+from .memory import estimate_memory, live_layers
 
 
 class IndividBase:
@@ -35,6 +37,7 @@ class IndividBase:
         """
         self._stage = stage
         self.options = options
+        self._check_options()
         self._finisher = finisher
         self._distribution = distribution
         self._parents = parents
@@ -45,6 +48,20 @@ class IndividBase:
         # fitting metrics
         self._result = None
         self._parameters_number = None
+        # floating point operations of the forward pass for a single sample
+        self._flops = None
+        # predicted forward latency in seconds
+        self._latency = None
+        # training budget, which the result is obtained with
+        self._fidelity = None
+        # training-free scores of the network
+        self._proxy_scores = {}
+        # observed and predicted scores of the training
+        self._learning_curve = None
+        # trained weights of the layers, children start from them
+        self._weights = {}
+        # fingerprint of the architecture, which the weights are trained for
+        self._trained = None
 
         # generate new architecture or load serialised parameters
         if load_data is not None:
@@ -56,6 +73,13 @@ class IndividBase:
     def __str__(self):
         return self.name
 
+    def _check_options(self):
+        """
+        Memory limit is checked against the memory of the whole training batch, so batch_size is required with it
+        """
+        if self.options.get('memory_limit') is not None and self.options.get('batch_size') is None:
+            raise ValueError('batch_size of the training should be set in the options with memory_limit')
+
     def _random_init(self):
         self._architecture = self._random_init_architecture()
 
@@ -68,34 +92,145 @@ class IndividBase:
 
         return architecture
 
-    def init_net(self):
+    def init_net(self, checkpointing=False, inherit=True):
         """
         Return torch Module
+
+        Args:
+            checkpointing {bool} - gradient checkpointing of the chains of layers while training
+            inherit {bool} - copy trained weights of the individ to the network, otherwise
+                all layers are freshly initialized
         """
         if not self._architecture:
             raise Exception('Non initialized net')
 
         self.recalculate_shapes()
-        self.calculate_parameters_number()
+        self._parameters_number = self.calculate_parameters_number()
+        self._flops = self.calculate_flops()
 
-        network = Network(self.architecture)
+        network = Network(self.architecture, self._weights if inherit else {}, checkpointing)
 
         return network
 
+    def save_weights(self, network):
+        """
+        Keep trained weights of the network, unchanged layers of the children are initialized by them
+        """
+        self._weights = network.export_weights()
+        self._trained = self.fingerprint
+
+    def clone(self):
+        """
+        Cheap copy of the individ: distribution, finisher and unchanged layers are shared,
+        only mutable parts of the structure are copied. Clone has its own name and is not evaluated
+        """
+        individ = copy.copy(self)
+        individ._name = FAKE.name().replace(' ', '_') + '_' + str(self._stage)
+        individ._result = None
+        individ._parameters_number = None
+        individ._fidelity = None
+        individ.options = dict(self.options)
+        individ._history = list(self._history)
+        individ._proxy_scores = dict(self._proxy_scores)
+        individ._learning_curve = copy.deepcopy(self._learning_curve)
+        individ._architecture = self._architecture.clone()
+        individ._flops = None
+        individ._latency = None
+
+        return individ
+
+    def snapshot(self):
+        """
+        Frozen copy of the evaluated individ with its name, results and trained weights,
+        mutations of this individ do not change it
+        """
+        individ = self.clone()
+        individ._name = self._name
+        individ._result = self._result
+        individ._parameters_number = self._parameters_number
+        individ._fidelity = self._fidelity
+        individ._flops = self._flops
+        individ._latency = self._latency
+
+        return individ
+
     def recalculate_shapes(self):
         recalculate_shapes(self.architecture)
 
     def calculate_parameters_number(self):
+        """
+        Size of the parameters of the live layers in MB
+        Estimated memory of the training is checked against memory_limit of the options
+        """
+        layers_index_reverse = self.architecture.layers_index_reverse
         acc = 0
-        for i, layer in self.architecture.layers_index_reverse.items():
-            acc += layer.calculate_parameters()
+        for i in live_layers(self.architecture):
+            acc += layers_index_reverse[i].calculate_parameters()
         acc = acc * 4 / 1024 / 1024
 
-        if self.options['memory_limit'] is not None and acc > self.options['memory_limit']:
-            raise MemoryError("Memory limit exceeded by this graph: {}MB occupied and {}MB available".format(round(acc), self.options['memory_limit']))
+        if self.options['memory_limit'] is not None:
+            memory = self.estimate_memory().total / 1024 / 1024
+            if memory > self.options['memory_limit']:
+                raise MemoryError("Memory limit exceeded by this graph: {}MB estimated and {}MB available".format(round(memory), self.options['memory_limit']))
 
         return acc
 
+    def calculate_flops(self):
+        """
+        Floating point operations of the forward pass of the live layers for a single sample,
+        shapes should be recalculated before that
+        """
+        layers_index_reverse = self.architecture.layers_index_reverse
+
+        return sum(layers_index_reverse[i].calculate_flops() for i in live_layers(self.architecture))
+
+    def calculate_macs(self):
+        """
+        Multiply-accumulate operations of the forward pass of the live layers for a single sample,
+        shapes should be recalculated before that
+        """
+        layers_index_reverse = self.architecture.layers_index_reverse
+
+        return sum(layers_index_reverse[i].calculate_macs() for i in live_layers(self.architecture))
+
+    def estimate_latency(self, table, batch_size=1, measure_missing=False):
+        """
+        Predict forward latency of the network by the lookup table of the layers latencies
+
+        Args:
+            table {LatencyTable} - latencies of the layers on the target machine
+            batch_size {int} - number of samples in the batch
+            measure_missing {bool} - measure layers, which are not in the table
+
+        Return:
+            float - time in seconds
+        """
+        self.recalculate_shapes()
+        self._latency = table.predict(self.architecture, batch_size, measure_missing)
+
+        return self._latency
+
+    def estimate_memory(self, batch_size=None, training=True, optimizer=None):
+        """
+        Analytic estimation of the network memory, shapes should be recalculated before that
+
+        Args:
+            batch_size {int} - batch_size of the options by default, the options are checked
+                to have it with memory_limit when the individ is created
+            training {bool} - training mode with gradients and optimizer state
+            optimizer {str} - optimizer of the training parameters in the options by default, adam if it is not set
+
+        Return:
+            MEMORY_ESTIMATE - estimation in bytes
+        """
+        if batch_size is None:
+            if self.options.get('batch_size') is None:
+                raise ValueError('batch_size of the training should be set in the options or passed explicitly')
+            batch_size = self.options['batch_size']
+        optimizer = optimizer or self.options.get('optimizer', 'adam')
+
+        return estimate_memory(self.architecture, batch_size, training, optimizer)
+
     def dump(self):
         # serialise the whole individ
         buffer = {}
@@ -119,6 +254,7 @@ class IndividBase:
         self._name = data_load['name']
         self.stage = data_load['stage']
         self.options = data_load['options']
+        self._check_options()
         self.history =  data_load['history']
 
     @property
@@ -169,9 +305,9 @@ class IndividBase:
     @property
     def schema(self):
         """
-        Get the network schema in textual form
+        Get the network schema in textual form: index, type and config of each layer
         """
-        schema = [(i.type, i.config_all) for i in self._architecture]
+        schema = [(index, layer.layer_type, layer.config) for index, layer in sorted(self.layers_index_reverse.items())]
 
         return schema
 
@@ -182,6 +318,42 @@ class IndividBase:
         """
         return self._result
 
+    @property
+    def fidelity(self):
+        """
+        Get the training budget of the result
+        """
+        return self._fidelity
+
+    @property
+    def proxy_scores(self):
+        """
+        Get the scores of training-free proxies
+        """
+        return self._proxy_scores
+
+    @property
+    def learning_curve(self):
+        """
+        Get observed and predicted scores of the training
+        """
+        return self._learning_curve
+
+    @property
+    def weights(self):
+        """
+        Get trained weights of the layers
+        """
+        return self._weights
+
+    @property
+    def trained(self):
+        """
+        Get whether the weights are trained for the current architecture,
+        otherwise they are inherited from the parents or there are no weights
+        """
+        return self._trained is not None and self._trained == self.fingerprint
+
     @property
     def result_params(self):
         """
@@ -189,6 +361,18 @@ class IndividBase:
         """
         return self._parameters_number
 
+    @property
+    def result_flops(self):
+        """
+        Get number of floating point operations of the graph for a single sample,
+        it is calculated by the shapes if the network was not initialized in this process
+        """
+        if self._flops is None:
+            self.recalculate_shapes()
+            self._flops = self.calculate_flops()
+
+        return self._flops
+
     @name.setter
     def name(self, value):
         self._name = value
@@ -200,10 +384,45 @@ class IndividBase:
         """
         self._result = value
 
+    @fidelity.setter
+    def fidelity(self, value):
+        self._fidelity = value
+
+    @proxy_scores.setter
+    def proxy_scores(self, value):
+        self._proxy_scores = value
+
+    @learning_curve.setter
+    def learning_curve(self, value):
+        self._learning_curve = value
+
+    @weights.setter
+    def weights(self, value):
+        self._weights = value
+
+    @trained.setter
+    def trained(self, value):
+        self._trained = self.fingerprint if value else None
+
     @result_params.setter
     def result_params(self, value):
         self._parameters_number = value
 
+    @property
+    def result_latency(self):
+        """
+        Get predicted forward latency of the graph in seconds, None if it was not estimated
+        """
+        return self._latency
+
+    @result_flops.setter
+    def result_flops(self, value):
+        self._flops = value
+
+    @result_latency.setter
+    def result_latency(self, value):
+        self._latency = value
+
     @history.setter
     def history(self, event):
         """
@@ -286,6 +505,14 @@ class IndividBase:
     def matrix(self):
         return self.architecture.matrix
 
+    @property
+    def graph_index(self):
+        return self._architecture.graph_index
+
+    @property
+    def fingerprint(self):
+        return self._architecture.fingerprint
+
     @property
     def layers_index_reverse(self):
         return self._architecture.layers_index_reverse
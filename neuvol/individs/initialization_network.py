@@ -1,14 +1,44 @@
-import torch
+from collections import namedtuple
+
 import numpy as np
+import torch
+from torch.utils.checkpoint import checkpoint
+
+from ..errors import NeuvolArchitectureError
+from .structure.fingerprint import layer_label
+
+
+# single operation of the compiled network: layer index in the structure, plan positions of its inputs,
+# concatenation (reshapers and axis), reshape layer before the layer, the layer itself
+# and plan positions of the outputs, which are not needed after this step
+PLAN_STEP = namedtuple('plan_step', ['index', 'inputs', 'concat', 'reshaper', 'layer', 'layer_type', 'release'])
+# plan position of the raw network input
+INPUT_SLOT = -1
+# layers, which weights could be split between the copies of the inputs
+WIDENED_MODULES = (torch.nn.Linear, torch.nn.Conv1d, torch.nn.Conv2d)
 
 
 class Network(torch.nn.Module):
-    def __init__(self, structure):
+    def __init__(self, structure, weights=None, checkpointing=False):
+        """
+        Args:
+            structure {Structure} - structure with recalculated shapes
+            weights {dict} - trained weights of the layers (export_weights of the parent network),
+                which are copied to the unchanged layers
+            checkpointing {bool} - gradient checkpointing of the chains of layers while training
+        """
         super(Network, self).__init__()
         self.structure = structure
+        self.checkpointing = checkpointing
         self.layers_pool_inited = self.init_layers(self.structure)
-        
+        self.plan = self.compile_plan()
+        self.chains = self.compile_chains()
+        # indexes of the layers, which got trained weights
+        self.inherited = self.import_weights(weights) if weights else []
+
     def init_layers(self, structure):
+        graph_index = self.structure.graph_index
+
         # pool of layers, which should be initialised and connected
         layers_pool = [0]
 
@@ -23,7 +53,7 @@ class Network(torch.nn.Module):
             layer_index = layers_pool[0]
 
             # find all connections before this layer
-            enter_layers = set(np.where(self.structure.matrix[:, layer_index] == 1)[0])
+            enter_layers = graph_index.predecessors[layer_index]
 
             # check if some of previous layers were not initialized
             # that means - we should initialise them first
@@ -74,7 +104,7 @@ class Network(torch.nn.Module):
             setattr(self, 'layer_{}'.format(layer_index), inited_layer[2])
 
             # find outgoing connections and add them to the pool
-            output_layers = [layer for layer in np.where(self.structure.matrix[layer_index] == 1)[0]
+            output_layers = [layer for layer in graph_index.successors[layer_index]
                                 if layer not in layers_pool and layer not in layers_pool_inited.keys()]
 
             layers_pool.extend(output_layers)
@@ -85,94 +115,341 @@ class Network(torch.nn.Module):
         self.layers_pool_removed = layers_pool_removed
         return layers_pool_inited
         
-    def forward(self, x):
-        # pool of layers, which should be initialised and connected
+    def compile_plan(self):
+        """
+        Resolve the execution order of the graph once
+        Each step keeps the layer instances and the plan positions of its inputs,
+        so forward pass does not walk through the graph for each batch.
+        Output of each step is released after its last consumer
+
+        Return:
+            list{PLAN_STEP} - topologically ordered steps, the last one is the network output
+        """
+        graph_index = self.structure.graph_index
+        layers_index_reverse = self.structure.layers_index_reverse
+
+        # pool of layers, which should be placed to the plan
         layers_pool = [0]
-        buffer_x = {-1: x}
-        last_value = None
+        # layer index and its position in the plan
+        positions = {}
+        plan = []
 
         while layers_pool:
             # take first layer in a pool
             layer_index = layers_pool[0]
             # find all connections before this layer
-            enter_layers = set(np.where(self.structure.matrix[:, layer_index] == 1)[0])
+            enter_layers = graph_index.predecessors[layer_index]
             enter_layers = [i for i in enter_layers if i not in self.layers_pool_removed]
 
-            # check if some of previous layers were not initialized
-            # that means - we should initialise them first
-            not_inited_layers = [i for i in enter_layers if i not in (buffer_x.keys())]
-            not_inited_layers_selected = [layer for layer in not_inited_layers if layer not in self.layers_pool_removed]
+            # check if some of previous layers were not placed
+            # that means - we should place them first
+            not_placed_layers = [i for i in enter_layers if i not in positions]
 
-            if not_inited_layers_selected:
+            if not_placed_layers:
                 # remove layers, which are in pool already
                 # this is possible due to complex connections with different orders
-                not_inited_layers_selected = [layer for layer in not_inited_layers_selected if layer not in layers_pool]
+                not_placed_layers = [layer for layer in not_placed_layers if layer not in layers_pool]
 
-                # add not initialised layers to the pool
-                layers_pool.extend(not_inited_layers_selected)
+                # add not placed layers to the pool
+                layers_pool.extend(not_placed_layers)
 
                 # current layer should be shift to the end of the queue
                 layers_pool.append(layers_pool.pop(0))
                 continue
 
-            # take Layer instance of the previous layers
-            temp_x = [buffer_x[layer] for layer in enter_layers]
+            layer_type = layers_index_reverse[layer_index].layer_type
+            concat, reshaper, layer = self.layers_pool_inited[layer_index]
 
-            # if curent layer is the Input - initialise without any input connections
-            if not enter_layers and self.structure.layers_index_reverse[layer_index].layer_type == 'input':
-                if self.layers_pool_inited[layer_index][0] is not None:
-                    raise "Input layer is not the first one. Incorrect graph structure"
+            # if curent layer is the Input - it takes the raw data
+            if not enter_layers and layer_type == 'input':
+                if concat is not None:
+                    raise NeuvolArchitectureError("Input layer is not the first one. Incorrect graph structure")
 
-                if self.layers_pool_inited[layer_index][1] is not None:
-                    reshaper = self.layers_pool_inited[layer_index][1]  # .init_layer(None)
-                    temp_x = reshaper(buffer_x[-1])
-                else:
-                    temp_x = buffer_x[-1]
-
-                result_x = self.process_layer_output(self.layers_pool_inited[layer_index][2](temp_x), self.structure.layers_index_reverse[layer_index].layer_type)
-                buffer_x[layer_index] = result_x
+                inputs = (INPUT_SLOT, )
+                concat = None
 
             # detect hanging node - some of mutations could remove connection to the layer
             elif not enter_layers:
+                layers_pool.pop(0)
                 continue
 
-            # if there are multiple input connections
-            elif len(enter_layers) > 1:
-                if self.layers_pool_inited[layer_index][0] is not None:
-                    reshapers = self.layers_pool_inited[layer_index][0][0]
-                    axis = self.layers_pool_inited[layer_index][0][1]
+            else:
+                inputs = tuple(positions[layer] for layer in enter_layers)
+
+                # concatenation is applied only for multiple input connections
+                if len(inputs) > 1 and concat is not None:
+                    reshapers, axis = concat
                     if reshapers is not None:
                         reshapers = [i.init_layer(None) for i in reshapers]
-                        temp_x = [r(temp_x[i]) for i, r in enumerate(reshapers)]
-                    temp_x = torch.cat(temp_x, axis)
-
-                if self.layers_pool_inited[layer_index][1] is not None:
-                    temp_x = self.layers_pool_inited[layer_index][1](temp_x)
-
-                result_x = self.process_layer_output(self.layers_pool_inited[layer_index][2](temp_x), self.structure.layers_index_reverse[layer_index].layer_type)
-                buffer_x[layer_index] = result_x
-
-            else:
-                temp_x = temp_x[0]
-                if self.layers_pool_inited[layer_index][1] is not None:
-                    reshaper = self.layers_pool_inited[layer_index][1]  # .init_layer(None)
-                    temp_x = reshaper(temp_x)
+                    concat = (reshapers, axis)
+                else:
+                    concat = None
 
-                result_x = self.process_layer_output(self.layers_pool_inited[layer_index][2](temp_x), self.structure.layers_index_reverse[layer_index].layer_type)
-                buffer_x[layer_index] = result_x
+            positions[layer_index] = len(plan)
+            plan.append(PLAN_STEP(layer_index, inputs, concat, reshaper, layer, layer_type, ()))
 
             # find outgoing connections and add them to the pool
-            output_layers = [layer for layer in np.where(self.structure.matrix[layer_index] == 1)[0]
-                                if layer not in layers_pool and layer not in buffer_x.keys()]
-            
-            last_value = result_x
+            output_layers = [layer for layer in graph_index.successors[layer_index]
+                             if layer not in layers_pool and layer not in positions]
+
             layers_pool.extend(output_layers)
 
             # remove current layer from the pool
             layers_pool.pop(layers_pool.index(layer_index))
-            
-        return last_value
-        
+
+        # the last consumer of each output, outputs without consumers are released at once
+        last_consumer = {}
+        for position, step in enumerate(plan):
+            last_consumer.update({i: position for i in step.inputs})
+            last_consumer.setdefault(position, position)
+
+        release = [[] for _ in plan]
+        for i, position in last_consumer.items():
+            # the last step is the network output
+            if i != len(plan) - 1:
+                release[position].append(i)
+
+        return [step._replace(release=tuple(sorted(release[position]))) for position, step in enumerate(plan)]
+
+    def compile_chains(self, min_length=2):
+        """
+        Find chains of the plan steps, each of them takes only the output of the previous one,
+        which is not used by other steps. Chains are recomputed in the backward pass
+        with the gradient checkpointing, so only their inputs are stored
+
+        Return:
+            dict - plan position of the first step of the chain and of its last step
+        """
+        consumers = [0] * len(self.plan)
+        for step in self.plan:
+            for i in step.inputs:
+                if i != INPUT_SLOT:
+                    consumers[i] += 1
+
+        chains = {}
+        start = 0
+        for position in range(1, len(self.plan) + 1):
+            linked = (position < len(self.plan) and self.plan[position].inputs == (position - 1, )
+                      and consumers[position - 1] == 1)
+            if not linked:
+                if position - start >= min_length:
+                    chains[start] = position - 1
+                start = position
+
+        return chains
+
+    def layer_signature(self, layer_index):
+        """
+        Parameters of the layer, shapes and uids of its inputs
+        Trained weights could be reused only by the layer with the same parameters and input shapes
+        """
+        layers_index_reverse = self.structure.layers_index_reverse
+        predecessors = self.structure.graph_index.predecessors[layer_index]
+        input_shapes = tuple(_shape_key(layers_index_reverse[i].config.get('shape')) for i in predecessors)
+        sources = tuple(getattr(layers_index_reverse[i], 'uid', None) for i in predecessors)
+
+        return layer_label(layers_index_reverse[layer_index]), input_shapes, sources
+
+    def export_weights(self):
+        """
+        Trained weights of the layers, which are kept by the individ for its children
+
+        Return:
+            dict - layer uid and pair of its signature and state dict on cpu
+        """
+        weights = {}
+        for layer_index, (_, _, module) in self.layers_pool_inited.items():
+            uid = getattr(self.structure.layers_index_reverse[layer_index], 'uid', None)
+            if uid is None or not isinstance(module, torch.nn.Module):
+                continue
+
+            state = {name: value.detach().cpu().clone() for name, value in module.state_dict().items()}
+            if state:
+                weights[uid] = (self.layer_signature(layer_index), state)
+
+        return weights
+
+    def import_weights(self, weights):
+        """
+        Copy trained weights to the layers, which config and input shapes are unchanged
+        Layers, inputs of which are widened by function-preserving copies of the parent inputs,
+        get the parent weights split between the copies (Net2Net)
+
+        Args:
+            weights {dict} - result of export_weights
+
+        Return:
+            list{int} - indexes of the layers with copied weights
+        """
+        inherited = []
+        widened = []
+        for layer_index, (_, _, module) in self.layers_pool_inited.items():
+            uid = getattr(self.structure.layers_index_reverse[layer_index], 'uid', None)
+            if uid not in weights or not isinstance(module, torch.nn.Module):
+                continue
+
+            signature, state = weights[uid]
+            if signature[:2] != self.layer_signature(layer_index)[:2]:
+                widened.append((layer_index, module, signature, state))
+            elif _load_state(module, state):
+                inherited.append(layer_index)
+
+        # identity copies are known only after all trained layers are loaded
+        for layer_index, module, signature, state in widened:
+            state = self._widen_state(layer_index, module, signature, state, inherited)
+            if state is not None and _load_state(module, state):
+                inherited.append(layer_index)
+
+        return inherited
+
+    def _widen_state(self, layer_index, module, signature, state, inherited):
+        """
+        Split the parent weights of the inputs between their identity copies
+
+        Return:
+            dict - state of the widened layer, None if inputs are not the copies of the parent inputs
+        """
+        if not isinstance(module, WIDENED_MODULES) or 'weight' not in state:
+            return None
+
+        concat, reshaper, _ = self.layers_pool_inited[layer_index]
+        _, parent_shapes, parent_sources = signature
+        if concat is None or len(set(parent_sources)) != len(parent_sources):
+            return None
+
+        layers_index_reverse = self.structure.layers_index_reverse
+        predecessors = self.structure.graph_index.predecessors[layer_index]
+        if any(i in self.layers_pool_removed for i in predecessors):
+            return None
+
+        shapes = [layers_index_reverse[i].config.get('shape') for i in predecessors]
+        reshapers, axis = concat
+        # each input should be a contiguous block of the features:
+        # convolution takes inputs concatenated by channels, linear layer takes flattened inputs
+        if isinstance(module, torch.nn.Linear):
+            flatten = reshapers is None and axis == 1 and (
+                layers_index_reverse[layer_index].config.get('input_rank') == 2 if reshaper is not None
+                else all(len(shape) == 2 for shape in shapes))
+            flatten = flatten or (reshapers is not None and reshaper is None)
+            if not flatten:
+                return None
+            widths = [int(np.prod(shape[1:])) for shape in shapes]
+        else:
+            if reshapers is not None or reshaper is not None or axis != 1:
+                return None
+            widths = [shape[1] for shape in shapes]
+
+        # parent input of each input and its width
+        inputs = []
+        for i, width, shape in zip(predecessors, widths, shapes):
+            source = self._identity_source(i, parent_sources, inherited)
+            if source is None:
+                return None
+
+            inputs.append((source, width, _shape_key(shape)))
+
+        blocks = {source: (width, shape) for source, width, shape in inputs}
+        if set(blocks) != set(parent_sources):
+            return None
+        if any(blocks[source][1] != shape for source, shape in zip(parent_sources, parent_shapes)):
+            return None
+
+        # positions of the parent inputs in the parent weights
+        offsets = {}
+        offset = 0
+        for source in parent_sources:
+            offsets[source] = offset
+            offset += blocks[source][0]
+
+        if offset != state['weight'].shape[1]:
+            return None
+
+        copies = {source: sum(1 for i in inputs if i[0] == source) for source in parent_sources}
+        weight = torch.cat([state['weight'][:, offsets[source]:offsets[source] + width] / copies[source]
+                            for source, width, _ in inputs], 1)
+
+        return dict(state, weight=weight)
+
+    def _identity_source(self, layer_index, parent_sources, inherited):
+        """
+        Parent input, which the layer is equal to: the layer itself or the input of its
+        function-preserving copy with the identity weights
+        """
+        layers_index_reverse = self.structure.layers_index_reverse
+        graph_index = self.structure.graph_index
+
+        while True:
+            layer = layers_index_reverse[layer_index]
+            uid = getattr(layer, 'uid', None)
+            if uid in parent_sources:
+                return uid
+
+            predecessors = graph_index.predecessors[layer_index]
+            if not layer.config.get('function_preserving', False) or layer_index in inherited or len(predecessors) != 1:
+                return None
+
+            concat, reshaper, _ = self.layers_pool_inited.get(layer_index, (None, None, None))
+            shape = _shape_key(layers_index_reverse[predecessors[0]].config.get('shape'))
+            if reshaper is not None or _shape_key(layer.config.get('shape')) != shape:
+                return None
+
+            layer_index = predecessors[0]
+
+    def forward(self, x):
+        # outputs of the plan steps, raw input is stored in the last slot
+        # outputs are released after their last consumers, so only live activations are kept
+        buffer_x = [None] * len(self.plan) + [x]
+        checkpointing = self.checkpointing and self.training and torch.is_grad_enabled()
+
+        position = 0
+        while position < len(self.plan):
+            end = self.chains.get(position) if checkpointing else None
+
+            if end is None:
+                end = position
+                buffer_x[position] = self.run_step(self.plan[position], self.step_input(self.plan[position], buffer_x))
+            else:
+                # outputs inside the chain are not stored, they are recomputed in the backward pass
+                temp_x = self.step_input(self.plan[position], buffer_x)
+                buffer_x[end] = checkpoint(self.run_chain, temp_x, position, end, use_reentrant=False)
+
+            for step in self.plan[position: end + 1]:
+                for i in step.release:
+                    buffer_x[i] = None
+
+            position = end + 1
+
+        return buffer_x[len(self.plan) - 1] if self.plan else None
+
+    def step_input(self, step, buffer_x):
+        """
+        Input of the plan step: output of the previous step or concatenation of the outputs
+        """
+        if len(step.inputs) == 1:
+            return buffer_x[step.inputs[0]]
+
+        temp_x = [buffer_x[i] for i in step.inputs]
+
+        if step.concat is not None:
+            reshapers, axis = step.concat
+            if reshapers is not None:
+                temp_x = [r(temp_x[i]) for i, r in enumerate(reshapers)]
+            temp_x = torch.cat(temp_x, axis)
+
+        return temp_x
+
+    def run_step(self, step, temp_x):
+        if step.reshaper is not None:
+            temp_x = step.reshaper(temp_x)
+
+        return self.process_layer_output(step.layer(temp_x), step.layer_type)
+
+    def run_chain(self, temp_x, start, end):
+        for step in self.plan[start: end + 1]:
+            temp_x = self.run_step(step, temp_x)
+
+        return temp_x
+
     def process_layer_output(self, x, layer_type):
         """
         Some layer returns intermediate results, usually we dont need that
@@ -183,7 +460,37 @@ class Network(torch.nn.Module):
         else:
             return x
 
+def _shape_key(shape):
+    """
+    Comparable representation of the shape, numpy and python integers are the same
+    """
+    if shape is None:
+        return None
+
+    return tuple(None if i is None else int(i) for i in shape)
+
+
+def _load_state(module, state):
+    """
+    Load the state to the module if names and shapes of all tensors are the same
+
+    Return:
+        bool - True if the state is loaded
+    """
+    own_state = module.state_dict()
+    if own_state.keys() != state.keys():
+        return False
+    if any(own_state[name].shape != value.shape for name, value in state.items()):
+        return False
+
+    module.load_state_dict(state)
+
+    return True
+
+
 def recalculate_shapes(structure):
+    graph_index = structure.graph_index
+
     # pool of layers, which should be initialised and connected
     layers_pool = [0]
 
@@ -198,7 +505,7 @@ def recalculate_shapes(structure):
         layer_index = layers_pool[0]
 
         # find all connections before this layer
-        enter_layers = set(np.where(structure.matrix[:, layer_index] == 1)[0])
+        enter_layers = graph_index.predecessors[layer_index]
 
         # check if some of previous layers were not initialized
         # that means - we should initialise them first
@@ -248,7 +555,7 @@ def recalculate_shapes(structure):
         layers_pool_inited[layer_index] = inited_layer
 
         # find outgoing connections and add them to the pool
-        output_layers = [layer for layer in np.where(structure.matrix[layer_index] == 1)[0]
+        output_layers = [layer for layer in graph_index.successors[layer_index]
                             if layer not in layers_pool and layer not in layers_pool_inited.keys()]
 
         layers_pool.extend(output_layers)
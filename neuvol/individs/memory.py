@@ -0,0 +1,149 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections import namedtuple
+
+import numpy as np
+
+
+# number of the optimizer state tensors per parameter, keys are lowercase names
+OPTIMIZER_STATES = {
+    'sgd': 0,
+    'momentum': 1,
+    'rmsprop': 1,
+    'adagrad': 1,
+    'adam': 2,
+    'adamw': 2,
+}
+
+# estimated bytes: activations of each layer, parameters, their gradients, optimizer state,
+# activations of the whole network and the total peak
+MEMORY_ESTIMATE = namedtuple('memory_estimate', ['layers', 'parameters', 'gradients', 'optimizer', 'activations', 'total'])
+
+
+def optimizer_states(optimizer):
+    """
+    Number of the optimizer state tensors per parameter
+
+    Args:
+        optimizer {str} - name of the optimizer in any case (e.g. RMSprop), torch optimizer class or instance
+
+    Return:
+        int - number of the tensors, unknown optimizers have the state of adam
+    """
+    if not isinstance(optimizer, str):
+        optimizer = getattr(optimizer, '__name__', type(optimizer).__name__)
+
+    return OPTIMIZER_STATES.get(optimizer.lower(), OPTIMIZER_STATES['adam'])
+
+
+def live_layers(structure):
+    """
+    Layers, which are connected to the input and have valid shapes
+    Layers, which are left in the structure after removing, are not included
+
+    Return:
+        list{int} - indexes of the layers
+    """
+    graph_index = structure.graph_index
+    layers_index_reverse = structure.layers_index_reverse
+
+    return [index for index in sorted(graph_index.reachable)
+            if layers_index_reverse[index].config.get('rank', False)
+            and layers_index_reverse[index].config.get('shape') is not None]
+
+
+def _values(shape):
+    return int(np.prod([i for i in shape[1:] if i is not None], dtype=np.int64))
+
+
+def estimate_memory(structure, batch_size=1, training=True, optimizer='adam', bytes_per_value=4):
+    """
+    Analytic estimation of the memory of the network by the shapes of its layers,
+    shapes should be recalculated before that
+
+    Args:
+        structure {Structure} - structure of the network
+        batch_size {int} - number of samples in the batch
+        training {bool} - training mode: outputs of all layers are kept for the backward pass,
+            gradients and optimizer state are allocated. Only live outputs are kept otherwise
+        optimizer {str} - optimizer name, see optimizer_states
+        bytes_per_value {int} - size of the single value, 4 for float32
+
+    Return:
+        MEMORY_ESTIMATE - estimation in bytes
+    """
+    graph_index = structure.graph_index
+    layers_index_reverse = structure.layers_index_reverse
+    layers = live_layers(structure)
+    live = set(layers)
+
+    activations = {}
+    for index in layers:
+        values = _values(layers_index_reverse[index].shape)
+        # concatenation of the inputs is a new tensor too
+        inputs = [i for i in graph_index.predecessors[index] if i in live]
+        if len(inputs) > 1:
+            values += sum(_values(layers_index_reverse[i].shape) for i in inputs)
+
+        activations[index] = values * batch_size * bytes_per_value
+
+    parameters = sum(layers_index_reverse[index].calculate_parameters() for index in layers) * bytes_per_value
+
+    if training:
+        gradients = parameters
+        optimizer_state = parameters * optimizer_states(optimizer)
+        # all outputs are kept for the backward pass, which creates gradients of the largest output
+        activations_peak = sum(activations.values()) + 2 * max(activations.values(), default=0)
+    else:
+        gradients = 0
+        optimizer_state = 0
+        activations_peak = _live_peak(graph_index, layers, activations)
+
+    total = parameters + gradients + optimizer_state + activations_peak
+
+    return MEMORY_ESTIMATE(activations, parameters, gradients, optimizer_state, activations_peak, total)
+
+
+def _live_peak(graph_index, layers, activations):
+    """
+    Peak of the outputs, which are alive during the forward pass:
+    each output is released after its last consumer
+    """
+    if graph_index.order is None:
+        return sum(activations.values())
+
+    live = set(layers)
+    # number of the consumers, which are not computed yet
+    waiting = {index: len([i for i in graph_index.successors[index] if i in live]) for index in layers}
+
+    alive = 0
+    peak = 0
+    for index in graph_index.order:
+        if index not in live:
+            continue
+
+        alive += activations[index]
+        peak = max(peak, alive)
+
+        for i in graph_index.predecessors[index]:
+            if i in live:
+                waiting[i] -= 1
+                if not waiting[i]:
+                    alive -= activations[i]
+
+        # output without consumers is released at once, except the network output
+        if not waiting[index] and index != layers[-1]:
+            alive -= activations[index]
+
+    return peak
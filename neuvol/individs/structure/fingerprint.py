@@ -0,0 +1,175 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from functools import lru_cache
+import hashlib
+import json
+
+import numpy as np
+
+from ...constants import LAYERS_POOL, SPECIAL
+
+
+# config values, which are calculated from the previous layers and do not describe the layer itself,
+# they are excluded from the config of the layers without the pool of parameters
+EXCLUDED_PARAMETERS = ('shape', 'rank', 'state', 'input_filters', 'input_units', 'input_seq', 'input_size', 'padding')
+# parameters of the layers, which are not sampled from the pools of the layer type
+GENERATED_PARAMETERS = ('function_preserving',)
+# parameters of the input layer, they are set by the shape of the data
+INPUT_PARAMETERS = ('shape', 'rank')
+# rounds of Weisfeiler-Lehman refinement of the graphs without topological order
+REFINEMENT_ROUNDS = 3
+
+
+def _generated(layer_type):
+    """
+    Names of the sampled parameters of the layer type, None for the custom layers
+    """
+    if layer_type == 'input':
+        return set(INPUT_PARAMETERS)
+    if layer_type == 'last_dense':
+        layer_type = 'dense'
+    pool = LAYERS_POOL.get(layer_type, SPECIAL.get(layer_type))
+    if pool is None:
+        return None
+
+    return set(pool) | set(GENERATED_PARAMETERS)
+
+
+def _digest(data):
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def _canonical(value):
+    """
+    Python equivalent of the config value, so numpy types and values after serialisation are equal
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_canonical(i) for i in value]
+    if isinstance(value, dict):
+        return {str(key): _canonical(i) for key, i in value.items()}
+
+    return value
+
+
+def settings_digest(settings):
+    """
+    Hash of the training settings or any other json-like data
+
+    Args:
+        settings {dict} - settings of evaluation
+
+    Return:
+        str - hex digest
+    """
+    return _digest(json.dumps(_canonical(settings), sort_keys=True, default=repr))
+
+
+@lru_cache(maxsize=4096)
+def _label_digest(label):
+    return _digest(label)
+
+
+def layer_label(layer):
+    """
+    Hash of the layer type and its sampled parameters, values derived from the input shape
+    are not hashed, so the label is the same before and after the shape calculation
+
+    Args:
+        layer {Layer} - layer instance
+
+    Return:
+        str - hex digest
+    """
+    config = layer.sampled_parameters() if hasattr(layer, 'sampled_parameters') else layer.config
+    generated = _generated(layer.layer_type)
+    parameters = {key: _canonical(value) for key, value in config.items()
+                  if (key in generated if generated is not None else key not in EXCLUDED_PARAMETERS)}
+    label = json.dumps([layer.layer_type, parameters], sort_keys=True, default=repr)
+
+    # the same layers are labeled for each mutated version of the structure
+    return _label_digest(label)
+
+
+def _refine(labels, graph_index, nodes):
+    """
+    Weisfeiler-Lehman refinement: label of each layer is combined with sorted labels of its
+    input and output layers, at most REFINEMENT_ROUNDS times or until the partition stops changing
+    """
+    history = sorted(labels.values())
+    classes = len(set(history))
+
+    for _ in range(REFINEMENT_ROUNDS):
+        labels = {
+            node: _digest('{}|{}|{}'.format(
+                labels[node],
+                ','.join(sorted(labels[i] for i in graph_index.predecessors[node] if i in labels)),
+                ','.join(sorted(labels[i] for i in graph_index.successors[node] if i in labels))))
+            for node in nodes}
+
+        history.extend(sorted(labels.values()))
+        new_classes = len(set(labels.values()))
+        if new_classes == classes:
+            break
+        classes = new_classes
+
+    return history
+
+
+def _propagate(labels, order, neighbours):
+    """
+    Label of each layer combined with the labels of all its neighbours in the direction of the order,
+    so it describes the whole subgraph of the ancestors (or descendants) of the layer
+
+    Args:
+        labels {dict} - layer index and its label
+        order {list{int}} - topological order, neighbours of the layer are before it
+        neighbours {list{list{int}}} - predecessors or successors of each layer
+    """
+    propagated = {}
+    for node in order:
+        if node in labels:
+            propagated[node] = _digest('{}|{}'.format(
+                labels[node], ','.join(sorted(propagated[i] for i in neighbours[node] if i in propagated))))
+
+    return propagated
+
+
+def architecture_fingerprint(graph_index, layers_index_reverse):
+    """
+    Canonical hash of the architecture, which does not depend on the layers indexes,
+    only the layers reachable from the input are hashed, as only they are in the network
+    Label of each layer is combined with the labels of its ancestors in one pass along
+    the topological order and with the labels of its descendants in one pass against it,
+    that is Weisfeiler-Lehman refinement up to the stable partition for the acyclic graph
+    in O(layers * connections). Graphs without order get bounded refinement
+
+    Args:
+        graph_index {GraphIndex} - index of the graph of layers connections
+        layers_index_reverse {dict} - map of layers and their indexes
+
+    Return:
+        str - hex digest
+    """
+    nodes = sorted(i for i in layers_index_reverse if i in graph_index.reachable)
+    labels = {node: layer_label(layers_index_reverse[node]) for node in nodes}
+
+    if graph_index.order is None:
+        return _digest(','.join(_refine(labels, graph_index, nodes)))
+
+    ancestors = _propagate(labels, graph_index.order, graph_index.predecessors)
+    descendants = _propagate(labels, graph_index.order[::-1], graph_index.successors)
+
+    return _digest(','.join(sorted('{}|{}'.format(ancestors[node], descendants[node]) for node in nodes)))
@@ -0,0 +1,369 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import weakref
+
+import numpy as np
+
+
+class LayersGraph:
+    """
+    Directed graph of layers connections stored as adjacency lists
+    Lists of nodes grow with amortized reallocation, each node keeps immutable sets of
+    its successors and predecessors. Copy of the graph shares all these sets, changed nodes
+    get new sets, so copy-on-write costs only O(N) pointers instead of the whole matrix.
+    Dense matrix of connections is built on demand for compatibility.
+    Copy remembers nodes with changed successors, so the topological order is moved to it
+    by these nodes only.
+    """
+    def __init__(self, size=0):
+        self.successors = [frozenset()] * size
+        self.predecessors = [frozenset()] * size
+        self._matrix = None
+        # weak reference to the graph, which this one is copied from, and changed nodes since the copy
+        self._origin = None
+        self._changed = set()
+
+    def __getstate__(self):
+        # reference to the origin is valid only in this process
+        state = dict(self.__dict__)
+        state['_origin'] = None
+
+        return state
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """
+        Create graph from the matrix of connections
+        """
+        graph = cls(len(matrix))
+        for i, j in zip(*np.nonzero(matrix)):
+            graph.add_edge(i, j)
+
+        return graph
+
+    def __len__(self):
+        return len(self.successors)
+
+    def copy(self):
+        """
+        Copy of the graph, which could be changed without affecting this one
+        """
+        graph = LayersGraph()
+        graph.successors = list(self.successors)
+        graph.predecessors = list(self.predecessors)
+        graph._origin = weakref.ref(self)
+
+        return graph
+
+    def changed_since(self, graph):
+        """
+        Nodes with changed successors relative to the graph, which this one is copied from
+
+        Return:
+            set{int} - nodes, new nodes are not included, None if this graph is not a copy of the graph
+        """
+        if self._origin is None or self._origin() is not graph:
+            return None
+
+        return self._changed
+
+    def add_node(self):
+        """
+        Add isolated node to the graph
+
+        Return:
+            int - index of the new node
+        """
+        self.successors.append(frozenset())
+        self.predecessors.append(frozenset())
+        self._matrix = None
+
+        return len(self.successors) - 1
+
+    def _node(self, index):
+        # the same indexing rules as for the matrix: negative indexes, IndexError if out of range
+        return range(len(self.successors))[index]
+
+    def add_edge(self, from_node, to_node):
+        from_node, to_node = self._node(from_node), self._node(to_node)
+        if to_node in self.successors[from_node]:
+            return
+
+        self.successors[from_node] = self.successors[from_node] | {to_node}
+        self.predecessors[to_node] = self.predecessors[to_node] | {from_node}
+        self._matrix = None
+        self._changed.add(from_node)
+
+    def remove_edge(self, from_node, to_node):
+        from_node, to_node = self._node(from_node), self._node(to_node)
+        if to_node not in self.successors[from_node]:
+            return
+
+        self.successors[from_node] = self.successors[from_node] - {to_node}
+        self.predecessors[to_node] = self.predecessors[to_node] - {from_node}
+        self._matrix = None
+        self._changed.add(from_node)
+
+    def has_edge(self, from_node, to_node):
+        return to_node in self.successors[from_node]
+
+    @property
+    def matrix(self):
+        """
+        Read-only dense matrix of connections
+        """
+        if self._matrix is None:
+            size = len(self.successors)
+            matrix = np.zeros((size, size), dtype=np.uint8)
+            for node, successors in enumerate(self.successors):
+                if successors:
+                    matrix[node, list(successors)] = 1
+
+            matrix.flags.writeable = False
+            self._matrix = matrix
+
+        return self._matrix
+
+
+class TopologicalOrder:
+    """
+    Topological order of the graph of layers, which is maintained incrementally (Pearce-Kelly algorithm)
+    New edge is checked for a cycle only in the area of the order between its ends,
+    so usually it costs nearly a constant time instead of the whole graph analysis.
+    Edge removal never breaks the order.
+    """
+    def __init__(self, graph=None):
+        self.graph = None
+        self.position = []  # node and its position in the order
+        self.nodes = []  # position in the order and its node
+        self.acyclic = True
+
+        if graph is not None:
+            self._build(graph)
+
+    def _build(self, graph):
+        """
+        Build the order of the graph with Kahn algorithm
+        """
+        self.graph = graph
+        size = len(graph)
+        self.position = list(range(size))
+        self.nodes = list(range(size))
+
+        in_degree = [len(predecessors) for predecessors in graph.predecessors]
+        queue = [node for node in range(size) if in_degree[node] == 0]
+        nodes = []
+
+        while queue:
+            node = queue.pop()
+            nodes.append(node)
+            for successor in graph.successors[node]:
+                in_degree[successor] -= 1
+                if in_degree[successor] == 0:
+                    queue.append(successor)
+
+        if len(nodes) != size:
+            self.acyclic = False
+            return
+
+        self.nodes = nodes
+        for position, node in enumerate(nodes):
+            self.position[node] = position
+
+    def copy(self):
+        """
+        Independent copy of the order, the graph is shared
+        """
+        order = TopologicalOrder()
+        order.graph = self.graph
+        order.position = list(self.position)
+        order.nodes = list(self.nodes)
+        order.acyclic = self.acyclic
+
+        return order
+
+    def creates_cycle(self, from_node, to_node):
+        """
+        Check if the new edge creates a cycle without adding it
+
+        Return:
+            boolean - is cyclic or not
+        """
+        if from_node == to_node:
+            return True
+
+        lower_bound = self.position[to_node]
+        upper_bound = self.position[from_node]
+        if lower_bound > upper_bound:
+            return False
+
+        return self._forward_search(to_node, upper_bound, from_node, ()) is None
+
+    def update(self, graph):
+        """
+        Move the order to the new version of the graph: new nodes, removed and added edges
+        Only nodes with changed set of successors are compared, if the graph is a copy
+        of the graph of the order, only its changed nodes are visited
+
+        Return:
+            boolean - False if new graph contains a cycle, the order should not be used after that
+        """
+        before = self.graph
+        for node in range(len(self.position), len(graph)):
+            self.position.append(len(self.nodes))
+            self.nodes.append(node)
+
+        changed = graph.changed_since(before)
+        if changed is None:
+            nodes = range(len(graph))
+        else:
+            nodes = sorted(changed.union(range(len(before), len(graph))))
+
+        added = []
+        for node in nodes:
+            successors = graph.successors[node]
+            if node < len(before):
+                if successors is before.successors[node]:
+                    continue
+                successors = successors - before.successors[node]
+
+            added.extend((node, successor) for successor in successors)
+
+        # removed edges can not break the order and they are absent in the new graph already
+        # added edges are inserted one by one, the rest of them is ignored by search
+        self.graph = graph
+        pending = set(added)
+
+        for from_node, to_node in added:
+            pending.discard((from_node, to_node))
+            if not self._insert(from_node, to_node, pending):
+                self.acyclic = False
+                return False
+
+        return True
+
+    def _insert(self, from_node, to_node, pending):
+        """
+        Restore the order after the edge insertion
+
+        Return:
+            boolean - False if the edge creates a cycle
+        """
+        if from_node == to_node:
+            return False
+
+        lower_bound = self.position[to_node]
+        upper_bound = self.position[from_node]
+
+        if lower_bound < upper_bound:
+            # only nodes between the edge ends in the order are affected
+            forward = self._forward_search(to_node, upper_bound, from_node, pending)
+            if forward is None:
+                return False
+
+            backward = self._backward_search(from_node, lower_bound, pending)
+            self._reorder(forward, backward)
+
+        return True
+
+    def _forward_search(self, start, upper_bound, target, pending):
+        """
+        Nodes reachable from the start inside the affected area of the order
+        None is returned if the target is reachable - cycle detected
+        """
+        visited = {start}
+        stack = [start]
+
+        while stack:
+            node = stack.pop()
+            for successor in self.graph.successors[node]:
+                if (node, successor) in pending:
+                    continue
+
+                if successor == target:
+                    return None
+
+                if successor not in visited and self.position[successor] < upper_bound:
+                    visited.add(successor)
+                    stack.append(successor)
+
+        return visited
+
+    def _backward_search(self, start, lower_bound, pending):
+        """
+        Nodes, from which the start is reachable, inside the affected area of the order
+        """
+        visited = {start}
+        stack = [start]
+
+        while stack:
+            node = stack.pop()
+            for predecessor in self.graph.predecessors[node]:
+                if (predecessor, node) in pending:
+                    continue
+
+                if predecessor not in visited and self.position[predecessor] > lower_bound:
+                    visited.add(predecessor)
+                    stack.append(predecessor)
+
+        return visited
+
+    def _reorder(self, forward, backward):
+        """
+        Move all backward nodes before forward nodes using only their own positions
+        """
+        backward = sorted(backward, key=lambda node: self.position[node])
+        forward = sorted(forward, key=lambda node: self.position[node])
+        positions = sorted(self.position[node] for node in backward + forward)
+
+        for position, node in zip(positions, backward + forward):
+            self.position[node] = position
+            self.nodes[position] = node
+
+
+class GraphIndex:
+    """
+    Read-only index of the graph of layers, which is built once for the graph
+    Connections are stored as sorted lists, so consumers do not scan the matrix for each node
+    """
+    def __init__(self, graph, root=0):
+        self.predecessors = [sorted(predecessors) for predecessors in graph.predecessors]
+        self.successors = [sorted(successors) for successors in graph.successors]
+
+        order = TopologicalOrder(graph)
+        # cyclic graph has no order
+        self.order = order.nodes if order.acyclic else None
+
+        self.sources = [node for node, predecessors in enumerate(self.predecessors) if not predecessors]
+        self.sinks = [node for node, successors in enumerate(self.successors) if not successors]
+        self.reachable = self._reachable(root) if root < len(graph) else set()
+
+    def _reachable(self, root):
+        """
+        Nodes, which are reachable from the root (input layer)
+        """
+        visited = {root}
+        stack = [root]
+
+        while stack:
+            node = stack.pop()
+            for successor in self.successors[node]:
+                if successor not in visited:
+                    visited.add(successor)
+                    stack.append(successor)
+
+        return visited
+
+    def __len__(self):
+        return len(self.successors)
@@ -16,7 +16,21 @@ import numpy as np
 
 from ...mutation import MutationInjector
 from ...layer import Layer
-from ...utils import parameters_copy
+from .fingerprint import architecture_fingerprint
+from .graph import GraphIndex, LayersGraph, TopologicalOrder
+
+
+def _connections(graph, after_layer_index, before_layer_index):
+    """
+    Connections addressed by the pair of layers indexes
+    Missing index addresses all outgoing connections of the other layer, as it is in the matrix indexing
+    """
+    if before_layer_index is None:
+        return [(after_layer_index, i) for i in range(len(graph))]
+    if after_layer_index is None:
+        return [(before_layer_index, i) for i in range(len(graph))]
+
+    return [(after_layer_index, before_layer_index)]
 
 
 class Structure:
@@ -31,13 +45,19 @@ class Structure:
         There are two version of some methods, private one exists to work with mutations without
         explicit changes of origin matrix. Public methods work with matrix and other properties explicitly
         and are used for growing changes.
+
+        Private methods never change their arguments: only containers they touch are copied,
+        layers are shared between the origin structure, mutations snapshots and clones.
         """
-        self._matrix = None  # matrix of layers connections
+        self._graph = None  # graph of layers connections
         self._finisher = finisher
-        # matrix and layers indexes should be updated after each mutation and changes of the network
+        # graph and layers indexes should be updated after each mutation and changes of the network
         # to avoid excess computations updated version stored in _matrix_updated
-        self._matrix_mutated = None
+        self._graph_mutated = None
         self._matrix_updated = False
+        # index and fingerprint of the mutated graph, they are built on demand and dropped with the mutated graph
+        self._graph_index = None
+        self._fingerprint = None
 
         self.branchs_end = {}  # last layers of the each branch (indexes)
         self.branchs_counter = [1]
@@ -48,40 +68,42 @@ class Structure:
         self._layers_index_reverse_updated = False
 
         self.mutations_pool = []  # list of all mutations, which will be applied for initialization
+        # states of the structure after each applied mutation, allows to apply only new mutations
+        # each element is a mutation, its config after application and the resulting structure
+        self._mutations_snapshots = []
 
         if data_load is not None:
             self.load(data_load, distribution)
 
-    @parameters_copy
-    def _register_new_layer(self, matrix, layers_index_reverse, new_layer):
-        """Add new layer to the indexers and increase the size of layers matrix
+    def _register_new_layer(self, graph, layers_index_reverse, new_layer):
+        """Add new layer to the indexers and increase the size of layers graph
         NOTE: New connection will be added in outer scope
 
         Args:
             new_layer_name {str} - name of new layer
 
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             int - index of new added layer
         """
-        # create copy of the matrix with shape + 1
-        _matrix = np.zeros((matrix.shape[0] + 1, matrix.shape[1] + 1))
-        _matrix[:matrix.shape[0], :matrix.shape[1]] = matrix
+        # create copy of the graph with one more node
+        _graph = graph.copy()
+        _graph.add_node()
 
+        # layers are shared between structures and never changed, so only new layer is copied
         _layers_index_reverse = dict(layers_index_reverse)
 
         # self.layers_indexes[new_layer] = len(self.layers_indexes)
-        _layers_index_reverse[len(_layers_index_reverse)] = new_layer
-        return _matrix, _layers_index_reverse, len(_layers_index_reverse) - 1
+        _layers_index_reverse[len(_layers_index_reverse)] = new_layer.copy()
+        return _graph, _layers_index_reverse, len(_layers_index_reverse) - 1
 
-    @parameters_copy
-    def _add_layer(self, matrix, layers_index_reverse, branchs_end, layer, branch, branch_out=None):
+    def _add_layer(self, graph, layers_index_reverse, branchs_end, layer, branch, branch_out=None):
         """
         Add layer to the last layer of the branch
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             layers_index_reverse {dict{int, Layer instance}} - indexes of all individ layers
             branchs_end {dict{int, int}} - number of branch and corresponding index of the last layer
             layer {instance of the Layer} - layer to add
@@ -89,15 +111,17 @@ class Structure:
             branch_out {int} - number of the branch after this new layer: if branch is splitted
 
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             dict - new map of branchs and their last layers indexes
         """
+        branchs_end = dict(branchs_end)
+
         # index of the layer to add to
         add_to = branchs_end[branch]
 
-        matrix, layers_index_reverse, index = self._register_new_layer(matrix, layers_index_reverse, layer)
-        matrix[add_to, index] = 1
+        graph, layers_index_reverse, index = self._register_new_layer(graph, layers_index_reverse, layer)
+        graph.add_edge(add_to, index)
 
         # change output branch if branch slitted
         if branch_out is None:
@@ -105,15 +129,14 @@ class Structure:
 
         branchs_end[branch_out] = index
 
-        return matrix, layers_index_reverse, branchs_end
+        return graph, layers_index_reverse, branchs_end
 
-    @parameters_copy
-    def _inject_layer(self, matrix, layers_index_reverse, branchs_end, branchs_counter, layer, before_layer_index, after_layer_index):
+    def _inject_layer(self, graph, layers_index_reverse, branchs_end, branchs_counter, layer, before_layer_index, after_layer_index):
         """
         Add new layer between two given layers or to a one layer
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             layers_index_reverse {dict{int, Layer instance}} - indexes of all individ layers
             branchs_end {dict{int, int}} - number of branch and corresponding index of the last layer
             branchs_counter {list{int}} - array of all branchs currently used
@@ -122,12 +145,15 @@ class Structure:
             before_layer_index {int} - index of the layer, which will be connected to new layer
 
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             dict - new map of branchs and their last layers indexes
             list - new array of branchs indexes
         """
-        matrix, layers_index_reverse, index = self._register_new_layer(matrix, layers_index_reverse, layer)
+        branchs_end = dict(branchs_end)
+        branchs_counter = list(branchs_counter)
+
+        graph, layers_index_reverse, index = self._register_new_layer(graph, layers_index_reverse, layer)
         if before_layer_index is None:
             # generate new branch index, which was not used
             branch_to_create = [i for i in range(1, (1 + len(branchs_counter) + 1))
@@ -135,47 +161,49 @@ class Structure:
             branchs_counter.append(branch_to_create)
             branchs_end[branch_to_create] = index
         else:
-            matrix[after_layer_index, before_layer_index] = 0  # remove old direct connection
-            matrix[index, before_layer_index] = 1
+            # remove old direct connection
+            for i, j in _connections(graph, after_layer_index, before_layer_index):
+                graph.remove_edge(i, j)
+            graph.add_edge(index, before_layer_index)
 
-        matrix[after_layer_index, index] = 1
-        return matrix, layers_index_reverse, branchs_end, branchs_counter
+        for i, j in _connections(graph, after_layer_index, index):
+            graph.add_edge(i, j)
 
-    @parameters_copy
-    def _remove_layer(self, matrix, layers_index_reverse, branchs_end, branchs_counter, layer_index):
+        return graph, layers_index_reverse, branchs_end, branchs_counter
+
+    def _remove_layer(self, graph, layers_index_reverse, branchs_end, branchs_counter, layer_index):
         """
         Remove layer from the structure
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             layers_index_reverse {dict{int, Layer instance}} - indexes of all individ layers
             branchs_end {dict{int, int}} - number of branch and corresponding index of the last layer
             branchs_counter {list{int}} - array of all branchs currently used
             layer {instance of the Layer} - layer to add
 
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             dict - new map of branchs and their last layers indexes
             list - new array of branchs indexes
         """
-        before_layer_indexes = np.where(matrix[:, layer_index] == 1)[0]
-        after_layer_indexes = np.where(matrix[layer_index, :] == 1)[0]
+        graph = graph.copy()
+        branchs_end = dict(branchs_end)
 
-        if before_layer_indexes is None:
-            # restricted operation - network head could not be removed
-            return matrix, layers_index_reverse, branchs_end, branchs_counter
+        before_layer_indexes = sorted(graph.predecessors[layer_index])
+        after_layer_indexes = sorted(graph.successors[layer_index])
 
-        if after_layer_indexes is not None and len(after_layer_indexes) != 0:
+        if after_layer_indexes:
             for i in after_layer_indexes:
                 for j in before_layer_indexes:
-                    matrix[j, i] = 1
-                    matrix[j, layer_index] = 0
-                    matrix[layer_index, i] = 0
+                    graph.add_edge(j, i)
+                    graph.remove_edge(j, layer_index)
+                    graph.remove_edge(layer_index, i)
 
         else:
             for j in before_layer_indexes:
-                matrix[j, layer_index] = 0
+                graph.remove_edge(j, layer_index)
 
         branchs_end_reverse = {value: key for key, value in branchs_end.items()}
         branch_to_remove = branchs_end_reverse.get(layer_index, None)
@@ -185,55 +213,60 @@ class Structure:
 
         # del layers_index_reverse[layer_index]
 
-        return matrix, layers_index_reverse, branchs_end, branchs_counter
+        return graph, layers_index_reverse, branchs_end, branchs_counter
 
-    @parameters_copy
-    def _add_connection(self, matrix, before_layer_index, after_layer_index):
+    def _add_connection(self, graph, before_layer_index, after_layer_index):
         """
         Add connection between two layer. Does not add new layer
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             after_layer_index {int} - index of the layer, from which connection started
             before_layer_index {int} - index of the layer, to which connection will be added
 
         Return:
-            np.array(N, N) - new matrix of connections
+            LayersGraph - new graph of connections
         """
-        matrix[after_layer_index, before_layer_index] = 1
+        graph = graph.copy()
+        for i, j in _connections(graph, after_layer_index, before_layer_index):
+            graph.add_edge(i, j)
 
-        return matrix
+        return graph
 
-    @parameters_copy
-    def _remove_connection(self, matrix, branchs_end, branchs_counter, before_layer_index, after_layer_index):
+    def _remove_connection(self, graph, branchs_end, branchs_counter, before_layer_index, after_layer_index):
         """
         Remove connection between layers in the structure
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             after_layer_index {int} - index of the layer, to which new layer will be connected
             before_layer_index {int} - index of the layer, which will be connected to new layer
 
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
         """
-        matrix[after_layer_index, before_layer_index] = 0
-        matrix[before_layer_index, after_layer_index] = 0
+        graph = graph.copy()
+        branchs_end = dict(branchs_end)
+        branchs_counter = list(branchs_counter)
+
+        for i, j in _connections(graph, after_layer_index, before_layer_index):
+            graph.remove_edge(i, j)
+        for i, j in _connections(graph, before_layer_index, after_layer_index):
+            graph.remove_edge(i, j)
 
         # removed connection assumes new branch
         branch_new = [i for i in range(1, (1 + len(branchs_counter) + 1)) if i not in branchs_counter][0]
         branchs_counter.append(branch_new)
         branchs_end[branch_new] = after_layer_index
 
-        return matrix, branchs_end, branchs_counter
+        return graph, branchs_end, branchs_counter
 
-    @parameters_copy
-    def _merge_branchs(self, matrix, layers_index_reverse, branchs_end, branchs_counter, layer, branchs):
+    def _merge_branchs(self, graph, layers_index_reverse, branchs_end, branchs_counter, layer, branchs):
         """
         Concat a set of branchs to one single layer
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             layers_index_reverse {dict{int, Layer instance}} - indexes of all individ layers
             branchs_end {dict{int, int}} - number of branch and corresponding index of the last layer
             branchs_counter {list{int}} - array of all branchs currently used
@@ -241,17 +274,19 @@ class Structure:
             branchs {list{int}} -- list of branchs to concatenate
 
         Returns:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             dict - new map of branchs and their last layers indexes
             list - new array of branchs indexes
         """
+        branchs_end = dict(branchs_end)
+        branchs_counter = list(branchs_counter)
 
         adds_to = [branchs_end[branch] for branch in branchs]
-        matrix, layers_index_reverse, index = self._register_new_layer(matrix, layers_index_reverse, layer)
+        graph, layers_index_reverse, index = self._register_new_layer(graph, layers_index_reverse, layer)
 
         for branch in adds_to:
-            matrix[branch, index] = 1
+            graph.add_edge(branch, index)
 
         for branch in branchs:
             try:
@@ -274,15 +309,14 @@ class Structure:
         branchs_counter.append(branch_new)
         branchs_end[branch_new] = index
 
-        return matrix, layers_index_reverse, branchs_end, branchs_counter, branch_new
+        return graph, layers_index_reverse, branchs_end, branchs_counter, branch_new
 
-    @parameters_copy
-    def _split_branch(self, matrix, layers_index_reverse, branchs_end, branchs_counter, layers, branch):
+    def _split_branch(self, graph, layers_index_reverse, branchs_end, branchs_counter, layers, branch):
         """
         Split branch into two new branchs
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             layers_index_reverse {dict{int, Layer instance}} - indexes of all individ layers
             branchs_end {dict{int, int}} - number of branch and corresponding index of the last layer
             branchs_counter {list{int}} - array of all branchs currently used
@@ -290,15 +324,18 @@ class Structure:
             branch {int} - branch, which should be splitted
 
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             dict - new map of branchs and their last layers indexes
             list - new array of branchs indexes
         """
+        branchs_end = dict(branchs_end)
+        branchs_counter = list(branchs_counter)
+
         add_to = branchs_end[branch]
         indexes = []
         for layer in layers:
-            matrix, layers_index_reverse, index = self._register_new_layer(matrix, layers_index_reverse, layer)
+            graph, layers_index_reverse, index = self._register_new_layer(graph, layers_index_reverse, layer)
             indexes.append(index)
 
         list_of_branchs_to_create = [i for i in range(1, (len(indexes) + len(branchs_counter) + 1))
@@ -306,7 +343,7 @@ class Structure:
         branchs_counter.extend(list_of_branchs_to_create)
 
         for i, layer_index in enumerate(indexes):
-            matrix[add_to, layer_index] = 1
+            graph.add_edge(add_to, layer_index)
 
             branchs_end[list_of_branchs_to_create[i]] = layer_index
 
@@ -314,7 +351,7 @@ class Structure:
         del branchs_end[branch]
         branchs_counter.pop(branchs_counter.index(branch))
 
-        return matrix, layers_index_reverse, branchs_end, branchs_counter
+        return graph, layers_index_reverse, branchs_end, branchs_counter
 
     def _add_mutation(self, mutation):
         """
@@ -336,12 +373,13 @@ class Structure:
             branch {int} - number of the branch to be connected to
             branch_out {int} - number of the branch after this new layer: if branch is splitted
         """
-        self._matrix, self._layers_index_reverse, self.branchs_end = self._add_layer(
-            self._matrix, self._layers_index_reverse,
+        self._graph, self._layers_index_reverse, self.branchs_end = self._add_layer(
+            self._graph, self._layers_index_reverse,
             self.branchs_end, layer,
             branch, branch_out)
         self._matrix_updated = False
         self._layers_index_reverse_updated = False
+        self._mutations_snapshots = []
 
     def inject_layer(self, layer, before_layer_index, after_layer_index):
         """
@@ -352,12 +390,13 @@ class Structure:
             after_layer_index {int} - index of the layer, to which new layer will be connected
             before_layer_index {int} - index of the layer, which will be connected to new layer
         """
-        self._matrix, self._layers_index_reverse, self.branchs_end, self.branchs_counter = self._inject_layer(
-            self._matrix, self._layers_index_reverse,
+        self._graph, self._layers_index_reverse, self.branchs_end, self.branchs_counter = self._inject_layer(
+            self._graph, self._layers_index_reverse,
             self.branchs_end, self.branchs_counter, layer,
             before_layer_index, after_layer_index)
         self._matrix_updated = False
         self._layers_index_reverse_updated = False
+        self._mutations_snapshots = []
 
     def add_connection(self, before_layer_index, after_layer_index):
         """
@@ -367,9 +406,10 @@ class Structure:
             after_layer_index {int} - index of the layer, from which connection started
             before_layer_index {int} - index of the layer, to which connection will be added
         """
-        self._matrix = self._add_connection(self._matrix, before_layer_index, after_layer_index)
+        self._graph = self._add_connection(self._graph, before_layer_index, after_layer_index)
         self._matrix_updated = False
         self._layers_index_reverse_updated = False
+        self._mutations_snapshots = []
 
     def merge_branchs(self, layer, branchs=None):
         """
@@ -379,11 +419,12 @@ class Structure:
             layer {instance of the Layer} - layer, which will be added after concatenation
             branchs {list{int}} -- list of branchs to concatenate
         """
-        self._matrix, self._layers_index_reverse, self.branchs_end, self.branchs_counter, branchs_end_new = self._merge_branchs(
-            self._matrix, self._layers_index_reverse,
+        self._graph, self._layers_index_reverse, self.branchs_end, self.branchs_counter, branchs_end_new = self._merge_branchs(
+            self._graph, self._layers_index_reverse,
             self.branchs_end, self.branchs_counter, layer, branchs)
         self._matrix_updated = False
         self._layers_index_reverse_updated = False
+        self._mutations_snapshots = []
         return branchs_end_new
 
     def split_branch(self, layers, branch):
@@ -394,51 +435,52 @@ class Structure:
             layers {list{instance of the Layer}} - layers, which form new branchs
             branch {int} - branch, which should be splitted
         """
-        self._matrix, self._layers_index_reverse, self.branchs_end, self.branchs_counter = self._split_branch(
-            self._matrix, self._layers_index_reverse,
+        self._graph, self._layers_index_reverse, self.branchs_end, self.branchs_counter = self._split_branch(
+            self._graph, self._layers_index_reverse,
             self.branchs_end, self.branchs_counter, layers, branch)
 
         self._matrix_updated = False
         self._layers_index_reverse_updated = False
+        self._mutations_snapshots = []
 
-    def _cyclic_check(self, matrix):
+    def _cyclic_check(self, graph, order=None):
         """
         Check if the architecture is cyclic of not
         Neural network should be acyclic
-        Linear combination of connection matrix has to be 0
+        If topological order of the previous graph is known, only changed connections are checked
+        and the order is moved to the new graph in place, otherwise the whole graph is sorted
 
         Args:
-            matrix {np.array{int}} - matrix of layer connections
+            graph {LayersGraph} - graph of layer connections
+            order {TopologicalOrder} - topological order of the graph before the changes
 
         Return:
             boolean - is cyclic or not
         """
-        for i in range(1, len(matrix) + 5):
-            paths = np.linalg.matrix_power(matrix, i)
-            if len(np.where(paths.diagonal() != 0)[0]) != 0:
-                return True
+        if order is not None and order.acyclic:
+            return not order.update(graph)
 
-        return False
+        return not TopologicalOrder(graph).acyclic
 
-    def finisher_applier(self, matrix, layers_index_reverse, branchs_end, branchs_counter):
+    def finisher_applier(self, graph, layers_index_reverse, branchs_end, branchs_counter):
         """
         Apply all legal mutation and add last layer, defined by finisher
 
         Args:
-            matrix {np.array{int}} - matrix of layers connections
+            graph {LayersGraph} - graph of layers connections
             layers_index_reverse {dict{int, Layer instance}} - indexes of all individ layers
             branchs_end {dict{int, int}} - number of branch and corresponding index of the last layer
             branchs_counter {list{int}} - array of all branchs currently used
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             dict - new map of branchs and their last layers indexes
             list - new array of branchs indexes
         """
-        if matrix is None:
-            matrix_copy = np.array(self._matrix)
+        if graph is None:
+            graph_copy = self._graph
         else:
-            matrix_copy = matrix
+            graph_copy = graph
 
         layers_index_reverse_copy = dict(layers_index_reverse) or dict(self._layers_index_reverse)
         branchs_end_copy = dict(branchs_end) or dict(self.branchs_end)
@@ -449,156 +491,275 @@ class Structure:
 
         branchs_to_merge = list(branchs_end_copy.keys())
         if branchs_number > 1:
-            matrix_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp, _ = self._merge_branchs(
-                matrix_copy, layers_index_reverse_copy,
+            graph_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp, _ = self._merge_branchs(
+                graph_copy, layers_index_reverse_copy,
                 branchs_end_copy, branchs_counter_copy,
                 self._finisher, branchs_to_merge)
 
         else:
-            matrix_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp = self._add_layer(
-                matrix_copy, layers_index_reverse_copy,
+            graph_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp = self._add_layer(
+                graph_copy, layers_index_reverse_copy,
                 branchs_end_copy, self._finisher,
                 branchs_to_merge[0])
 
             branchs_counter_copy_tmp = branchs_counter_copy
 
-        return matrix_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp
+        return graph_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp
 
-    def mutations_applier(self, matrix, layers_index_reverse, branchs_end, branchs_counter):
+    def _apply_mutation(self, mutation, graph, layers_index_reverse, branchs_end, branchs_counter, order=None):
+        """
+        Apply single mutation, if it does not create cycle
+
+        Args:
+            mutation {Mutation instance} - mutation to apply
+            graph {LayersGraph} - graph of layers connections
+            layers_index_reverse {dict{int, Layer instance}} - indexes of all individ layers
+            branchs_end {dict{int, int}} - number of branch and corresponding index of the last layer
+            branchs_counter {list{int}} - array of all branchs currently used
+            order {TopologicalOrder} - topological order of the graph, it is not changed
+
+        Return:
+            LayersGraph - new graph of connections
+            dict - new map of layers and their indexes
+            dict - new map of branchs and their last layers indexes
+            list - new array of branchs indexes
+            TopologicalOrder - topological order of the new graph
+        """
+        if mutation.config.get('state', None) == 'broken':
+            return graph, layers_index_reverse, branchs_end, branchs_counter, order
+
+        if mutation.mutation_type == 'add_layer':
+            layer = mutation.layer
+            before_layer_index = mutation.config['before_layer_index']
+            after_layer_index = mutation.config['after_layer_index']
+
+            graph_tmp, layers_index_reverse_tmp, branchs_end_tmp, branchs_counter_tmp = self._inject_layer(
+                graph, layers_index_reverse,
+                branchs_end, branchs_counter, layer,
+                before_layer_index, after_layer_index)
+
+        elif mutation.mutation_type == 'inject_layer':
+            layer = mutation.layer
+            before_layer_index = mutation.config['before_layer_index']
+            after_layer_index = mutation.config['after_layer_index']
+
+            graph_tmp, layers_index_reverse_tmp, branchs_end_tmp, branchs_counter_tmp = self._inject_layer(
+                graph, layers_index_reverse,
+                branchs_end, branchs_counter, layer,
+                before_layer_index, after_layer_index)
+
+        elif mutation.mutation_type == 'add_connection':
+            before_layer_index = mutation.config['before_layer_index']
+            after_layer_index = mutation.config['after_layer_index']
+
+            graph_tmp = self._add_connection(graph, before_layer_index, after_layer_index)
+            layers_index_reverse_tmp = None
+            branchs_end_tmp = None
+            branchs_counter_tmp = None
+
+        elif mutation.mutation_type == 'remove_layer':
+            layer_index = mutation.layer
+
+            graph_tmp, layers_index_reverse_tmp, branchs_end_tmp, branchs_counter_tmp = self._remove_layer(
+                graph, layers_index_reverse,
+                branchs_end, branchs_counter,
+                layer_index)
+
+        elif mutation.mutation_type == 'remove_connection':
+            before_layer_index = mutation.config['before_layer_index']
+            after_layer_index = mutation.config['after_layer_index']
+            graph_tmp, branchs_end_tmp, branchs_counter_tmp = self._remove_connection(
+                graph, branchs_end, branchs_counter,
+                before_layer_index, after_layer_index)
+            layers_index_reverse_tmp = None
+
+        order_tmp = order.copy() if order is not None else None
+
+        # its should be False
+        if not self._cyclic_check(graph_tmp, order_tmp):
+            mutation.config['state'] = 'checked'
+
+            return (
+                graph_tmp,
+                layers_index_reverse_tmp or layers_index_reverse,
+                branchs_end_tmp or branchs_end,
+                branchs_counter_tmp or branchs_counter,
+                order_tmp)
+
+        mutation.config['state'] = 'broken'
+
+        return graph, layers_index_reverse, branchs_end, branchs_counter, order
+
+    def mutations_applier(self, graph, layers_index_reverse, branchs_end, branchs_counter):
         """
         Apply all mutations, which does not create cycle
 
         Return:
-            np.array(N, N) - new matrix of connection
+            LayersGraph - new graph of connections
             dict - new map of layers and their indexes
             dict - new map of branchs and their last layers indexes
             list - new array of branchs indexes
         """
         # create copy of properties
         # mutations can lead to a cycle and should be performed with additional checks
-        if matrix is None:
-            matrix_copy = np.array(self._matrix)
+        if graph is None:
+            graph_copy = self._graph
         else:
-            matrix_copy = matrix
+            graph_copy = graph
 
         layers_index_reverse_copy = dict(layers_index_reverse) or dict(self._layers_index_reverse)
         branchs_end_copy = dict(branchs_end) or dict(self.branchs_end)
         branchs_counter_copy = list(branchs_counter) or list(self.branchs_counter)
+        order = TopologicalOrder(graph_copy)
 
         for mutation in self.mutations_pool:
-            # increase in complexity due to the imposition of new mutations without remembering past
-            if mutation.config.get('state', None) == 'broken':
-                continue
-            else:
-                if mutation.mutation_type == 'add_layer':
-                    layer = mutation.layer
-                    before_layer_index = mutation.config['before_layer_index']
-                    after_layer_index = mutation.config['after_layer_index']
-
-                    matrix_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp = self._inject_layer(
-                        matrix_copy, layers_index_reverse_copy,
-                        branchs_end_copy, branchs_counter_copy, layer,
-                        before_layer_index, after_layer_index)
-
-                elif mutation.mutation_type == 'inject_layer':
-                    layer = mutation.layer
-                    before_layer_index = mutation.config['before_layer_index']
-                    after_layer_index = mutation.config['after_layer_index']
-
-                    matrix_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp = self._inject_layer(
-                        matrix_copy, layers_index_reverse_copy,
-                        branchs_end_copy, branchs_counter_copy, layer,
-                        before_layer_index, after_layer_index)
-
-                elif mutation.mutation_type == 'add_connection':
-                    before_layer_index = mutation.config['before_layer_index']
-                    after_layer_index = mutation.config['after_layer_index']
-
-                    matrix_copy_tmp = self._add_connection(matrix_copy, before_layer_index, after_layer_index)
-                    layers_index_reverse_copy_tmp = None
-                    branchs_end_copy_tmp = None
-                    branchs_counter_copy_tmp = None
-
-                elif mutation.mutation_type == 'remove_layer':
-                    layer_index = mutation.layer
-
-                    matrix_copy_tmp, layers_index_reverse_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp = self._remove_layer(
-                        matrix_copy, layers_index_reverse_copy,
-                        branchs_end_copy, branchs_counter_copy,
-                        layer_index)
-
-                elif mutation.mutation_type == 'remove_connection':
-                    before_layer_index = mutation.config['before_layer_index']
-                    after_layer_index = mutation.config['after_layer_index']
-                    matrix_copy_tmp, branchs_end_copy_tmp, branchs_counter_copy_tmp = self._remove_connection(
-                        matrix_copy, branchs_end_copy, branchs_counter_copy,
-                        before_layer_index, after_layer_index)
-                    layers_index_reverse_copy_tmp = None
-
-                # its should be False
-                if not self._cyclic_check(matrix_copy_tmp):
-                    matrix_copy = matrix_copy_tmp
-                    layers_index_reverse_copy = layers_index_reverse_copy_tmp or layers_index_reverse_copy
-
-                    branchs_end_copy = branchs_end_copy_tmp or branchs_end_copy
-                    branchs_counter_copy = branchs_counter_copy_tmp or branchs_counter_copy
-
-                    mutation.config['state'] = 'checked'
-                else:
-                    mutation.config['state'] = 'broken'
-
-                matrix_copy_tmp = None
-                layers_index_reverse_copy_tmp = None
-                branchs_end_copy_tmp = None
-                branchs_counter_copy_tmp = None
-
-        return matrix_copy, layers_index_reverse_copy, branchs_end_copy, branchs_counter_copy
+            graph_copy, layers_index_reverse_copy, branchs_end_copy, branchs_counter_copy, order = self._apply_mutation(
+                mutation, graph_copy, layers_index_reverse_copy,
+                branchs_end_copy, branchs_counter_copy, order)
+
+        return graph_copy, layers_index_reverse_copy, branchs_end_copy, branchs_counter_copy
+
+    def _valid_snapshots_number(self):
+        """
+        Number of cached mutations prefix snapshots, which are still valid:
+        mutation at the same position is the same and its config (including checked or broken state)
+        was not changed after application
+
+        Return:
+            int - length of the valid prefix of mutations pool
+        """
+        for i, (mutation, config, _) in enumerate(self._mutations_snapshots):
+            if i >= len(self.mutations_pool):
+                return i
+
+            if self.mutations_pool[i] is not mutation or mutation.config != config:
+                return i
+
+        return len(self._mutations_snapshots)
 
     def _update_mutated(self):
         """
         Update architecture using new mutations
+        Only mutations after the last valid cached snapshot are applied
         """
-        for mutation in self.mutations_pool:
+        snapshots_number = self._valid_snapshots_number()
+        self._mutations_snapshots = self._mutations_snapshots[:snapshots_number]
+
+        if snapshots_number:
+            graph, layers_index_reverse, branchs_end, branchs_counter, order = self._mutations_snapshots[-1][2]
+        else:
+            # create copy of properties
+            # mutations can lead to a cycle and should be performed with additional checks
+            graph = self._graph
+            layers_index_reverse = dict(self._layers_index_reverse)
+            branchs_end = dict(self.branchs_end)
+            branchs_counter = list(self.branchs_counter)
+            order = TopologicalOrder(graph)
+
+        # apply new mutations
+        for mutation in self.mutations_pool[snapshots_number:]:
             if mutation.config.get('state', None) == 'broken':
                 mutation.config['state'] = None
-        # apply mutations
-        matrix, layers_index_reverse, branchs_end, branchs_counter = self.mutations_applier(
-            self._matrix, self._layers_index_reverse,
-            self.branchs_end, self.branchs_counter)
+
+            graph, layers_index_reverse, branchs_end, branchs_counter, order = self._apply_mutation(
+                mutation, graph, layers_index_reverse,
+                branchs_end, branchs_counter, order)
+
+            self._mutations_snapshots.append(
+                (mutation, dict(mutation.config), (graph, layers_index_reverse, branchs_end, branchs_counter, order)))
 
         # add finisher
-        matrix, layers_index_reverse, branchs_end, branchs_counter = self.finisher_applier(
-            matrix, layers_index_reverse,
+        graph, layers_index_reverse, branchs_end, branchs_counter = self.finisher_applier(
+            graph, layers_index_reverse,
             branchs_end, branchs_counter)
 
         self._matrix_updated = True
-        self._matrix_mutated = matrix
+        self._graph_mutated = graph
+        self._graph_index = None
+        self._fingerprint = None
 
+        # layers of the mutated structure are changed by shapes calculation, so they are not shared
         self._layers_index_reverse_updated = True
-        self._layers_index_reverse_mutated = layers_index_reverse
+        self._layers_index_reverse_mutated = {index: layer.copy() for index, layer in layers_index_reverse.items()}
 
     def freeze_state(self):
         for mutation in self.mutations_pool:
             if mutation.config.get('state', None) == 'broken':
                 mutation.config['state'] = None
         # apply mutations
-        self._matrix, self._layers_index_reverse, self.branchs_end, self.branchs_counter = self.mutations_applier(
-            self._matrix, self._layers_index_reverse,
+        self._graph, self._layers_index_reverse, self.branchs_end, self.branchs_counter = self.mutations_applier(
+            self._graph, self._layers_index_reverse,
             self.branchs_end, self.branchs_counter)
 
         self.mutations_pool = []
+        self._mutations_snapshots = []
 
 
+    def clone(self):
+        """
+        Copy of the structure, which shares layers, matrices and mutations snapshots with this one
+        Mutations and layers of the mutated structure are copied, because they are changed in place
+
+        Return:
+            Structure - new structure
+        """
+        structure = copy.copy(self)
+        structure._layers_index_reverse = dict(self._layers_index_reverse)
+        structure.branchs_end = dict(self.branchs_end)
+        structure.branchs_counter = list(self.branchs_counter)
+
+        mutations_map = {id(mutation): mutation.copy() for mutation in self.mutations_pool}
+        structure.mutations_pool = [mutations_map[id(mutation)] for mutation in self.mutations_pool]
+        structure._mutations_snapshots = [
+            (mutations_map[id(mutation)], config, state)
+            for (mutation, config, state) in self._mutations_snapshots[:self._valid_snapshots_number()]]
+
+        if self._layers_index_reverse_mutated is not None:
+            structure._layers_index_reverse_mutated = {
+                index: layer.copy() for index, layer in self._layers_index_reverse_mutated.items()}
+
+        return structure
+
     @property
-    def matrix(self):
+    def graph(self):
         """
-        Return matrix with mutations
+        Return graph of connections with mutations
         """
-        # apply all mutations before matrix returning
+        # apply all mutations before graph returning
         if not self._matrix_updated:
             self._update_mutated()
 
-        return self._matrix_mutated
+        return self._graph_mutated
+
+    @property
+    def graph_index(self):
+        """
+        Return index of the graph with mutations: connections of each layer, topological order,
+        sources, sinks and layers reachable from the input
+        """
+        graph = self.graph
+        if self._graph_index is None:
+            self._graph_index = GraphIndex(graph)
+
+        return self._graph_index
+
+    @property
+    def fingerprint(self):
+        """
+        Return canonical hash of the architecture with mutations, which does not depend on layers indexes
+        """
+        graph_index = self.graph_index
+        if self._fingerprint is None:
+            self._fingerprint = architecture_fingerprint(graph_index, self.layers_index_reverse)
+
+        return self._fingerprint
+
+    @property
+    def matrix(self):
+        """
+        Return matrix with mutations
+        """
+        return self.graph.matrix
 
     @property
     def layers_index_reverse(self):
@@ -608,9 +769,16 @@ class Structure:
 
         return self._layers_index_reverse_mutated
 
+    @property
+    def finisher(self):
+        """
+        The last layer of the structure, its copy in the layers has the same uid
+        """
+        return self._finisher
+
     def dump(self):
-        matrix = copy.deepcopy(self._matrix)
-        matrix_mutated = copy.deepcopy(self._matrix_mutated)
+        matrix = np.array(self._graph.matrix)
+        matrix_mutated = np.array(self._graph_mutated.matrix) if self._graph_mutated is not None else None
 
         layers_index_reverse = {key: value.dump() for key, value in self._layers_index_reverse.items()}
         layers_index_reverse_mutated = {key: value.dump() for key, value in self._layers_index_reverse_mutated.items()}
@@ -634,8 +802,12 @@ class Structure:
         return buffer
 
     def load(self, data_load, distribution):
-        self._matrix = np.array(data_load['matrix'])
-        self._matrix_mutated = np.array(data_load['matrix_mutated'])
+        self._graph = LayersGraph.from_matrix(np.array(data_load['matrix']))
+        self._graph_mutated = None
+        if data_load['matrix_mutated'] is not None:
+            self._graph_mutated = LayersGraph.from_matrix(np.array(data_load['matrix_mutated']))
+        self._graph_index = None
+        self._fingerprint = None
         self._layers_index_reverse = {key: Layer(value['layer_type'], distribution, None, None, None, value) for key, value in data_load['layers_index_reverse'].items()}
         self._layers_index_reverse_mutated = {key: Layer(value['layer_type'], distribution, None, None, None, value) for key, value in data_load['layers_index_reverse_mutated'].items()}
 
@@ -649,6 +821,7 @@ class Structure:
         self.branchs_end = {int(key): value for key, value in self.branchs_end.items()}
 
         self.branchs_counter = data_load['branchs_count']
+        self._mutations_snapshots = []
 
 
 class StructureText(Structure):
@@ -664,22 +837,22 @@ class StructureText(Structure):
         """
         super().__init__(root, finisher)
 
-        self._matrix = np.zeros((2, 2))
+        self._graph = LayersGraph(2)
 
         # add root layer - Input layer
-        self._matrix, self._layers_index_reverse, root_index = self._register_new_layer(
-            self._matrix,
+        self._graph, self._layers_index_reverse, root_index = self._register_new_layer(
+            self._graph,
             self._layers_index_reverse,
             root)
 
         # add embedding layer
-        self._matrix, self._layers_index_reverse, embedding_index = self._register_new_layer(
-            self._matrix,
+        self._graph, self._layers_index_reverse, embedding_index = self._register_new_layer(
+            self._graph,
             self._layers_index_reverse,
             embedding)
 
-        self._matrix[root_index, embedding_index] = 1
-        self._matrix_pure = self._matrix[:]
+        self._graph.add_edge(root_index, embedding_index)
+        self._matrix_pure = self._graph.matrix
 
         self.branchs_end[1] = embedding_index
 
@@ -688,10 +861,10 @@ class StructureImage(Structure):
     def __init__(self, root, finisher):
         super().__init__(root, finisher)
 
-        self._matrix = np.zeros((0, 0))
-        self._matrix_pure = self._matrix[:]
-        self._matrix, self._layers_index_reverse, root_index = self._register_new_layer(
-            self._matrix,
+        self._graph = LayersGraph(0)
+        self._matrix_pure = self._graph.matrix
+        self._graph, self._layers_index_reverse, root_index = self._register_new_layer(
+            self._graph,
             self._layers_index_reverse,
             root)
 
@@ -47,8 +47,12 @@ def structure_parser(structure, number_to_generate, start_point=None, depth=None
 
     sublayers_chains = []
 
+    # connections without the last layer - finisher
+    last_index = len(structure.graph_index) - 1
+    successors = [[i for i in layers if i < last_index] for layers in structure.graph_index.successors[:-1]]
+
     for index in layer_indexes_random_sampled:
-        sublayers_chain = sublayer_parser(index, structure.matrix[:-1, :-1], depth, None, 0)
+        sublayers_chain = sublayer_parser(index, successors, depth, None, 0)
 
         flatten_sublayers_chain = flatten(sublayers_chain)
 
@@ -69,7 +73,7 @@ def flatten(chain):
     return f
 
 
-def sublayer_parser(start_point, matrix, depth, sub_layer=None, level=0):
+def sublayer_parser(start_point, successors, depth, sub_layer=None, level=0):
     level += 1
     
     if level >= depth:
@@ -79,16 +83,16 @@ def sublayer_parser(start_point, matrix, depth, sub_layer=None, level=0):
         sub_layer = []
 
     sub_layer.append(start_point)
-    next_step = np.where(matrix[start_point] == 1)[0]
+    next_step = successors[start_point]
 
     if level >= depth:
         return sub_layer
 
     elif len(next_step) == 1:
-        new_chains = sublayer_parser(next_step[0], matrix, depth, list(sub_layer), level)
+        new_chains = sublayer_parser(next_step[0], successors, depth, list(sub_layer), level)
 
     elif len(next_step) > 1:
-        new_chains = [sublayer_parser(step, matrix, depth, list(sub_layer), level) for step in next_step]
+        new_chains = [sublayer_parser(step, successors, depth, list(sub_layer), level) for step in next_step]
 
     else:
         return sub_layer
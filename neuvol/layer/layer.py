@@ -14,9 +14,11 @@
 import copy
 import torch
 import math
+import uuid
 import numpy as np
 
 from ..constants import LAYERS_POOL, SPECIAL
+from ..errors import NeuvolMutationError
 from ..utils import dump
 
 # TODO: layers serialisation
@@ -29,8 +31,9 @@ def Layer(layer_type, distribution, options=None, previous_layer=None, next_laye
         layer = LAYERS_MAP[layer_type](layer_type=layer_type, distribution=distribution, previous_layer=previous_layer, next_layer=next_layer, options=options, data_load=data_load)
     elif layer_type in distribution.CUSTOM_LAYERS_MAP.keys():
         layer = copy.deepcopy(distribution.CUSTOM_LAYERS_MAP[layer_type])
+        layer.uid = uuid.uuid4().hex
     else:
-        raise TypeError()
+        raise NeuvolMutationError('Unknown layer type {}'.format(layer_type))
 
     # if data_load is not None:
     #     layer.config = data_load['config']
@@ -54,6 +57,10 @@ class LayerBase:
         self.options = options
         self.previous_layer = previous_layer
         self.next_layer = next_layer
+        # identity of the layer, it is kept by copies, so trained weights of the layer could be found
+        self.uid = uuid.uuid4().hex
+        # parameters before the shape calculation, see sampled_parameters
+        self._sampled = None
 
         if data_load is not None:
             self.load(data_load)
@@ -66,6 +73,9 @@ class LayerBase:
         Add layer to a network tail, previous layer is required for shape and rank check
         In case of multiple layers concatenation layer is injected
         """
+        # shape calculation adjusts some parameters to the input, keep the sampled ones
+        self.sampled_parameters()
+
         # in case of concatenation
         if isinstance(net, list):
             concat_layer = Layer('concat', self.distribution)
@@ -79,6 +89,11 @@ class LayerBase:
             axis = None
 
         reshape_layer = self._init_reshape_layer(previous_layer)
+        # function-preserving layer is the identity mapping, if its input is not reshaped
+        preserving = self.config.get('function_preserving', False) and reshape_layer is None
+        if preserving:
+            self._preserve_shape(previous_layer)
+
         if reshape_layer is None:
             self.config['rank'] = self.calculate_rank(previous_layer)
             self.config['shape'] = self.calculate_shape(previous_layer)
@@ -100,6 +115,8 @@ class LayerBase:
 
         if init:
             layer_instance = self.init_layer(previous_layer)
+            if preserving:
+                self._init_identity(layer_instance)
         else:
             layer_instance = None
         # try:
@@ -118,6 +135,28 @@ class LayerBase:
         """
         return ...
 
+    def preserve_function(self):
+        """
+        Make the layer the identity mapping of its input (Net2Net), so the network computes
+        the same function after the insertion of the layer
+
+        Return:
+            bool - False if the layer type does not support that
+        """
+        return False
+
+    def _preserve_shape(self, previous_layer):
+        """
+        Change parameters of the layer, so its output shape is the same as the input shape
+        """
+        pass
+
+    def _init_identity(self, layer_instance):
+        """
+        Initialize weights of the layer instance by the identity mapping
+        """
+        pass
+
     def _init_reshape_layer(self, previous_layer):
         """
         Add reshape layer if ranks is different
@@ -164,6 +203,42 @@ class LayerBase:
     def calculate_parameters(self):
         return 0
 
+    def calculate_macs(self):
+        """
+        Multiply-accumulate operations of the forward pass for a single sample,
+        shape should be calculated before that. Layers without weights have no MACs
+        """
+        return 0
+
+    def calculate_flops(self):
+        """
+        Floating point operations of the forward pass for a single sample,
+        each multiply-accumulate is two operations
+        """
+        return 2 * self.calculate_macs()
+
+    def sampled_parameters(self):
+        """
+        Parameters of the layer before the first shape calculation, the calculation writes
+        derived values and adjusts some parameters to the input shape
+
+        Return:
+            dict - config of the layer, it is shared by the copies of the layer
+        """
+        if getattr(self, '_sampled', None) is None:
+            self._sampled = dict(self.config)
+
+        return self._sampled
+
+    def copy(self):
+        """
+        Copy of the layer with its own config, distribution and options are shared
+        """
+        layer = copy.copy(self)
+        layer.config = dict(self.config)
+
+        return layer
+
     @property
     def shape(self):
         return self.config['shape']
@@ -183,13 +258,17 @@ class LayerBase:
     def dump(self):
         buffer = {}
         buffer['config'] = self.config
+        buffer['sampled'] = self.sampled_parameters()
         buffer['options'] = self.options
         buffer['layer_type'] = self.layer_type
+        buffer['uid'] = self.uid
 
         return buffer
 
     def load(self, data_load):
         self.config = data_load['config']
+        self._sampled = data_load.get('sampled')
+        self.uid = data_load.get('uid', self.uid)
         self.options = data_load['options']
         self.layer_type = data_load['layer_type']
 
@@ -307,6 +386,15 @@ class LayerLSTM(LayerBase):
                + 8 * self.config['hidden_size'] * self.config['units'] * b\
                + 4 * self.config['hidden_size'] * b * self.config['input_seq']
 
+    def calculate_macs(self):
+        b = 1 if self.config['bidirectional'] == False else 2
+        hidden_size = self.config['hidden_size']
+        # four gates of each direction, the next layers take outputs of both directions
+        step = 4 * hidden_size * b * (self.config['input_seq'] + hidden_size)\
+            + 4 * hidden_size * b * (b * hidden_size + hidden_size) * (self.config['units'] - 1)
+
+        return int(self.shape[1]) * step
+
 
 class LayerCNN1D(LayerBase):
     def init_layer(self, previous_layer):
@@ -324,6 +412,25 @@ class LayerCNN1D(LayerBase):
             dilation=tuple([self.config['dilation_rate'], self.config['dilation_rate']])
         )
 
+    def preserve_function(self):
+        self.config['function_preserving'] = True
+
+        return True
+
+    def _preserve_shape(self, previous_layer):
+        self.config['filters'] = previous_layer.shape[1]
+        self.config['strides'] = 1
+        self.config['dilation_rate'] = 1
+        self.config['padding_mode'] = 'same'
+        # only odd kernel keeps the size with the symmetric padding
+        if self.config['kernel_size'] % 2 == 0:
+            self.config['kernel_size'] += 1
+
+    def _init_identity(self, layer_instance):
+        with torch.no_grad():
+            torch.nn.init.dirac_(layer_instance.weight)
+            torch.nn.init.zeros_(layer_instance.bias)
+
     def _check_compatibility(self):
         super()._check_compatibility()
         # if self.config['dilation_rate'] > 1:
@@ -397,6 +504,12 @@ class LayerCNN1D(LayerBase):
     def calculate_parameters(self):
         return self.config['filters'] * (self.config['kernel_size'] * self.config.get('input_filters', 0) + 1)
 
+    def calculate_macs(self):
+        # each output value is the sum over the kernel and input filters, bias is not counted
+        kernel = self.config['kernel_size'] ** (len(self.shape) - 2)
+
+        return int(np.prod(self.shape[1:], dtype=np.int64)) * kernel * self.config.get('input_filters', 0)
+
 
 class LayerCNN2D(LayerCNN1D):
     def init_layer(self, previous_layer):
@@ -473,6 +586,12 @@ class LayerMaxPool1D(LayerBase):
 
         return shape
 
+    def calculate_flops(self):
+        # comparisons of the pooling window
+        window = self.config['pool_size'] ** (len(self.shape) - 2)
+
+        return int(np.prod(self.shape[1:], dtype=np.int64)) * (window - 1)
+
 
 class LayerMaxPool2D(LayerMaxPool1D):
     def init_layer(self, previous_layer):
@@ -506,6 +625,19 @@ class LayerDense(LayerBase):
             out_features=self.config['units']
         )
 
+    def preserve_function(self):
+        self.config['function_preserving'] = True
+
+        return True
+
+    def _preserve_shape(self, previous_layer):
+        self.config['units'] = previous_layer.shape[-1]
+
+    def _init_identity(self, layer_instance):
+        with torch.no_grad():
+            torch.nn.init.eye_(layer_instance.weight)
+            torch.nn.init.zeros_(layer_instance.bias)
+
     def calculate_shape(self, previous_layer):
         previous_shape = previous_layer.shape
         shape = (*previous_shape[:-1], self.config['units'])
@@ -517,6 +649,12 @@ class LayerDense(LayerBase):
 
         return self.config['input_units'] * self.config['units']
 
+    def calculate_macs(self):
+        # linear layer is applied to each position of the inputs with the rank more than 2
+        positions = int(np.prod(self.shape[1:-1], dtype=np.int64))
+
+        return positions * self.config['input_units'] * self.config['units']
+
 
 class LayerInput(LayerBase):
     def _init_parameters(self):
@@ -555,6 +693,10 @@ class LayerEmbedding(LayerSpecialBase):
         
         return self.config['vocabular'] * self.config['embedding_dim']
 
+    def calculate_flops(self):
+        # lookup of the rows, there are no arithmetic operations
+        return 0
+
 
 class LayerFlatten(LayerSpecialBase):
     def init_layer(self, previous_layer):
@@ -631,6 +773,10 @@ class LayerConcat(LayerSpecialBase):
 
         return shape_modifiers, -1
 
+    def calculate_flops(self):
+        # inputs are copied, there are no arithmetic operations
+        return 0
+
 
 class LayerReshape(LayerSpecialBase):
     def init_layer(self, previous_layer):
@@ -659,6 +805,10 @@ class LayerDropout(LayerBase):
 
 
 class LayerDeCNN2D(LayerCNN2D):
+    def preserve_function(self):
+        # transposed convolution does not keep the size with the same padding
+        return False
+
     def init_layer(self, previous_layer):
         # super().init_layer(previous_layer)
 
@@ -699,6 +849,7 @@ class LayerDeCNN2D(LayerCNN2D):
         #     else:
         #         out = [(i - 1) * strides + kernel_size - 2 * (kernel_size // 2) + output_padding for i in previous_shape[1:-1]]
 
+        self.config['input_size'] = tuple(int(side) for side in previous_shape[2:])
         shape = (None, filters, *out)
 
         return shape
@@ -706,6 +857,12 @@ class LayerDeCNN2D(LayerCNN2D):
     def calculate_parameters(self):
         return self.config.get('input_filters', 0) * self.config['filters'] * (self.config['kernel_size'] ** 2) + self.config['filters']
 
+    def calculate_macs(self):
+        # each input value is scattered over the kernel of each output filter
+        inputs = int(np.prod(self.config['input_size'], dtype=np.int64)) * self.config.get('input_filters', 0)
+
+        return inputs * self.config['filters'] * self.config['kernel_size'] ** 2
+
 
 LAYERS_MAP = {
     'input': LayerInput,
@@ -11,14 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import copy
 import math
 import numpy as np
 
 from ..constants import GENERAL
+from ..errors import NeuvolMutationError
 from ..probabilty_pool import Distribution
 from ..layer import Layer
 
 
+# expected failures of the mutation: it is not applicable to the structure or its type is unknown
+MUTATION_ERRORS = (NeuvolMutationError,)
+
+
 def mutator(mutation_type, matrix, layers_types, distribution, config=None, layer=None):
     if mutation_type in MUTATIONS_MAP:
         return MUTATIONS_MAP[mutation_type](
@@ -29,7 +35,7 @@ def mutator(mutation_type, matrix, layers_types, distribution, config=None, laye
             config=config,
             layer=layer)
     else:
-        raise TypeError()
+        raise NeuvolMutationError('Unknown mutation type {}'.format(mutation_type))
 
 
 class MutatorBase:
@@ -39,9 +45,16 @@ class MutatorBase:
 
     @staticmethod
     # TODO: check complexity and evaluation time
-    def mutate(individ, distribution, mutation_type=None):
+    def mutate(individ, distribution, mutation_type=None, function_preserving=False):
         """
         Mutate individ
+
+        Args:
+            individ {IndividBase} - individ to mutate
+            distribution {Distribution} - distribution of mutations
+            mutation_type {str} - type of the mutation, random one if None
+            function_preserving {bool} - new layer is initialized as the identity mapping (Net2Net),
+                so with the inherited weights the child computes the same function as its parent
         """
         # create representation of the individ with all its previous mutations
         matrix = individ.matrix
@@ -50,10 +63,52 @@ class MutatorBase:
         if mutation_type is None:
             mutation_type = distribution.mutation()
 
-        individ.add_mutation(mutator(mutation_type, matrix, layers_names, distribution))
+        mutation = mutator(mutation_type, matrix, layers_names, distribution)
+        if function_preserving and hasattr(mutation.layer, 'preserve_function'):
+            mutation.layer.preserve_function()
+
+        individ.add_mutation(mutation)
 
     @staticmethod
-    def grown(individ, distribution):
+    def candidates(individ, distribution, number, surrogate=None, top=1, function_preserving=False):
+        """
+        Create mutated copies of the individ and select the most promising of them
+
+        Args:
+            individ {IndividBase} - parent
+            distribution {Distribution} - distribution of mutations
+            number {int} - number of candidates
+            surrogate {Surrogate} - predictor, which ranks candidates, the first ones are selected without it
+            top {int} - number of selected candidates
+            function_preserving {bool} - new layers are initialized as the identity mapping
+
+        Return:
+            list{IndividBase} - selected children
+        """
+        children = []
+        for _ in range(number):
+            child = individ.clone()
+            try:
+                MutatorBase.mutate(child, distribution, function_preserving=function_preserving)
+            except MUTATION_ERRORS:
+                continue
+            children.append(child)
+
+        if surrogate is None:
+            return children[:top]
+
+        return surrogate.rank(children, top)
+
+    @staticmethod
+    def grown(individ, distribution, layers=None):
+        """
+        Add new layer, split or merge the branches of the individ
+
+        Args:
+            individ {IndividBase} - individ to grow
+            distribution {Distribution} - distribution of the layers
+            layers {iterator{Layer}} - layers sampled in advance, new layers are sampled if they are exhausted
+        """
         # TODO: external probabilities for each dice
         # merging is an absolute genom changing
         merger_dice = _probability_from_branchs(individ, prior_rate=GENERAL['mutation_rate_merge'], delimeter=2)
@@ -70,8 +125,7 @@ class MutatorBase:
             branchs_to_merge = np.random.choice(list(individ.branchs_end.keys()), branchs_to_merge_number, replace=False)
             branchs_to_merge = [i for i in branchs_to_merge if i not in branchs_exception]
 
-            layer_type = distribution.layer()
-            new_tail = Layer(layer_type, distribution)
+            new_tail = _new_layer(distribution, layers)
 
             branchs_end_new = individ.merge_branchs(new_tail, branchs_to_merge)
 
@@ -89,18 +143,24 @@ class MutatorBase:
 
         if split_dice and not merger_dice:
             number_of_splits = np.random.choice(GENERAL['mutation_splitting']['number_of_splits'], p=GENERAL['mutation_splitting']['rates'])
-            new_tails = [Layer(distribution.layer(), distribution) for _ in range(number_of_splits)]
+            new_tails = [_new_layer(distribution, layers) for _ in range(number_of_splits)]
 
             individ.split_branch(new_tails, branch=selected_branch)
 
         else:
-            new_tail = Layer(distribution.layer(), distribution)
+            new_tail = _new_layer(distribution, layers)
 
             individ.add_layer(new_tail, selected_branch)
 
         return True
 
 
+def _new_layer(distribution, layers=None):
+    layer = next(layers, None) if layers is not None else None
+
+    return layer if layer is not None else Layer(distribution.layer(), distribution)
+
+
 def _probability_from_branchs(individ, prior_rate, delimeter=1):
     number_of_branches = len(individ.branchs_end.keys())
 
@@ -153,6 +213,9 @@ class MutationInjector:
 
     def _choose_parameters(self, matrix, layers_types, is_add_layer=False):
         size = matrix.shape[0]
+        # input and the finisher layers are not selected
+        if size < 3:
+            raise NeuvolMutationError('There are no layers for the mutation {}'.format(self.mutation_type))
         self.config['after_layer_index'] = self.config.get('after_layer_index', None) or np.random.randint(1, size - 1)
 
         self.config['after_layer_type'] = layers_types[self.config['after_layer_index']]
@@ -195,6 +258,15 @@ class MutationInjector:
     def before_layer_index(self, index):
         self.config['before_layer_index'] = index
 
+    def copy(self):
+        """
+        Copy of the mutation with its own config, layer and distribution are shared
+        """
+        mutation = copy.copy(self)
+        mutation.config = dict(self.config)
+
+        return mutation
+
     def dump(self):
         buffer = {}
         buffer['mutation_type'] = self.mutation_type
@@ -244,7 +316,11 @@ class MutationInjectorRemoveLayer(MutationInjector):
         super().__init__(mutation_type, matrix, layers_types, distribution, config=config, layer=layer)
 
     def _choose_parameters(self, matrix, layers_types):
-        layer_indexes = list(layers_types.keys())
+        size = matrix.shape[0]
+        # input and the finisher layers are not removed, finisher is the last one
+        layer_indexes = [index for index in layers_types.keys() if 0 < index < size - 1]
+        if not layer_indexes:
+            raise NeuvolMutationError('There are no layers for the mutation {}'.format(self.mutation_type))
         layer_to_remove = int(np.random.choice(layer_indexes, size=1)[0])
         self._layer = layer_to_remove
 
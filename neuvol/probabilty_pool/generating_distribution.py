@@ -12,9 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import copy
+
 import numpy as np
 
 from ..constants import FAKE, GENERAL, LAYERS_POOL, SPECIAL, TRAINING
+from ..layer import Layer
+
+
+# number of values, which are drawn at once for each table
+SAMPLING_BATCH = 256
 
 
 def parse_mutation_const():
@@ -112,17 +118,143 @@ def kernel(x, index_of_selected_value, coef=0.423):
     return 1 - coef ** (1 / (1 + abs(index_of_selected_value - x)))
 
 
+def _ordered(values):
+    """
+    Values in the order of the kernel neighbourhood
+    """
+    values = list(values)
+    if not values:
+        return values
+
+    # stupid hack to solve None ordering
+    if isinstance(values[0], str):
+        gag = '0'
+    else:
+        gag = 0
+
+    return sorted(values, key=lambda x: x if x else gag)
+
+
+class ProbabilityTable:
+    """
+    Values of the distribution in the sorted order and their probabilities, which are not normalized
+    Cumulative sums of the probabilities are computed once after each change of the probabilities,
+    values are drawn by batches, so single values are taken from the drawn ones
+    """
+    def __init__(self, probability):
+        """
+        Args:
+            probability {dict} - probability of each value
+        """
+        values = _ordered(probability)
+        self.values = np.array(values)
+        self.probability = np.array([probability[value] for value in values], dtype=np.float64)
+
+        self._index = {value: i for i, value in enumerate(values)}
+        self._active = np.ones(len(values), dtype=bool)
+        self._cumulative = None
+        self._drawn = []
+
+    def _changed(self):
+        self._cumulative = None
+        self._drawn = []
+
+    @property
+    def cumulative(self):
+        if self._cumulative is None:
+            self._cumulative = np.cumsum(self.probability * self._active)
+
+        return self._cumulative
+
+    def exclude(self, values):
+        """
+        Values, which are never sampled
+        """
+        self._active = np.ones(len(self.values), dtype=bool)
+        self._active[[self._index[value] for value in values if value in self._index]] = False
+        self._changed()
+
+    def increase(self, values, coef=0.423):
+        """
+        Increase probabilities of the values and their neighbours by the kernel
+
+        Args:
+            values {list} - selected values, each appearance of the value increases the probabilities
+            coef {float} - coefficient of the kernel
+        """
+        indexes, counts = np.unique([self._index[value] for value in values if value in self._index], return_counts=True)
+        if not len(indexes):
+            return
+
+        positions = np.arange(len(self.values))
+        self.probability += (counts[:, None] * kernel(positions[None, :], indexes[:, None], coef)).sum(0)
+        self._changed()
+
+    def sample_array(self, generator, number):
+        """
+        Values, which are drawn at once
+        """
+        cumulative = self.cumulative
+        indexes = cumulative.searchsorted(generator.random(number) * cumulative[-1], side='right')
+
+        return self.values[indexes]
+
+    def draw(self, generator, number):
+        """
+        Draw values in advance, they are taken by the next calls of sample in the same order
+        """
+        self._drawn.extend(self.sample_array(generator, number)[::-1])
+
+    def sample(self, generator, batch=SAMPLING_BATCH):
+        if not self._drawn:
+            self.draw(generator, batch)
+
+        return self._drawn.pop()
+
+    def as_dict(self):
+        return {value: probability for value, probability in zip(self.values.tolist(), self.probability.tolist())}
+
+    def __contains__(self, value):
+        return value in self._index
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _tables(probabilities, depth):
+    """
+    Probability tables of the nested dictionaries of the probabilities
+
+    Args:
+        probabilities {dict} - nested dictionaries, the last ones are probabilities of the values
+        depth {int} - number of the nested levels above the probabilities
+    """
+    if depth == 0:
+        return ProbabilityTable(probabilities)
+
+    return {key: _tables(value, depth - 1) for key, value in probabilities.items()}
+
+
 class Distribution():
     """
     Here we evolve our own distribution for all population. At the end of the evolution
     it is possible to generate individs from this distribution
+    Probabilities are kept by the probability tables, which are sampled and updated by numpy
     """
-    def __init__(self):
-        self._mutations_probability = parse_mutation_const()
-        self._layers_probability = parse_layer_const()
-        self._layers_parameters_probability = parse_layer_parameter_const()
-        self._layers_number_probability = parse_layers_number()
-        self._training_parameters_probability = parse_training_const()
+    def __init__(self, random_state=None):
+        """
+        Args:
+            random_state {int} - seed of the generator, it is taken from the global numpy state if None
+        """
+        if random_state is None:
+            random_state = np.random.randint(2 ** 32, dtype=np.uint64)
+        self._generator = np.random.default_rng(random_state)
+
+        self._mutations_probability = ProbabilityTable(parse_mutation_const())
+        self._layers_probability = ProbabilityTable(parse_layer_const())
+        self._layers_parameters_probability = _tables(parse_layer_parameter_const(), 2)
+        self._layers_number_probability = ProbabilityTable(parse_layers_number())
+        self._training_parameters_probability = _tables(parse_training_const(), 1)
 
         # True value of this parameter leads to fast convergence
         # TODO: options
@@ -135,77 +267,37 @@ class Distribution():
         self._TRAINING = dict(TRAINING)
 
     def reset(self):
-        self._mutations_probability = parse_mutation_const()
-        self._layers_probability = parse_layer_const()
-        self._layers_parameters_probability = parse_layer_parameter_const()
-        self._layers_number_probability = parse_layers_number()
-        self._training_parameters_probability = parse_training_const()
+        self._mutations_probability = ProbabilityTable(parse_mutation_const())
+        self._layers_probability = ProbabilityTable(parse_layer_const())
+        self._layers_parameters_probability = _tables(parse_layer_parameter_const(), 2)
+        self._layers_number_probability = ProbabilityTable(parse_layers_number())
+        self._training_parameters_probability = _tables(parse_training_const(), 1)
         self._appeareance_increases_probability = False
         self._diactivated_layers = []
         self.CUSTOM_LAYERS_MAP = {}
 
-    def _increase_layer_probability(self, layer):
-        #self._layers_probability[layer] += 0.1
-
-        a = list(self._layers_probability)
-
-        # stupid hack to solve None ordering
-        if isinstance(a[0], str):
-            gag = '0'
-        else:
-            gag = 0
-
-        a = sorted(a, key=lambda x: x if x else gag)
-        index_of_selected_value = a.index(layer)
+    def _sample(self, table):
+        # each value changes the probabilities, if the appeareance increases them
+        return table.sample(self._generator, 1 if self._appeareance_increases_probability else SAMPLING_BATCH)
 
-        for i, layer in enumerate(a):
-            self._layers_probability[layer] += kernel(i, index_of_selected_value, 0.95)
+    def _increase_layer_probability(self, layer):
+        self._layers_probability.increase([layer], 0.95)
 
     def _update_layer_probability_pool(self):
-        self._layers_probability = parse_layer_const(self._layers_probability)
+        self._layers_probability = ProbabilityTable(parse_layer_const(self._layers_probability.as_dict()))
+        self._layers_probability.exclude(self._diactivated_layers)
 
     def _increase_layer_parameters_probability(self, layer, parameter, value):
-        a = list(self._layers_parameters_probability[layer][parameter])
-
-        # stupid hack to solve None ordering
-        if isinstance(a[0], str):
-            gag = '0'
-        else:
-            gag = 0
-
-        a = sorted(a, key=lambda x: x if x else gag)
-        index_of_selected_value = a.index(value)
-
-        for i, value in enumerate(a):
-            self._layers_parameters_probability[layer][parameter][value] += kernel(i, index_of_selected_value)
+        self._layers_parameters_probability[layer][parameter].increase([value])
 
     def _increase_training_parameters(self, parameter, value):
-        a = list(self._training_parameters_probability[parameter])
-
-        # stupid hack to solve None ordering
-        if isinstance(a[0], str):
-            gag = '0'
-        else:
-            gag = 0
-
-        a = sorted(a, key=lambda x: x if x else gag)
-        index_of_selected_value = a.index(value)
-
-        for i, value in enumerate(a):
-            self._training_parameters_probability[parameter][value] += kernel(i, index_of_selected_value)
+        self._training_parameters_probability[parameter].increase([value])
 
     def mutation(self):
         """
         Get random mutation type
         """
-        tmp = {key: value for key, value in self._mutations_probability.items()}
-        a = list(tmp)
-
-        # we should normalize list of probabilities
-        p = np.array(list(tmp.values()))
-        p = p / p.sum()
-
-        choice = np.random.choice(a, p=p)
+        choice = self._sample(self._mutations_probability)
 
         return choice
 
@@ -213,16 +305,8 @@ class Distribution():
         """
         Get the random layer's type
         """
-        # We use dictionary of probabilities and exclude disactivated layers
-        tmp = {key: value for key, value in self._layers_probability.items() if key not in self._diactivated_layers}
-        a = list(tmp)
-
-        # we should normalize list of probabilities
-        p = np.array(list(tmp.values()))
-
-        p = p / p.sum()
-
-        choice = np.random.choice(a, p=p)
+        # disactivated layers are excluded from the table
+        choice = self._sample(self._layers_probability)
 
         if self._appeareance_increases_probability:
             # now we increase the probability of this layer to be appear
@@ -234,15 +318,11 @@ class Distribution():
         """
         Get random parameters for the layer
         """
-        a = list(self._layers_parameters_probability[layer][parameter])
-        if not a:
+        table = self._layers_parameters_probability[layer][parameter]
+        if not len(table):
             return None
 
-        # we should normalize list of probabilities
-        p = np.array(list(self._layers_parameters_probability[layer][parameter].values()))
-        p = p / p.sum()
-
-        choice = np.random.choice(a, p=p)
+        choice = self._sample(table)
 
         if self._appeareance_increases_probability:
             # now one important thing - imagine parameters as a field of values
@@ -256,29 +336,13 @@ class Distribution():
         """
         Get the number of layers
         """
-        a = list(self._layers_number_probability)
-
-        # we should normalize list of probabilities
-        p = np.array(list(self._layers_number_probability.values()))
-        p = p / p.sum()
-
-        choice = np.random.choice(a, p=p)
+        choice = self._sample(self._layers_number_probability)
 
         if self._appeareance_increases_probability:
             # now one important thing - imagine parameters as a field of values
             # we chose one value, and now we want to increase the probability of this value
             # but we also should increase probabilities of near values
-            # stupid hack to solve None ordering
-            if isinstance(a[0], str):
-                gag = '0'
-            else:
-                gag = 0
-
-            a = sorted(a, key=lambda x: x if x else gag)
-            index_of_selected_value = a.index(choice)
-
-            for i, value in enumerate(a):
-                self._layers_number_probability[value] += kernel(i, index_of_selected_value)
+            self._layers_number_probability.increase([choice])
 
         return choice
 
@@ -286,13 +350,7 @@ class Distribution():
         """
         Get the training parameter
         """
-        a = list(self._training_parameters_probability[parameter])
-
-        # we should normalize list of probabilities
-        p = np.array(list(self._training_parameters_probability[parameter].values()))
-        p = p / p.sum()
-
-        choice = np.random.choice(a, p=p)
+        choice = self._sample(self._training_parameters_probability[parameter])
 
         if self._appeareance_increases_probability:
             # now one important thing - imagine parameters as a field of values
@@ -302,29 +360,87 @@ class Distribution():
 
         return choice
 
-    def parse_architecture(self, individ):
+    def sample_layers(self, n, layer_type=None):
+        """
+        Create layers, values of their parameters are drawn at once for each layer type
+
+        Args:
+            n {int} - number of layers
+            layer_type {str} - type of the layers, random types are sampled if None
+
+        Return:
+            list{Layer} - new layers
+        """
+        if self._appeareance_increases_probability:
+            # each value changes the probabilities of the next ones
+            return [Layer(layer_type or self.layer(), self) for _ in range(n)]
+
+        if layer_type is None:
+            layers_types = self._layers_probability.sample_array(self._generator, n)
+        else:
+            layers_types = [layer_type] * n
+
+        types, numbers = np.unique(layers_types, return_counts=True)
+        for layer, number in zip(types, numbers):
+            # the last layer has parameters of the dense layer
+            layer = 'dense' if layer == 'last_dense' else layer
+
+            for table in self._layers_parameters_probability.get(layer, {}).values():
+                if len(table):
+                    table.draw(self._generator, number)
+
+        return [Layer(layer, self) for layer in layers_types]
+
+    def parse_population(self, population):
         """
-        Parse architecture and increase the probability of its elements
+        Increase the probabilities of the layers and their parameters, which are used by the individs
+        The whole population is applied at once, each table is updated once.
+        Individs carry no training parameters, so training tables are not changed here,
+        they are increased only by sampling with appeareance_increases_probability
+
+        Args:
+            population {list{IndividBase}} - evaluated individs
         """
-        for block in individ.architecture:
-            if block.type != 'input' and \
-               block.type != 'embedding' and \
-               block.type != 'last_dense' and \
-               block.type != 'flatten':
-                self._increase_layer_probability(block.type)
+        layers = []
+        parameters = {}
+
+        for individ in population:
+            # the finisher is the same for all individs, its copy in the structure has the same uid
+            finisher = individ.architecture.finisher.uid
+
+            for layer in individ.layers_index_reverse.values():
+                if getattr(layer, 'uid', None) == finisher or layer.layer_type not in self._layers_probability:
+                    continue
+
+                # shape calculation and function-preserving insertion overwrite some values of the config,
+                # only the sampled ones are learned
+                config = layer.sampled_parameters() if hasattr(layer, 'sampled_parameters') else layer.config
 
-                for layer in block.layers:
-                    for parameter in layer.config:
-                        self._increase_layer_parameters_probability(block.type, parameter, layer.config[parameter])
+                layers.append(layer.layer_type)
+                for parameter in self._layers_parameters_probability[layer.layer_type]:
+                    if parameter in config:
+                        parameters.setdefault((layer.layer_type, parameter), []).append(config[parameter])
 
-        for parameter in individ.training_parameters:
-            self._increase_training_parameters(parameter, individ.training_parameters[parameter])
+        self._layers_probability.increase(layers, 0.95)
+        for (layer, parameter), values in parameters.items():
+            self._layers_parameters_probability[layer][parameter].increase(values)
+
+    def parse_architecture(self, individ):
+        """
+        Parse architecture and increase the probability of its layers and their parameters
+        Unlike the previous version, probabilities of the training parameters are not increased,
+        individs do not store them, see parse_population
+        """
+        self.parse_population([individ])
 
     def get_probability(self):
         """
         Get dictionary of probabilities
         """
-        return self._layers_parameters_probability, self._layers_probability
+        layers_parameters_probability = {layer: {parameter: table.as_dict() for parameter, table in parameters.items()}
+                                         for layer, parameters in self._layers_parameters_probability.items()}
+
+        return layers_parameters_probability, self._layers_probability.as_dict()
 
     def set_layer_status(self, layer, active=True):
         """
@@ -336,6 +452,8 @@ class Distribution():
         elif layer not in self._diactivated_layers and active is False:
             self._diactivated_layers.append(layer)
 
+        self._layers_probability.exclude(self._diactivated_layers)
+
     def register_new_layer(self, new_layer):
         new_name = 'CUSTOM_{}_{}_{}'.format(FAKE.name().replace(' ', '_'), new_layer.size, new_layer.width)
         self._LAYERS_POOL[new_name] = {}
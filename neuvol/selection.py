@@ -0,0 +1,221 @@
+# Copyright 2020 Timur Sokhin.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+
+
+# attributes of the individs, which can be objectives: 1 if it is maximized, -1 if it is minimized
+OBJECTIVES = {
+    'result': 1,
+    'result_params': -1,
+    'result_flops': -1,
+    'result_latency': -1,
+}
+
+
+def objective_values(population, objectives=('result', 'result_params')):
+    """
+    Matrix of the objectives, all of them are minimized
+    Individs without the value of the objective are the worst by this objective
+
+    Args:
+        population {list{IndividBase}} - individs
+        objectives {tuple{str}} - attributes of the individs, keys of OBJECTIVES
+
+    Return:
+        np.array - matrix of the shape (individs, objectives)
+    """
+    values = np.array([[getattr(individ, objective) for objective in objectives] for individ in population], dtype=np.float64)
+    values = values.reshape(len(population), len(objectives))
+    values = values * -np.array([OBJECTIVES[objective] for objective in objectives], dtype=np.float64)
+
+    return np.where(np.isnan(values), np.inf, values)
+
+
+def dominance(values, chunk_size=1024):
+    """
+    Matrix of the dominance: element (i, j) is True if the solution i dominates the solution j,
+    it is computed by chunks of the rows, so the memory is bounded by chunk_size * solutions * objectives
+
+    Args:
+        values {np.array} - minimized objectives of the shape (solutions, objectives)
+
+    Return:
+        np.array - boolean matrix of the shape (solutions, solutions)
+    """
+    dominates = np.empty((len(values), len(values)), dtype=bool)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start: start + chunk_size, None, :]
+        dominates[start: start + chunk_size] = (chunk <= values[None]).all(-1) & (chunk < values[None]).any(-1)
+
+    return dominates
+
+
+def non_dominated_sort(values):
+    """
+    Fast non-dominated sorting, solutions of each front are dominated only by the previous fronts
+
+    Args:
+        values {np.array} - minimized objectives of the shape (solutions, objectives)
+
+    Return:
+        np.array - number of the front of each solution, 0 is the Pareto front
+    """
+    dominates = dominance(values)
+    # number of the solutions, which dominate each solution
+    counts = dominates.sum(0)
+    fronts = np.full(len(values), -1)
+
+    front = 0
+    current = np.flatnonzero(counts == 0)
+    while len(current):
+        fronts[current] = front
+        counts = counts - dominates[current].sum(0)
+        counts[current] = -1
+        current = np.flatnonzero(counts == 0)
+        front += 1
+
+    return fronts
+
+
+def crowding_distance(values, fronts):
+    """
+    Crowding distance of each solution within its front, extreme solutions have the infinite distance
+
+    Args:
+        values {np.array} - minimized objectives of the shape (solutions, objectives)
+        fronts {np.array} - number of the front of each solution
+
+    Return:
+        np.array - distances
+    """
+    # missing objectives are placed after the worst value, so the distances are finite
+    finite = np.isfinite(values)
+    worst = np.where(finite, values, -np.inf).max(0, initial=0.0) + 1
+    values = np.where(finite, values, worst)
+
+    distances = np.zeros(len(values))
+    for front in np.unique(fronts):
+        members = np.flatnonzero(fronts == front)
+        front_values = values[members]
+
+        order = np.argsort(front_values, axis=0, kind='stable')
+        sorted_values = np.take_along_axis(front_values, order, axis=0)
+        spread = sorted_values[-1] - sorted_values[0]
+        spread[spread == 0] = 1
+
+        # distance between the neighbours of each solution along each objective
+        gaps = np.zeros_like(sorted_values)
+        gaps[1:-1] = (sorted_values[2:] - sorted_values[:-2]) / spread
+        gaps[0] = gaps[-1] = np.inf
+
+        front_distances = np.zeros_like(sorted_values)
+        np.put_along_axis(front_distances, order, gaps, axis=0)
+        distances[members] = front_distances.sum(1)
+
+    return distances
+
+
+def rank(population, objectives=('result', 'result_params')):
+    """
+    Order of the individs by the front and the crowding distance, as in NSGA-II
+
+    Args:
+        population {list{IndividBase}} - individs
+        objectives {tuple{str}} - attributes of the individs, keys of OBJECTIVES
+
+    Return:
+        np.array - indexes of the individs, the best one is the first
+    """
+    if not population:
+        return np.array([], dtype=int)
+
+    values = objective_values(population, objectives)
+    fronts = non_dominated_sort(values)
+    distances = crowding_distance(values, fronts)
+
+    return np.lexsort((-distances, fronts))
+
+
+def select(population, number, objectives=('result', 'result_params')):
+    """
+    Select individs of the next population by the front and the crowding distance
+
+    Args:
+        population {list{IndividBase}} - individs
+        number {int} - number of individs to select
+        objectives {tuple{str}} - attributes of the individs, keys of OBJECTIVES
+
+    Return:
+        list{IndividBase} - selected individs, the best one is the first
+    """
+    return [population[i] for i in rank(population, objectives)[:number]]
+
+
+class ParetoArchive:
+    """
+    Non-dominated individs among all evaluated ones, models for the deployment are picked from them
+    Individs with the same architecture fingerprint, such as clones and their parents, are stored once.
+    Archive keeps snapshots of the individs, so mutations of the population do not change them
+    """
+    def __init__(self, objectives=('result', 'result_params')):
+        """
+        Args:
+            objectives {tuple{str}} - attributes of the individs, keys of OBJECTIVES
+        """
+        self.objectives = tuple(objectives)
+        self.individs = []
+
+    def update(self, population):
+        """
+        Add evaluated individs, dominated individs are removed from the archive
+
+        Return:
+            list{IndividBase} - individs of the archive
+        """
+        candidates = {individ.fingerprint: individ for individ in self.individs}
+        archived = set(candidates)
+        for individ in population:
+            if individ.result is not None:
+                candidates.setdefault(individ.fingerprint, individ)
+
+        candidates = list(candidates.values())
+        if candidates:
+            fronts = non_dominated_sort(objective_values(candidates, self.objectives))
+            self.individs = [candidates[i] if candidates[i].fingerprint in archived else candidates[i].snapshot()
+                             for i in np.flatnonzero(fronts == 0)]
+
+        return self.individs
+
+    def smallest(self, target, cost='result_params'):
+        """
+        The cheapest individ of the archive, which result is not less than the target
+
+        Args:
+            target {float} - required result
+            cost {str} - attribute of the individs, which is minimized
+
+        Return:
+            IndividBase - selected individ or None if no individ reaches the target
+        """
+        suitable = [individ for individ in self.individs if individ.result >= target and getattr(individ, cost) is not None]
+        if not suitable:
+            return None
+
+        return min(suitable, key=lambda individ: getattr(individ, cost))
+
+    def __iter__(self):
+        return iter(self.individs)
+
+    def __len__(self):
+        return len(self.individs)